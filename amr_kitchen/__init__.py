@@ -1,4 +1,6 @@
 from .plotfile_cooker import PlotfileCooker
+from .readers import ReaderConfig
+from .plotfile_series import PlotfileSeries
 from . import mandoline
 from . import colander
 from . import chef
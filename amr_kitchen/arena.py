@@ -0,0 +1,197 @@
+"""
+Shared memory transport of the arrays returned by the worker
+processes (transport="shared_memory")
+"""
+import os
+import collections
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Maximum size in bytes of the shared memory arena
+ARENA_BYTES = 2**28
+
+# Filesystem of the posix shared memory blocks
+SHM_DIR = "/dev/shm"
+
+# Location of an array written in a shared memory arena
+ArenaSlot = collections.namedtuple("ArenaSlot", ["offset", "shape", "dtype", "order"])
+
+# Arenas attached by the current worker process
+ATTACHED_ARENAS = {}
+
+def attach_arena(name):
+    """
+    Shared memory block of the arena with the given name, attached
+    once by each worker process and reused by the next tasks
+    """
+    if name not in ATTACHED_ARENAS:
+        # The tasks of previous arenas are done
+        for old in list(ATTACHED_ARENAS):
+            ATTACHED_ARENAS.pop(old).close()
+        try:
+            # The main process unlinks the block (Python >= 3.13)
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        ATTACHED_ARENAS[name] = shm
+    return ATTACHED_ARENAS[name]
+
+def pack_arrays(obj, buf, cursor):
+    """
+    Copy the arrays in obj (also nested in dicts, lists and tuples)
+    to the shared buffer between cursor[0] and cursor[1] and replace
+    them by their ArenaSlot. The arrays not fitting are kept as is.
+    """
+    if isinstance(obj, np.ndarray):
+        size = -(-obj.nbytes // 8) * 8
+        if obj.dtype.hasobject or cursor[0] + size > cursor[1]:
+            return obj
+        order = 'F' if obj.flags.f_contiguous else 'C'
+        view = np.ndarray(obj.shape, obj.dtype, buffer=buf,
+                          offset=cursor[0], order=order)
+        view[...] = obj
+        slot = ArenaSlot(cursor[0], obj.shape, obj.dtype.str, order)
+        cursor[0] += size
+        return slot
+    elif isinstance(obj, dict):
+        return {key:pack_arrays(value, buf, cursor) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [pack_arrays(item, buf, cursor) for item in obj]
+    elif isinstance(obj, tuple) and not isinstance(obj, ArenaSlot):
+        return tuple([pack_arrays(item, buf, cursor) for item in obj])
+    return obj
+
+def unpack_arrays(obj, buf):
+    """
+    Copy the arrays at the ArenaSlot locations in obj out of the
+    shared buffer so it can be reused
+    """
+    if isinstance(obj, ArenaSlot):
+        view = np.ndarray(obj.shape, np.dtype(obj.dtype), buffer=buf,
+                          offset=obj.offset, order=obj.order)
+        return view.copy(order='K')
+    elif isinstance(obj, dict):
+        return {key:unpack_arrays(value, buf) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [unpack_arrays(item, buf) for item in obj]
+    elif isinstance(obj, tuple):
+        return tuple([unpack_arrays(item, buf) for item in obj])
+    return obj
+
+def shm_call(args):
+    """
+    Worker side of SharedArena.map: call the function and move
+    the arrays of its output to the slot of the task in the arena
+    """
+    fun, fun_args, name, start, stop = args
+    shm = attach_arena(name)
+    return pack_arrays(fun(fun_args), shm.buf, [start, stop])
+
+def shm_available():
+    """
+    Free space in bytes of the shared memory filesystem
+    (None if it cannot be measured)
+    """
+    try:
+        stats = os.statvfs(SHM_DIR)
+    except (OSError, AttributeError):
+        return None
+    return stats.f_bavail * stats.f_frsize
+
+class SharedArena(object):
+    """
+    Shared memory block allocated by the main process in which the
+    worker processes write the arrays they return. Only the location
+    of the arrays (ArenaSlot) is pickled back through the pool and the
+    block is reused by the next tasks. The block is sized from the
+    batches of tasks (at most size bytes) and the outputs are pickled
+    when the shared memory cannot hold a batch.
+    The slots are reused by each batch, so a single map can run at
+    once (the arrays yielded by map are copies and stay valid).
+    On posix systems, the resource tracker of the main process is
+    started with the arena, the worker pools started before it must
+    have been forked after resource_tracker.ensure_running()
+    """
+
+    def __init__(self, size=ARENA_BYTES):
+        self.size = size
+        self.shm = None
+        self.in_use = False
+        if os.name == "posix":
+            resource_tracker.ensure_running()
+
+    def reserve(self, size):
+        """
+        Make sure the arena holds at least size bytes
+        (raises MemoryError if the shared memory is too small)
+        """
+        if self.shm is None or self.shm.size < size:
+            self.close()
+            # The block is not backed by memory until written, a
+            # too small /dev/shm would crash the workers (SIGBUS)
+            available = shm_available()
+            if available is not None and available < size:
+                raise MemoryError((f"{size} bytes of shared memory requested"
+                                   f" ({available} available)"))
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 8))
+
+    def map(self, pool, fun, iterable, nbytes, ordered=True):
+        """
+        Apply fun to the items of iterable with the worker pool and
+        yield the outputs (in order if ordered=True, else as they are
+        computed). nbytes is the size in bytes of the arrays returned
+        for each item, the items are processed in batches fitting in
+        the arena (the arrays not fitting in their slot are pickled)
+        Raises RuntimeError if another map of the arena is running
+        """
+        if self.in_use:
+            raise RuntimeError("The shared memory arena is used by another map")
+        self.in_use = True
+        try:
+            yield from self.map_batches(pool, fun, iterable, nbytes, ordered)
+        finally:
+            self.in_use = False
+
+    def map_batches(self, pool, fun, iterable, nbytes, ordered):
+        """
+        Batches of SharedArena.map
+        """
+        items = list(iterable)
+        sizes = [-(-int(n) // 8) * 8 for n in nbytes]
+        start = 0
+        while start < len(items):
+            # Consecutive tasks fitting in the arena
+            stop = start + 1
+            total = sizes[start]
+            while stop < len(items) and total + sizes[stop] <= self.size:
+                total += sizes[stop]
+                stop += 1
+            try:
+                self.reserve(total)
+            except (OSError, MemoryError):
+                # Not enough shared memory, the outputs are pickled
+                if ordered:
+                    yield from pool.imap(fun, items[start:stop])
+                else:
+                    yield from pool.imap_unordered(fun, items[start:stop])
+                start = stop
+                continue
+            offsets = np.cumsum([0] + sizes[start:stop])
+            tasks = [(fun, items[start + i], self.shm.name, offsets[i], offsets[i + 1])
+                     for i in range(stop - start)]
+            if ordered:
+                results = pool.imap(shm_call, tasks)
+            else:
+                results = pool.imap_unordered(shm_call, tasks)
+            for result in results:
+                yield unpack_arrays(result, self.shm.buf)
+            start = stop
+
+    def close(self):
+        """
+        Release and remove the shared memory block
+        """
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
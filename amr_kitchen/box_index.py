@@ -0,0 +1,220 @@
+"""
+Spatial indexing of the boxes: bins of the boxes for point and
+region queries (BoxIndex) and adjacency of the boxes (ghost maps)
+"""
+import numpy as np
+
+def enumerate_blocks(blo, bhi):
+    """
+    Coordinates of the blocks covered by each box spanning the blocks
+    blo to bhi (included) and the index of the box of each block
+    """
+    counts = bhi - blo + 1
+    nbox_blocks = np.prod(counts, axis=1)
+    box_ids = np.repeat(np.arange(len(blo)), nbox_blocks)
+    local = np.arange(len(box_ids)) - np.repeat(np.cumsum(nbox_blocks) - nbox_blocks,
+                                                nbox_blocks)
+    coords = np.empty((len(box_ids), blo.shape[1]), dtype=np.int64)
+    for dim in range(blo.shape[1] - 1, -1, -1):
+        dim_counts = counts[box_ids, dim]
+        coords[:, dim] = blo[box_ids, dim] + local % dim_counts
+        local //= dim_counts
+    return box_ids, coords
+
+def box_adjacency(indexes, nghost=1):
+    """
+    Neighbours of each box from their global cell indices. The boxes
+    are hashed in blocks of the typical box size and the boxes extended
+    by nghost cells are only tested against the boxes in the blocks
+    they cover. Time is O(n log n) and memory O(n) for n boxes of
+    similar sizes (independent of the domain resolution)
+    ___
+    indexes: (nboxes, 2, ndims) array of the box lo and hi indices
+    nghost: number of cells added around the boxes, the neighbours of
+            a box intersect it when it is extended by nghost cells
+    returns the neighbours in compressed sparse row format (starts,
+    neighbours), the neighbours of box i being
+    neighbours[starts[i]:starts[i + 1]] (sorted)
+    """
+    indexes = np.asarray(indexes, dtype=np.int64)
+    nboxes = len(indexes)
+    lo, hi = indexes[:, 0], indexes[:, 1]
+    glo, ghi = lo - nghost, hi + nghost
+    # Blocks with the typical size of the boxes
+    block = max(int(np.median(hi - lo + 1)), 1)
+    origin = np.min(glo // block, axis=0)
+    nblocks = np.max(ghi // block, axis=0) - origin + 1
+    # Hash table of the blocks covered by the boxes
+    box_ids, coords = enumerate_blocks(lo // block - origin, hi // block - origin)
+    keys = np.ravel_multi_index(coords.T, nblocks)
+    order = np.argsort(keys, kind='stable')
+    box_ids = box_ids[order]
+    block_keys, block_starts = np.unique(keys[order], return_index=True)
+    block_starts = np.append(block_starts, len(keys))
+    # Lookup the blocks covered by the extended boxes
+    ext_ids, coords = enumerate_blocks(glo // block - origin, ghi // block - origin)
+    keys = np.ravel_multi_index(coords.T, nblocks)
+    found = np.searchsorted(block_keys, keys)
+    found[found == len(block_keys)] = 0
+    hit = block_keys[found] == keys
+    ext_ids, found = ext_ids[hit], found[hit]
+    # Every (extended box, box) pair sharing a block
+    counts = block_starts[found + 1] - block_starts[found]
+    first = np.repeat(ext_ids, counts)
+    positions = (np.repeat(block_starts[found] - np.cumsum(counts) + counts, counts)
+                 + np.arange(np.sum(counts)))
+    second = box_ids[positions]
+    # Exact intersection of the extended boxes with the other boxes
+    keep = ((first != second) &
+            np.all(glo[first] <= hi[second], axis=1) &
+            np.all(lo[second] <= ghi[first], axis=1))
+    # Sorted and without the pairs found in more than one block
+    pairs = np.sort(first[keep] * nboxes + second[keep])
+    pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+    starts = np.searchsorted(pairs // nboxes, np.arange(nboxes + 1))
+    return starts, pairs % nboxes
+
+
+class BoxIndex(object):
+    """
+    Uniform bin grid over the boxes of each AMR level used to find
+    the boxes containing a point or intersecting a region by only
+    testing the boxes in the bins overlapping the query
+    """
+
+    def __init__(self, boxes, margins=None):
+        """
+        boxes: box bounds at each level ([nboxes][ndims][lo, hi])
+        margins: distance added around the boxes of each level when
+                 binning them (the point queries can use margins up
+                 to this distance)
+        """
+        self.levels = []
+        for lv, lv_boxes in enumerate(boxes):
+            margin = 0.0 if margins is None else np.asarray(margins[lv])
+            self.levels.append(self.bin_level(np.asarray(lv_boxes, dtype=float),
+                                              margin))
+
+    def bin_level(self, boxes, margin):
+        """
+        Bin the boxes of a level and store the box indices of each
+        bin in compressed sparse row format
+        """
+        lo = boxes[:, :, 0] - margin
+        hi = boxes[:, :, 1] + margin
+        origin = np.min(lo, axis=0)
+        extent = np.max(hi, axis=0) - origin
+        # Bins with the typical size of the boxes
+        bin_size = np.median(boxes[:, :, 1] - boxes[:, :, 0], axis=0)
+        bin_size = np.where(bin_size > 0, bin_size, np.maximum(extent, 1.0))
+        nbins = np.maximum(np.ceil(extent / bin_size).astype(int), 1)
+        # But only a few bins per box
+        while np.prod(nbins) > 8 * len(boxes) + 64:
+            bin_size *= 2
+            nbins = np.maximum(np.ceil(extent / bin_size).astype(int), 1)
+        bin_lo = np.clip(np.floor((lo - origin) / bin_size).astype(int), 0, nbins - 1)
+        bin_hi = np.clip(np.floor((hi - origin) / bin_size).astype(int), 0, nbins - 1)
+        # Enumerate the bins covered by each box
+        counts = bin_hi - bin_lo + 1
+        nbox_bins = np.prod(counts, axis=1)
+        box_ids = np.repeat(np.arange(len(boxes)), nbox_bins)
+        local = np.arange(len(box_ids)) - np.repeat(np.cumsum(nbox_bins) - nbox_bins,
+                                                    nbox_bins)
+        coords = np.empty((len(box_ids), boxes.shape[1]), dtype=int)
+        for dim in range(boxes.shape[1] - 1, -1, -1):
+            dim_counts = counts[box_ids, dim]
+            coords[:, dim] = bin_lo[box_ids, dim] + local % dim_counts
+            local //= dim_counts
+        bins = np.ravel_multi_index(coords.T, nbins)
+        order = np.argsort(bins, kind='stable')
+        starts = np.searchsorted(bins[order], np.arange(np.prod(nbins) + 1))
+        return {"boxes":boxes,
+                "origin":origin,
+                "bin_size":bin_size,
+                "nbins":nbins,
+                "box_ids":box_ids[order],
+                "starts":starts}
+
+    def candidates(self, lv, lo, hi):
+        """
+        Indices of the boxes binned in the bins overlapping
+        the region [lo, hi] at level lv
+        """
+        level = self.levels[lv]
+        bin_lo = np.floor((np.asarray(lo) - level["origin"]) / level["bin_size"])
+        bin_hi = np.floor((np.asarray(hi) - level["origin"]) / level["bin_size"])
+        bin_lo = np.clip(bin_lo.astype(int), 0, level["nbins"] - 1)
+        bin_hi = np.clip(bin_hi.astype(int), 0, level["nbins"] - 1)
+        # Point queries only need a single bin
+        if np.array_equal(bin_lo, bin_hi):
+            b = np.ravel_multi_index(tuple(bin_lo), level["nbins"])
+            return level["box_ids"][level["starts"][b]:level["starts"][b + 1]]
+        bin_ranges = [np.arange(l, h + 1) for l, h in zip(bin_lo, bin_hi)]
+        bins = np.ravel_multi_index(np.meshgrid(*bin_ranges, indexing='ij'),
+                                    level["nbins"]).reshape(-1)
+        # Concatenate the box indices of the bins
+        starts = level["starts"][bins]
+        lengths = level["starts"][bins + 1] - starts
+        positions = (np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                     + np.arange(np.sum(lengths)))
+        return np.unique(level["box_ids"][positions])
+
+    def point_boxes(self, lv, point, margin=0.0):
+        """
+        Indices of the boxes at level lv containing the point when
+        their bounds are extended by margin (scalar or by dimension,
+        negative values shrink the boxes). The margin cannot be larger
+        than the one used when building the index
+        """
+        point = np.asarray(point, dtype=float)
+        box_ids = self.candidates(lv, point, point)
+        boxes = self.levels[lv]["boxes"][box_ids]
+        inside = (np.all(boxes[:, :, 0] - margin <= point, axis=1) &
+                  np.all(point <= boxes[:, :, 1] + margin, axis=1))
+        return box_ids[inside]
+
+    def locate_points(self, lv, points, chunk_size=100000):
+        """
+        Index of a box at level lv containing each point, the lowest
+        index when several boxes contain it (-1 if the point is outside
+        the boxes of the level)
+        points: (npoints, ndims) array of coordinates
+        """
+        level = self.levels[lv]
+        points = np.asarray(points, dtype=float)
+        box_of_point = np.full(len(points), -1)
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            bins = np.floor((chunk - level["origin"]) / level["bin_size"]).astype(int)
+            bins = np.clip(bins, 0, level["nbins"] - 1)
+            bins = np.ravel_multi_index(bins.T, level["nbins"])
+            # Test every (point, candidate box) pair at once
+            counts = level["starts"][bins + 1] - level["starts"][bins]
+            pair_points = np.repeat(np.arange(len(chunk)), counts)
+            positions = (np.repeat(level["starts"][bins] - np.cumsum(counts) + counts, counts)
+                         + np.arange(np.sum(counts)))
+            pair_boxes = level["box_ids"][positions]
+            boxes = level["boxes"][pair_boxes]
+            pair_coords = chunk[pair_points]
+            inside = (np.all(boxes[:, :, 0] <= pair_coords, axis=1) &
+                      np.all(pair_coords <= boxes[:, :, 1], axis=1))
+            # Lowest index of the boxes containing each point (the
+            # points on a shared face are contained in both boxes)
+            first_box = np.full(len(chunk), len(level["boxes"]))
+            np.minimum.at(first_box, pair_points[inside], pair_boxes[inside])
+            found = np.nonzero(first_box < len(level["boxes"]))[0]
+            box_of_point[start + found] = first_box[found]
+        return box_of_point
+
+    def region_boxes(self, lv, lo, hi):
+        """
+        Indices of the boxes at level lv intersecting the region [lo, hi]
+        (boxes touching the region bounds are included)
+        """
+        lo = np.asarray(lo, dtype=float)
+        hi = np.asarray(hi, dtype=float)
+        box_ids = self.candidates(lv, lo, hi)
+        boxes = self.levels[lv]["boxes"][box_ids]
+        intersect = (np.all(boxes[:, :, 0] <= hi, axis=1) &
+                     np.all(lo <= boxes[:, :, 1], axis=1))
+        return box_ids[intersect]
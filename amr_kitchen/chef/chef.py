@@ -9,6 +9,7 @@ import numpy as np
 import cantera as ct
 from tqdm import tqdm
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import open_binary, read_array, profile_pool
 from amr_kitchen.utils import shape_from_header
 
 # GLOBALS
@@ -26,8 +27,8 @@ def chefs_knife_single_field(args):
     mins = []
     maxs = []
     # Open the read and write
-    with open(args['bfpath'], 'rb') as bfr:
-        with open(args['newbfpath'], 'wb') as bfw:
+    with open_binary(args['bfpath']) as bfr:
+        with open_binary(args['newbfpath'], 'wb') as bfw:
             while True:
                 # Read the header line in the old file
                 header = bfr.readline().decode('ascii')
@@ -48,7 +49,7 @@ def chefs_knife_single_field(args):
                 # Write the new header
                 bfw.write(header_w.encode('ascii'))
                 # Read the data
-                arr = np.fromfile(bfr, "float64", np.prod(datashape))
+                arr = read_array(bfr, "float64", np.prod(datashape))
                 arr = arr.reshape(datashape, order="F")
                 # Isolate the temperature and mass fractions
                 Y = arr[:, :, :, args['sp_start']:args['sp_end']]
@@ -89,8 +90,8 @@ def chefs_knife_byspecies_field(args):
     maxs = []
     outnfields = len(args['sp_indexes'])
     # Open the read and write
-    with open(args['bfpath'], 'rb') as bfr:
-        with open(args['newbfpath'], 'wb') as bfw:
+    with open_binary(args['bfpath']) as bfr:
+        with open_binary(args['newbfpath'], 'wb') as bfw:
             while True:
                 # Read the header line in the old file
                 header = bfr.readline().decode('ascii')
@@ -111,7 +112,7 @@ def chefs_knife_byspecies_field(args):
                 # Write the new header
                 bfw.write(header_w.encode('ascii'))
                 # Read the data
-                arr = np.fromfile(bfr, "float64", np.prod(datashape))
+                arr = read_array(bfr, "float64", np.prod(datashape))
                 arr = arr.reshape(datashape, order="F")
                 # Isolate the temperature and mass fractions
                 Y = arr[:, :, :, args['sp_start']:args['sp_end']]
@@ -148,8 +149,8 @@ def chefs_knife_byreaction_field(args):
     maxs = []
     outnfields = len(args['rx_indexes'])
     # Open the read and write
-    with open(args['bfpath'], 'rb') as bfr:
-        with open(args['newbfpath'], 'wb') as bfw:
+    with open_binary(args['bfpath']) as bfr:
+        with open_binary(args['newbfpath'], 'wb') as bfw:
             while True:
                 # Read the header line in the old file
                 header = bfr.readline().decode('ascii')
@@ -170,7 +171,7 @@ def chefs_knife_byreaction_field(args):
                 # Write the new header
                 bfw.write(header_w.encode('ascii'))
                 # Read the data
-                arr = np.fromfile(bfr, "float64", np.prod(datashape))
+                arr = read_array(bfr, "float64", np.prod(datashape))
                 arr = arr.reshape(datashape, order="F")
                 # Isolate the temperature and mass fractions
                 Y = arr[:, :, :, args['sp_start']:args['sp_end']]
@@ -205,8 +206,8 @@ def chefs_knife_user_sarray(args):
     mins = []
     maxs = []
     # Open the read and write
-    with open(args['bfpath'], 'rb') as bfr:
-        with open(args['newbfpath'], 'wb') as bfw:
+    with open_binary(args['bfpath']) as bfr:
+        with open_binary(args['newbfpath'], 'wb') as bfw:
             while True:
                 # Read the header line in the old file
                 header = bfr.readline().decode('ascii')
@@ -221,7 +222,7 @@ def chefs_knife_user_sarray(args):
                 # shape of the box
                 boxshape = tuple([datashape[i] for i in range(3)])
                 # Read the data
-                arr = np.fromfile(bfr, "float64", np.prod(datashape))
+                arr = read_array(bfr, "float64", np.prod(datashape))
                 arr = arr.reshape(datashape, order="F")
                 # Isolate the temperature and mass fractions
                 Y = arr[:, :, :, args['sp_start']:args['sp_end']]
@@ -282,8 +283,8 @@ def chefs_knife_user_pfile(args):
     mins = []
     maxs = []
     # Open the read and write
-    with open(args['bfpath'], 'rb') as bfr:
-        with open(args['newbfpath'], 'wb') as bfw:
+    with open_binary(args['bfpath']) as bfr:
+        with open_binary(args['newbfpath'], 'wb') as bfw:
             while True:
                 # Read the header line in the old file
                 header = bfr.readline().decode('ascii')
@@ -298,7 +299,7 @@ def chefs_knife_user_pfile(args):
                 # shape of the box
                 boxshape = tuple([datashape[i] for i in range(3)])
                 # Read the data
-                arr = np.fromfile(bfr, "float64", np.prod(datashape))
+                arr = read_array(bfr, "float64", np.prod(datashape))
                 arr = arr.reshape(datashape, order="F")
                 # Call the user defined function with the field indexes
                 newdata = args['recipe'](args['field_indexes'],
@@ -549,9 +550,9 @@ class Chef(PlotfileCooker):
                     output.append(self.knife(args))
             else:
                 print(f"Cooking level {lv} in parallel")
-                pool = Pool()
-                output = tqdm(pool.imap(self.knife, mp_calls),
-                              total=len(mp_calls))
+                with profile_pool(Pool()) as pool:
+                    output = list(tqdm(pool.imap(self.knife, mp_calls),
+                                       total=len(mp_calls)))
             #Reorder the offsets to match the box order
             mapped_offsets = np.empty(len(self.boxes[lv]), dtype=int)
             mapped_mins = np.empty((len(self.boxes[lv]), 
@@ -4,6 +4,7 @@ import numpy as np
 import argparse
 from .chef import Chef
 from tqdm import tqdm
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 
 def main():
@@ -48,7 +49,11 @@ def main():
             "--kept_fields", "-k", type=str,
             help="Fields to keep in the output plotfile")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
 
     # Chef object
     plot_chef = Chef(args.plotfile,
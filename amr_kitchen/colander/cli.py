@@ -3,6 +3,7 @@ import time
 import numpy as np
 import argparse
 from .colander import Colander
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 
 def main():
@@ -27,7 +28,11 @@ def main():
             "--output", "-o", type=str,
             help="Output path to store the filtered plotfile")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
     """
     Input arguments sanity check
     """
@@ -3,6 +3,7 @@ import time
 import multiprocessing
 import numpy as np
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import open_binary, read_array, profile_pool
 
 def parallel_strain_3d(args):
     """
@@ -13,9 +14,9 @@ def parallel_strain_3d(args):
     offsets = []
     nkept = len(args["kept_fields"])
     # Open the read and write
-    with open(args['bfile_r'], 
-              'rb') as bfr, open(args['bfile_w'], 
-                                 'wb') as bfw:
+    with open_binary(args['bfile_r'], 
+                     'rb') as bfr, open_binary(args['bfile_w'], 
+                                               'wb') as bfw:
         for indexes, fst_r, idx in zip(args['box_indexes'], 
                                        args['offsets_r'], 
                                        args['cell_indexes']):
@@ -32,7 +33,7 @@ def parallel_strain_3d(args):
              # Read the data
             shape = indexes[1] - indexes[0] + 1
             total_shape = (shape[0], shape[1], shape[2], args['nvars'])
-            arr = np.fromfile(bfr, "float64", np.prod(total_shape))
+            arr = read_array(bfr, "float64", np.prod(total_shape))
             arr = arr.reshape(total_shape, order="F")
             # Reshape into dicts
             arr_out = arr[:, :, :, args["kept_fields"]]
@@ -50,9 +51,9 @@ def parallel_strain_2d(args):
     offsets = []
     nkept = len(args["kept_fields"])
     # Open the read and write
-    with open(args['bfile_r'], 
-              'rb') as bfr, open(args['bfile_w'], 
-                                 'wb') as bfw:        
+    with open_binary(args['bfile_r'], 
+                     'rb') as bfr, open_binary(args['bfile_w'], 
+                                               'wb') as bfw:        
         for indexes, fst_r, idx in zip(args['box_indexes'], 
                                        args['offsets_r'], 
                                        args['cell_indexes']):
@@ -69,7 +70,7 @@ def parallel_strain_2d(args):
              # Read the data
             shape = indexes[1] - indexes[0] + 1
             total_shape = (shape[0], shape[1], args['nvars'])
-            arr = np.fromfile(bfr, "float64", np.prod(total_shape))
+            arr = read_array(bfr, "float64", np.prod(total_shape))
             arr = arr.reshape(total_shape, order="F")
             # Reshape into dicts
             arr_out = arr[:, :, args["kept_fields"]]
@@ -164,7 +165,7 @@ class Colander(PlotfileCooker):
                            "ncells":ncells}
                 mp_calls.append(mp_call)
             # Strain in parallel
-            with multiprocessing.Pool() as pool:
+            with profile_pool(multiprocessing.Pool()) as pool:
                 new_offsets = pool.map(self.strainer, mp_calls)
             # Reorder the offsets to match the box order
             mapped_offsets = np.empty(len(self.boxes[lv]), dtype=int)
@@ -2,6 +2,7 @@ import sys
 import argparse
 from .combine import combine
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 def main():
     # Argument parser
@@ -29,7 +30,11 @@ def main():
             "--serial", "-s", action='store_true',
             help="Flag to disable multiprocessing")
     
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
     #plt1, plt2, pltout = sys.argv[1:]
 
     combine(PlotfileCooker(args.plotfile1), 
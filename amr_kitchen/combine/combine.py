@@ -4,6 +4,7 @@ import multiprocessing
 import numpy as np
 from tqdm import tqdm
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import open_binary, read_array, profile_pool
 from amr_kitchen.utils import (shape_from_header,
                                indices_from_header,
                                header_from_indices,)
@@ -16,9 +17,9 @@ def parallel_combine_by_binfile(args):
     # New offsets
     offsets = []
     # Open the three files
-    with open(args['bfile_r1'], 'rb') as bf1:
-        with open(args['bfile_r2'], 'rb') as bf2:
-            with open(args['bfile_w'], 'wb') as bfw:
+    with open_binary(args['bfile_r1']) as bf1:
+        with open_binary(args['bfile_r2']) as bf2:
+            with open_binary(args['bfile_w'], 'wb') as bfw:
                 while True:
                     try:
                         # Get the read shape and indices
@@ -41,9 +42,9 @@ def parallel_combine_by_binfile(args):
                     offsets.append(bfw.tell())
                     # Write the header and data
                     bfw.write(hw)
-                    data1 = np.fromfile(bf1, 'float64', np.prod(shape1))
+                    data1 = read_array(bf1, 'float64', np.prod(shape1))
                     data1 = data1.reshape(shape1, order='F')[..., args['vidxs1']]
-                    data2 = np.fromfile(bf2, 'float64', np.prod(shape2))
+                    data2 = read_array(bf2, 'float64', np.prod(shape2))
                     data2 = data2.reshape(shape2, order='F')[..., args['vidxs2']]
                     dataw = np.concatenate([data1.flatten(order='F'),
                                             data2.flatten(order='F')])
@@ -58,9 +59,9 @@ def parallel_combine_by_binfile_offsets(args):
     # New offsets
     offsets = []
     # Open the three files
-    with open(args['bfile_r1'], 'rb') as bf1:
-        with open(args['bfile_r2'], 'rb') as bf2:
-            with open(args['bfile_w'], 'wb') as bfw:
+    with open_binary(args['bfile_r1']) as bf1:
+        with open_binary(args['bfile_r2']) as bf2:
+            with open_binary(args['bfile_w'], 'wb') as bfw:
                 for off1, off2 in zip(args["offst_r1"],
                                       args["offst_r2"]):
                     # Go to the box in the file
@@ -84,9 +85,9 @@ def parallel_combine_by_binfile_offsets(args):
                     offsets.append(bfw.tell())
                     # Write the header and data
                     bfw.write(hw)
-                    data1 = np.fromfile(bf1, 'float64', np.prod(shape1))
+                    data1 = read_array(bf1, 'float64', np.prod(shape1))
                     data1 = data1.reshape(shape1, order='F')[..., args['vidxs1']]
-                    data2 = np.fromfile(bf2, 'float64', np.prod(shape2))
+                    data2 = read_array(bf2, 'float64', np.prod(shape2))
                     data2 = data2.reshape(shape2, order='F')[..., args['vidxs2']]
                     dataw = np.concatenate([data1.flatten(order='F'),
                                             data2.flatten(order='F')])
@@ -101,15 +102,15 @@ def parallel_combine_by_boxes_offsets(args):
     # New offsets
     offsets = []
     # Open two files
-    with open(args['bfile_r1'], 'rb') as bf1:
-        with open(args['bfile_w'], 'wb') as bfw:
+    with open_binary(args['bfile_r1']) as bf1:
+        with open_binary(args['bfile_w'], 'wb') as bfw:
             for bf_path2, offset2 in zip(args['bfile_r2'],
                                          args['offst_r2']):
                 # Go to the box in the files
                 h1 = bf1.readline()
                 h1 = h1.decode('ascii')
                 shape1 = shape_from_header(h1)
-                data1 = np.fromfile(bf1, 'float64', np.prod(shape1))
+                data1 = read_array(bf1, 'float64', np.prod(shape1))
                 data1 = data1.reshape(shape1, order='F')[..., args['vidxs1']]
                 idx1 = indices_from_header(h1)
                 # Define the write binary header
@@ -121,13 +122,13 @@ def parallel_combine_by_boxes_offsets(args):
                 # Write the header
                 bfw.write(hw)
                 # Get the data in the second file
-                with open(bf_path2, 'rb') as bf2:
+                with open_binary(bf_path2) as bf2:
                     bf2.seek(offset2)
                     h2 = bf2.readline()
                     h2 = h2.decode('ascii')
                     shape2 = shape_from_header(h2)
                     idx2 = indices_from_header(h2)
-                    data2 = np.fromfile(bf2, 'float64', np.prod(shape2))
+                    data2 = read_array(bf2, 'float64', np.prod(shape2))
                 data2 = data2.reshape(shape2, order='F')[..., args['vidxs2']]
                 # Write the header and data
                 dataw = np.concatenate([data1.flatten(order='F'),
@@ -349,38 +350,38 @@ def combine(pck1, pck2, pltout=None,
     pck1.make_dir_tree(pltout)
     # Write the new global header
     pck1.write_global_header_new_fields(pltout, cbvars)
-    pool = multiprocessing.Pool()
-    # Combine the plotfile using the required mode
-    print(f'Combining files with mode {cbmode}')
-    for lv in range(pck1.limit_level + 1):
-        print(f'Level {lv}...')
-        lvstart = time.time()
-        # Boxes are in the same files in the same order
-        if cbmode == "byfile":
-            new_offsets = pool.map(parallel_combine_by_binfile,
-                                   pck1.by_binfile_output(pck2, lv, pltout,
-                                                                  vidxs1=vidxs1,
-                                                                  vidxs2=vidxs2))
-        # Boxes are in the same files by with different orders
-        elif cbmode == "byoffset":
-            new_offsets = pool.map(parallel_combine_by_binfile_offsets,
-                                   pck1.by_matched_offsets_output(pck2, lv, pltout, 
-                                                                  vidxs1=vidxs1,
-                                                                  vidxs2=vidxs2))
-        # Boxes are in different files (first plotfile structure is kept)
-        elif cbmode == "bybox":
-            new_offsets = tqdm(pool.imap(parallel_combine_by_boxes_offsets,
-                                         pck1.by_matched_offsets_output(pck2, lv, pltout,
-                                                                        vidxs1=vidxs1,
-                                                                        vidxs2=vidxs2)),
-                               total=len(np.unique(pck1.cells[lv]['files'])))
-        # Reorder the offsets to match the box order
-        mapped_offsets = np.empty(len(pck1.boxes[lv]), dtype=int)
-        for file_idxs, offsets in zip(pck1.map_bfile_offsets(lv), new_offsets):
-            mapped_offsets[file_idxs] = offsets
-        # Write the new level header
-        rewrite_level_header(pck1, pck2, pltout, lv, nfields, 
-                             mapped_offsets, vidxs1, vidxs2)
+    with profile_pool(multiprocessing.Pool()) as pool:
+        # Combine the plotfile using the required mode
+        print(f'Combining files with mode {cbmode}')
+        for lv in range(pck1.limit_level + 1):
+            print(f'Level {lv}...')
+            lvstart = time.time()
+            # Boxes are in the same files in the same order
+            if cbmode == "byfile":
+                new_offsets = pool.map(parallel_combine_by_binfile,
+                                       pck1.by_binfile_output(pck2, lv, pltout,
+                                                                      vidxs1=vidxs1,
+                                                                      vidxs2=vidxs2))
+            # Boxes are in the same files by with different orders
+            elif cbmode == "byoffset":
+                new_offsets = pool.map(parallel_combine_by_binfile_offsets,
+                                       pck1.by_matched_offsets_output(pck2, lv, pltout, 
+                                                                      vidxs1=vidxs1,
+                                                                      vidxs2=vidxs2))
+            # Boxes are in different files (first plotfile structure is kept)
+            elif cbmode == "bybox":
+                new_offsets = tqdm(pool.imap(parallel_combine_by_boxes_offsets,
+                                             pck1.by_matched_offsets_output(pck2, lv, pltout,
+                                                                            vidxs1=vidxs1,
+                                                                            vidxs2=vidxs2)),
+                                   total=len(np.unique(pck1.cells[lv]['files'])))
+            # Reorder the offsets to match the box order
+            mapped_offsets = np.empty(len(pck1.boxes[lv]), dtype=int)
+            for file_idxs, offsets in zip(pck1.map_bfile_offsets(lv), new_offsets):
+                mapped_offsets[file_idxs] = offsets
+            # Write the new level header
+            rewrite_level_header(pck1, pck2, pltout, lv, nfields, 
+                                 mapped_offsets, vidxs1, vidxs2)
 
-        print(f"Combined Level {lv} ({time.time() - lvstart:.2f} s)")
+            print(f"Combined Level {lv} ({time.time() - lvstart:.2f} s)")
 
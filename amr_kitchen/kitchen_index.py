@@ -0,0 +1,77 @@
+"""
+Portable binary index of the parsed plotfile headers (.kidx files
+written by marinate and loaded by PlotfileCooker.from_index)
+"""
+import os
+import json
+import numpy as np
+
+KITCHEN_INDEX_MAGIC = b"AMRKIDX\n"
+KITCHEN_INDEX_VERSION = 1
+KITCHEN_INDEX_EXT = ".kidx"
+# Alignment in bytes of the arrays in the index file
+KITCHEN_INDEX_ALIGN = 64
+
+def write_kitchen_index(path, header, arrays):
+    """
+    Write a kitchen index file made of:
+    - KITCHEN_INDEX_MAGIC (8 bytes)
+    - the size of the JSON header (little endian uint64)
+    - the JSON header (utf-8) with the index version, the header
+      data and the dtype, shape and offset of each array relative
+      to the end of the JSON header
+    - the arrays in C order at offsets aligned on KITCHEN_INDEX_ALIGN
+      bytes from the start of the file (so they can be memory mapped)
+    header: JSON serializable dictionary
+    arrays: dictionary of numpy arrays
+    """
+    table = {}
+    data = []
+    position = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        table[name] = {"dtype":arr.dtype.str,
+                       "shape":list(arr.shape),
+                       "offset":position}
+        data.append((position, arr))
+        position += -(-arr.nbytes // KITCHEN_INDEX_ALIGN) * KITCHEN_INDEX_ALIGN
+    header = dict(header, version=KITCHEN_INDEX_VERSION, arrays=table)
+    text = json.dumps(header).encode('utf-8')
+    # Pad the header with spaces so the arrays are aligned
+    data_start = -(-(16 + len(text)) // KITCHEN_INDEX_ALIGN) * KITCHEN_INDEX_ALIGN
+    text = text.ljust(data_start - 16)
+    # Never leave a partially written index
+    tmp_path = path + f".{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as ifile:
+        ifile.write(KITCHEN_INDEX_MAGIC)
+        ifile.write(len(text).to_bytes(8, 'little'))
+        ifile.write(text)
+        for offset, arr in data:
+            ifile.seek(data_start + offset)
+            ifile.write(arr.tobytes())
+        ifile.truncate(data_start + position)
+    os.replace(tmp_path, path)
+    return path
+
+def read_kitchen_index(path):
+    """
+    Read the JSON header of a kitchen index file and memory map
+    its arrays (see write_kitchen_index for the format)
+    returns the header and a dictionary of read-only array views
+    """
+    with open(path, 'rb') as ifile:
+        if ifile.read(8) != KITCHEN_INDEX_MAGIC:
+            raise ValueError(f"{path} is not a kitchen index file")
+        size = int.from_bytes(ifile.read(8), 'little')
+        header = json.loads(ifile.read(size).decode('utf-8'))
+    if header["version"] != KITCHEN_INDEX_VERSION:
+        raise ValueError((f"Unsupported kitchen index version {header['version']}"
+                          f" (expected {KITCHEN_INDEX_VERSION})"))
+    data = np.memmap(path, dtype='uint8', mode='r')
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        arrays[name] = np.ndarray(spec["shape"],
+                                  dtype=np.dtype(spec["dtype"]),
+                                  buffer=data,
+                                  offset=16 + size + spec["offset"])
+    return header, arrays
@@ -1,6 +1,185 @@
 import numpy as np
-from .utils import expand_array
+from .utils import expand_array, coarsen_array, coarsen_counts
+from amr_kitchen.profiling import open_binary, read_array, pread_into
 
+# Contiguous runs of plane data shorter than this are not read
+# separately, the whole field block of the box is read instead
+# (always the case for the planes normal to x, whose runs are
+# one value long)
+PLANE_RUN_MIN_BYTES = 256
+# Buffer size used to read the box headers
+HEADER_BUFFER_BYTES = 512
+
+
+def read_box_planes(bf, start, shape, cn, first, count,
+                    min_run_bytes=PLANE_RUN_MIN_BYTES):
+    """
+    Read consecutive planes normal to the cn axis from the Fortran
+    ordered data of a field in a box. A plane normal to z is a single
+    contiguous run, normal to y it is a run of shape[0] values in
+    each z layer and normal to x every value is in a different row.
+    When the runs are shorter than min_run_bytes the whole field
+    block is read instead, so with the default threshold the planes
+    normal to x are never read alone (runs of count values)
+    ___
+    bf: binary file opened with open_binary
+    start: position of the field data in the binary file
+    shape: shape of the box (3 values)
+    cn: normal axis of the planes
+    first: index of the first plane along the normal axis
+    count: number of consecutive planes to read
+    min_run_bytes: minimum size in bytes of the contiguous runs read
+                   separately (PLANE_RUN_MIN_BYTES by default)
+    returns a list of count 2D arrays (the normal axis is removed)
+    """
+    shape = tuple(int(n) for n in shape)
+    # Values between two planes and number of runs of each plane
+    stride = int(np.prod(shape[:cn]))
+    nruns = int(np.prod(shape[cn + 1:]))
+    run = stride * count
+    if run * 8 >= min_run_bytes or nruns == 1:
+        data = np.empty(nruns * run, dtype='float64')
+        buffer = data.view('uint8')
+        for r in range(nruns):
+            position = start + (r * stride * shape[cn] + first * stride) * 8
+            pread_into(bf, buffer[r * run * 8:(r + 1) * run * 8], position)
+        planes = data.reshape(shape[:cn] + (count,) + shape[cn + 1:], order='F')
+    else:
+        data = np.empty(int(np.prod(shape)), dtype='float64')
+        pread_into(bf, data.view('uint8'), start)
+        planes = data.reshape(shape, order='F')
+        planes = planes[(slice(None),) * cn + (slice(first, first + count),)]
+    return [planes[(slice(None),) * cn + (i,)] for i in range(count)]
+
+
+
+def output_window(indexes, cx, cy, Lv, target_level):
+    """
+    Slice indexes of a box in the output grid at target_level
+    and function resampling the box data to the output grid
+    (the data of the coarser levels is repeated and the data
+    of the finer levels is averaged down)
+    ___
+    indexes: indices of the box at its level
+    cx, cy: axes of the output grid
+    Lv: level of the box
+    target_level: level of the output grid
+    returns ([x_start, x_stop], [y_start, y_stop], resample, counts)
+    with counts the number of cells of the box averaged in each
+    output cell for the finer levels (None for the other levels)
+    """
+    if Lv <= target_level:
+        # Factor between curent grid and covering grid
+        factor = 2**(target_level - Lv)
+        sx = [indexes[0][cx] * factor, (indexes[1][cx] + 1) * factor]
+        sy = [indexes[0][cy] * factor, (indexes[1][cy] + 1) * factor]
+        counts = None
+
+        def resample(arr):
+            return expand_array(arr, factor)
+    else:
+        # Factor between the output grid and the current grid
+        factor = 2**(Lv - target_level)
+        sx = [indexes[0][cx] // factor, -(-(indexes[1][cx] + 1) // factor)]
+        sy = [indexes[0][cy] // factor, -(-(indexes[1][cy] + 1) // factor)]
+        start = (indexes[0][cx], indexes[0][cy])
+        # The blocks on the box edges can be partially covered
+        counts = coarsen_counts((indexes[1][cx] - indexes[0][cx] + 1,
+                                 indexes[1][cy] - indexes[0][cy] + 1),
+                                factor, start)
+
+        def resample(arr):
+            return coarsen_array(arr, factor, start)
+    return sx, sy, resample, counts
+
+def slice_plane_indices(args, shape):
+    """
+    Normal grid of a box and normal indices of the planes on
+    each side of the slicing plane (None if there is no plane
+    in the box on that side)
+    ___
+    args: slice_box input of the box
+    shape: shape of the box (3 values)
+    returns (normal_grid, idx_left, idx_right)
+    """
+    pos = args['pos']
+    box = args['box']
+    cn = args['cn']
+    dx = args['dx']
+    Lv = args['Lv']
+    # Compute the grid in the normal direction
+    normal_grid = np.linspace(box[cn][0] + dx[Lv][cn]/2,
+                              box[cn][1] - dx[Lv][cn]/2,
+                              shape[cn])
+    
+    # Normal indices of the planes on each side of the slice
+    # Case when the plane is between the last point and the left edge
+    if pos > normal_grid[shape[cn] - 1]:
+        # Slice is at the end of the box in the normal direction
+        # (Only write to left interpolation plane)
+        idx_left, idx_right = shape[cn] - 1, None
+    # Case when the plane is between the first point and the right edge
+    elif pos < normal_grid[0]:
+        # Slice is at the beginning of the box
+        # (Only write to right interpolation plane)
+        idx_left, idx_right = None, 0
+    # Case when the plane lands on a grid point
+    elif np.isclose(pos, normal_grid).any():
+        # Put left and right interpolation on the same point
+        match_idx = np.where(np.isclose(pos, normal_grid))[0][0]
+        idx_left, idx_right = match_idx, match_idx
+    # Case when the plane is between grid points in the box
+    else:
+        # Slice on both sides
+        idx_left = np.where(pos > normal_grid)[0][-1]
+        idx_right = np.where(pos < normal_grid)[0][0]
+    return normal_grid, idx_left, idx_right
+
+def slice_box_output(args, plane_arrays, first, normal_grid,
+                     idx_left, idx_right, header):
+    """
+    Output of slice_box from the planes read in a box
+    ___
+    args: slice_box input of the box
+    plane_arrays: list of the consecutive planes of each field
+                  starting at the normal index first
+    normal_grid, idx_left, idx_right: from slice_plane_indices
+    header: header of the box in the binary file
+    """
+    Lv = args['Lv']
+    # Slice indexes in the output grid
+    sx, sy, resample, counts = output_window(args['indexes'], args['cx'], args['cy'],
+                                             Lv, args['target_level'])
+
+    def side_output(idx):
+        # Data of the plane at the normal index idx on the output grid
+        return {'sx':sx, # Slice in target_level grid
+                'sy':sy,
+                'data':[resample(planes[idx - first])
+                        for planes in plane_arrays],
+                'normal':normal_grid[idx], # normal position for interpolation
+                'level':Lv,
+                'counts':counts} # Cells averaged in each output cell
+
+    # Create output depending on slice position
+    output = [None, None]
+    if idx_left is not None:
+        output[0] = side_output(idx_left)
+    if idx_right is not None:
+        output[1] = side_output(idx_right)
+    # Keep to recreate the 2D plotfile
+    output.append(header)
+    output.append(args["bidx"])
+
+    return output 
+
+def box_shape(indexes):
+    """
+    Shape of a 3D box from its indices
+    """
+    return (indexes[1][0] - indexes[0][0] + 1,
+            indexes[1][1] - indexes[0][1] + 1,
+            indexes[1][2] - indexes[0][2] + 1)
 
 def slice_box(args):
     """
@@ -29,147 +208,92 @@ def slice_box(args):
             'level' : amr_level}                   # AMR level of the data
     """
     # Unpack input
-    Lv = args['Lv']
-    pos = args['pos']
     fidxs = args['fidxs']
-    limit_level = args['limit_level']
-    # Get the cell data from the PlotfileCooker class
-    indexes = args['indexes']
     cfile = args['cfile']
     offset = args['offset']
-    box = args['box']
-    cx = args['cx']
-    cy = args['cy']
     cn = args['cn']
-    dx = args['dx']
-    # Factor between curent grid and covering grid
-    factor = 2**(limit_level - Lv)
-    # Compute the slice indexes for the global grid
-    x_start = indexes[0][cx] * factor
-    x_stop = (indexes[1][cx] + 1) * factor
-    y_start = indexes[0][cy] * factor
-    y_stop = (indexes[1][cy] + 1) * factor
-    shape = (indexes[1][0] - indexes[0][0] + 1,
-             indexes[1][1] - indexes[0][1] + 1,
-             indexes[1][2] - indexes[0][2] + 1)
+    shape = box_shape(args['indexes'])
+    # Planes on each side of the slice
+    normal_grid, idx_left, idx_right = slice_plane_indices(args, shape)
+    plane_idxs = [idx for idx in [idx_left, idx_right] if idx is not None]
+    first = int(min(plane_idxs))
+    count = int(max(plane_idxs)) - first + 1
 
-    # Compute the grid in the normal direction
-    normal_grid = np.linspace(box[cn][0] + dx[Lv][cn]/2,
-                              box[cn][1] - dx[Lv][cn]/2,
-                              shape[cn])
-    
-    # Size on disk of the data slice
+    # Size on disk of the data of a field
     byte_size = np.prod(shape)
-    # A list of arrays for output
-    data_arrays = []
+    # The planes of each field
+    plane_arrays = []
     # Open the binary file even if we may be only looking
     # For the grid level
-    with open(cfile, "rb") as f:
-        # For each field index
+    with open_binary(cfile, buffering=HEADER_BUFFER_BYTES) as f:
+        # Read the box header
+        f.seek(offset)
+        header = f.readline()
+        data_start = offset + len(header)
         for fidx in fidxs:
-            # Try to catch fidx = None
-            try:
-                # Go to the cell start
-                f.seek(offset)
-                # Skip the header
-                header = f.readline()
-                # Go to the field we want
-                f.seek(byte_size*8*fidx, 1)
-                # Could be optimized by reading contiguous fields
-                # At once especially if all the data is requested
-                # Read the data
-                arr = np.fromfile(f, "float64", byte_size)
-                # Fortran order perhaps a legacy of the early AMReX
-                # versions
-                arr = arr.reshape(shape, order="F")
-                data_arrays.append(arr)
-            # If fidx is None (for grid_level) we catch it 
-            except TypeError:
-                # level is always added to the output
-                pass
-
-    # Slice indexes for the data array
-    arr_indices = [0, 0, 0]
-    arr_indices[cx] = slice(0, shape[cx])
-    arr_indices[cy] = slice(0, shape[cy])
-    # Create output depending on slice position
-    output = [None, None]
-    # Case when the plane is between the last point and the left edge
-    if pos > normal_grid[shape[cn] - 1]:
-        # Slice is at the end of the box in the normal direction
-        arr_indices[cn] = shape[cn] - 1
-        # THIS IS WHERE THE MANDOLINE HAPPENS YEHAW
-        arr_data = [arr[tuple(arr_indices)] for arr in data_arrays]
-        # Only write to left interpolation plane
-        output[0] = {'sx':[x_start, x_stop], # Slice in limit_level grid
-                     'sy':[y_start, y_stop], 
-                     'data':[expand_array(arr, factor) for arr in arr_data], # Expanded data
-                     'normal':normal_grid[shape[cn] - 1], # normal position for interpolation
-                     'level':Lv}
-    
-    # Case when the plane is between the first point and the right edge
-    elif pos < normal_grid[0]:
-        # Slice is at the beginning of the box
-        arr_indices[cn] = 0
-        # Slice the data (MANDOLINE REAL GOURMET)
-        arr_data = [arr[tuple(arr_indices)] for arr in data_arrays]
-        # Only write to right interpolation plane
-        output[1] = {'sx':[x_start, x_stop],
-                     'sy':[y_start, y_stop],  # Slice in limit_level grid
-                     'data':[expand_array(arr, factor) for arr in arr_data],  # Expanded data
-                     'normal':normal_grid[0],  # normal position for interpolation
-                     'level':Lv}
-        
-    # Case when the plane lands on a grid point
-    elif np.isclose(pos, normal_grid).any():
-        # Find out which point index
-        match_idx = np.where(np.isclose(pos, normal_grid))[0][0]
-        # Slice directly at the intersect point
-        arr_indices[cn] = match_idx
-        arr_data = [arr[tuple(arr_indices)] for arr in data_arrays]
-        # Put left and right interpolation on the same point
-        output[0] = {'sx':[x_start, x_stop], 
-                     'sy':[y_start, y_stop],  # Slice in limit_level grid
-                     'data':[expand_array(arr, factor) for arr in arr_data],  # Expanded data
-                     'normal':normal_grid[match_idx],  # normal position for interpolation
-                     'level':Lv}
-        # We could only keep it on one side since its the same data and remember which side
-        # It is when we do the interpolation, and dont interpolate when the normal coordinate
-        # is equal to the slice coordinate. (#TODO)
-        output[1] = {'sx':[x_start, x_stop], 
-                     'sy':[y_start, y_stop],  # Slice in limit_level grid
-                     'data':[expand_array(arr, factor) for arr in arr_data],  # Expanded data
-                     'normal':normal_grid[match_idx],  # normal position for interpolation
-                     'level':Lv}
+            # fidx is None for the grid level
+            # (level is always added to the output)
+            if fidx is None:
+                continue
+            # THIS IS WHERE THE MANDOLINE HAPPENS YEHAW
+            # Only the planes are read (MANDOLINE REAL GOURMET)
+            plane_arrays.append(read_box_planes(f,
+                                                data_start + byte_size * 8 * fidx,
+                                                shape,
+                                                cn,
+                                                first,
+                                                count))
 
-    # Case when the plane is between grid points in the box
-    else:
-        # Slice on both sides
-        idx_left = np.where(pos > normal_grid)[0][-1]
-        idx_right = np.where(pos < normal_grid)[0][0]
-        # Each point to its interpolation plane
-        arr_indices[cn] = idx_left
-        arr_data = [arr[tuple(arr_indices)] for arr in data_arrays]
-        # Maybe we dont need to copy the slice (#TODO)
-        output[0] = {'sx':[x_start, x_stop], 
-                     'sy':[y_start, y_stop],  # Slice in limit_level grid
-                     'data':[expand_array(arr, factor).copy() for arr in arr_data], 
-                     'normal':normal_grid[idx_left],  # normal position for interpolation
-                     'level':Lv}
-        # Right plane
-        arr_indices[cn] = idx_right
-        arr_data = [arr[tuple(arr_indices)] for arr in data_arrays]
-        # Maybe we dont need to copy the slice (#TODO)
-        output[1] = {'sx':[x_start, x_stop], 
-                     'sy':[y_start, y_stop],  # Slice in limit_level grid
-                     'data':[expand_array(arr, factor).copy() for arr in arr_data], 
-                     'normal':normal_grid[idx_right],  # normal position for interpolation
-                     'level':Lv}
-    # Keep to recreate the 2D plotfile
-    output.append(header)
-    output.append(args["bidx"])
+    return slice_box_output(args, plane_arrays, first, normal_grid,
+                            idx_left, idx_right, header)
 
-    return output 
+def slice_box_many(args):
+    """
+    Multiprocessing function slicing a AMR cell with several planes
+    (Mandoline.slice_many). The box header and the data of each field
+    are read once and all the planes are taken from it
+    ----
+    args: list of the slice_box inputs of the same box (one for each
+          slicing plane intersecting the box)
+    returns the list of the slice_box outputs for each input
+    """
+    # A single plane only needs the plane data
+    if len(args) == 1:
+        return [slice_box(args[0])]
+    # Same box and fields for all inputs
+    fidxs = args[0]['fidxs']
+    cfile = args[0]['cfile']
+    offset = args[0]['offset']
+    shape = box_shape(args[0]['indexes'])
+    # Size on disk of the data of a field
+    byte_size = np.prod(shape)
+    # The data of each field
+    field_arrays = []
+    with open_binary(cfile, buffering=HEADER_BUFFER_BYTES) as f:
+        # Read the box header
+        f.seek(offset)
+        header = f.readline()
+        data_start = offset + len(header)
+        for fidx in fidxs:
+            # fidx is None for the grid level
+            if fidx is None:
+                continue
+            data = np.empty(byte_size, dtype='float64')
+            pread_into(f, data.view('uint8'), data_start + byte_size * 8 * fidx)
+            field_arrays.append(data.reshape(shape, order='F'))
+    # Slice the data for each plane
+    outputs = []
+    for inp in args:
+        cn = inp['cn']
+        normal_grid, idx_left, idx_right = slice_plane_indices(inp, shape)
+        plane_idxs = [idx for idx in [idx_left, idx_right] if idx is not None]
+        first = int(min(plane_idxs))
+        plane_arrays = [[np.take(arr, idx, axis=cn)
+                         for idx in range(first, int(max(plane_idxs)) + 1)]
+                        for arr in field_arrays]
+        outputs.append(slice_box_output(inp, plane_arrays, first, normal_grid,
+                                        idx_left, idx_right, header))
+    return outputs
 
 
 def plate_box(args):
@@ -194,7 +318,6 @@ def plate_box(args):
     # Unpack input
     Lv = args['Lv']
     fidxs = args['fidxs']
-    limit_level = args['limit_level']
     # Get the cell data from the PlotfileCooker class
     indexes = args['indexes']
     cfile = args['cfile']
@@ -203,13 +326,8 @@ def plate_box(args):
     cx = args['cx']
     cy = args['cy']
     dx = args['dx']
-    # Factor between curent grid and covering grid
-    factor = 2**(limit_level - Lv)
-    # Compute the slice indexes for the global grid
-    x_start = indexes[0][cx] * factor
-    x_stop = (indexes[1][cx] + 1) * factor
-    y_start = indexes[0][cy] * factor
-    y_stop = (indexes[1][cy] + 1) * factor
+    # Compute the slice indexes for the output grid
+    sx, sy, resample, counts = output_window(indexes, cx, cy, Lv, args['target_level'])
     shape = (indexes[1][0] - indexes[0][0] + 1,
              indexes[1][1] - indexes[0][1] + 1,)
 
@@ -219,7 +337,7 @@ def plate_box(args):
     data_arrays = []
     # Open the binary file even if we may be only looking
     # For the grid level
-    with open(cfile, "rb") as f:
+    with open_binary(cfile) as f:
         # For each field index
         for fidx in fidxs:
             # Try to catch fidx = None
@@ -233,7 +351,7 @@ def plate_box(args):
                 # Could be optimized by reading contiguous fields
                 # At once especially if all the data is requested
                 # Read the data
-                arr = np.fromfile(f, "float64", byte_size)
+                arr = read_array(f, "float64", byte_size)
                 # Fortran order perhaps a legacy of the early AMReX
                 # versions
                 arr = arr.reshape(shape, order="F")
@@ -243,10 +361,11 @@ def plate_box(args):
                 # level is always added to the output
                 pass
     # No mandoline here
-    output = {'sx':[x_start, x_stop], 
-              'sy':[y_start, y_stop],  # Slice in limit_level grid
-              'data':[expand_array(arr, factor) for arr in data_arrays], 
+    output = {'sx':sx, 
+              'sy':sy,  # Slice in target_level grid
+              'data':[resample(arr) for arr in data_arrays], 
               'level':Lv,
+              'counts':counts,
               'header':header}
 
     return output 
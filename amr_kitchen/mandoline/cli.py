@@ -13,8 +13,19 @@ from amr_kitchen import PlotfileCooker
 from .utils import sanitize_field_name, plotfile_ndims
 #from .blade import slice_box, plate_box
 from .mandoline import Mandoline
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 
+def parse_slice_arg(arg):
+    """
+    Parse a slice of the --slices argument (normal:position
+    or normal) to a (normal, position) tuple
+    """
+    normal, _, pos = arg.partition(':')
+    if pos == '':
+        return int(normal), None
+    return int(normal), float(pos)
+
 def main():
     """
     Main function running the mandoline Command Line Tool
@@ -33,6 +44,12 @@ def main():
     parser.add_argument(
             "--position", "-p", type=float,
             help="position of the slice, defaults to domain center")
+    parser.add_argument(
+            "--slices", "-S", type=str, nargs='+',
+            help=("Several slices computed reading the plotfile once, given"
+                  " as normal:position (e.g. 0:0.01 2:0.005) or as normal"
+                  " for a slice at the domain center (overrides --normal"
+                  " and --position)"))
     parser.add_argument(
             "--variables", "-v", type=str, nargs='+',
             help=("variables names to slice, defaults to \"density\""
@@ -41,6 +58,16 @@ def main():
     parser.add_argument(
             "--max_level", "-L", type=int,
             help="Maximum AMR level loaded, defaults to finest level")
+    parser.add_argument(
+            "--target_level", "-t", type=int,
+            help=("AMR level of the grid of the image and array outputs, the"
+                  " finer levels are averaged down to it, defaults to"
+                  " --max_level"))
+    parser.add_argument(
+            "--resolution", "-r", type=int,
+            help=("Number of cells of the image and array outputs along the"
+                  " largest dimension of the domain, the coarsest level"
+                  " with at least this resolution is used as target level"))
     parser.add_argument(
             "--serial", "-s", action='store_true',
             help="Flag to disable multiprocessing")
@@ -73,7 +100,11 @@ def main():
             "--verbose", "-V", type=int,
             help="Verbosity level, defaults to 1")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
 
     # Class to handle slice parameters
     # Define the data needed for the slice
@@ -84,7 +115,26 @@ def main():
                      fields=args.variables,
                      limit_level=args.max_level,
                      serial=args.serial,
-                     verbose=args.verbose)
+                     verbose=args.verbose,
+                     target_level=args.target_level,
+                     resolution=args.resolution)
+
+    # Do many slices
+    if args.slices is not None:
+        slices = [parse_slice_arg(arg) for arg in args.slices]
+        # Number the output files of each slice
+        if args.output is not None:
+            outfiles = [f"{args.output}_{i}" for i in range(len(slices))]
+        else:
+            outfiles = None
+        mand.slice_many(slices,
+                        outfiles=outfiles,
+                        fformat=args.format,
+                        uselog=args.log,
+                        cmap=args.colormap,
+                        vmin=args.minimum,
+                        vmax=args.maximum)
+        return
 
     # Do one slice
     mand.slice(normal=args.normal,
@@ -1,13 +1,13 @@
 import os
 import time
-import multiprocessing
 import shutil
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import open_binary
 from .utils import expand_array
-from .blades import slice_box, plate_box
+from .blades import slice_box, slice_box_many, plate_box
 
 
 class Mandoline(PlotfileCooker):
@@ -23,7 +23,8 @@ class Mandoline(PlotfileCooker):
                        'dx', 'slice_normal', 'slice_pos']
 
     def __init__(self, plotfile, fields=None, limit_level=None,
-                 serial=False, verbose=None):
+                 serial=False, verbose=None, target_level=None,
+                 resolution=None):
         """
         Constructor for the mandoline object
         ----
@@ -43,6 +44,14 @@ class Mandoline(PlotfileCooker):
 
         verbose:     Verbosity level for the informational output
 
+        target_level: Level of the grid of the uniform slices (array,
+                      image and return outputs), the finer levels are
+                      averaged down to it. Defaults to limit_level
+
+        resolution:  Number of cells of the uniform slices along the
+                     largest dimension of the domain, the target_level
+                     is the coarsest level with at least this resolution
+
         """
         # Verbosity level
         if verbose is None:
@@ -60,6 +69,8 @@ class Mandoline(PlotfileCooker):
         self.slicefields, self.fidxs, self.do_grid = self.parse_input_fields(fields)
         # Number of fields
         self.nfidxs = len([i for i in self.fidxs if i is not None])
+        # Level of the uniform output grid
+        self.target_level = self.define_target_level(target_level, resolution)
         # Slicing normal and position
         self.cn = None
         self.cx = None
@@ -97,77 +108,223 @@ class Mandoline(PlotfileCooker):
         # Default output is user friendly image
         if fformat is None:
             fformat = "image"
-
-        # Object to store the slices
-        plane_data = []
+        self.check_output_level(fformat)
+
+        # The plotfile output keeps the data of each box to
+        # recreate the levels, for the other outputs the boxes
+        # are written to the slice planes as they are read
+        keep_boxes = fformat == "plotfile"
+        if keep_boxes:
+            plane_data = []
+        else:
+            planes = self.new_slice_planes()
         # For a given level
         for Lv in range(self.limit_level + 1):
             # Box reading timer
             read_start = time.time()
-            # Multiprocessing inputs
-            pool_inputs = self.compute_mpinput_3d(Lv)
+            # Multiprocessing inputs (the 2D plotfile output
+            # needs the covered boxes of the coarse levels)
+            pool_inputs = self.compute_mpinput_3d(Lv, skip_covered=not keep_boxes)
             # Read the data in parallel (or serial)
             # The box reader returns the slice at both sides of the slicing
             # Plane if available (i.e. not a boundary, or between boxes). 
             # This allows handling the case when the slice is between boxes
             # This function interpolate between the two planes and returns
-            if self.serial:
-                plane_data.append(list(map(slice_box, pool_inputs)))
+            outputs = self.stream_slice_outputs(slice_box,
+                                                pool_inputs,
+                                                self.slice_nbytes(pool_inputs),
+                                                ordered=keep_boxes)
+            if keep_boxes:
+                plane_data.append(list(outputs))
             else:
-                with multiprocessing.Pool() as pool:
-                    plane_data.append(pool.map(slice_box, pool_inputs))
+                # The levels are done sequentially so the
+                # finer data overwrites the coarser data
+                for output in outputs:
+                    self.add_slice_output(planes, output, Lv)
 
             if self.v > 0:
                 print(f"Time to read Lv {Lv}:", 
                       np.around(time.time() - read_start, 2))
 
-        # Interpolation timer
-        interp_start = time.time()
-        # Process the sliced box to create uniform grids
-        if fformat in ["array", "return", "image"]:
-            all_data = self.reducemp_data_ortho(plane_data)
-            if fformat == "return":
-                output = self.format_array_output(all_data)
-                return output
-            if fformat == "array":
-                if outfile is None:
-                    outfile = self.default_output_path()
-                outfile += ".npz"
-                output = self.format_array_output(all_data)
-                np.savez_compressed(outfile, **output)
-                return
-            if fformat == "image":
-                self.plot_slice(all_data, outfile, **pltkwargs)
+        if keep_boxes:
+            return self.write_slice_plotfile(plane_data, outfile)
+        all_data = self.interpolate_slice_planes(planes)
+        return self.output_slice(all_data, outfile, fformat, **pltkwargs)
+
+    def slice_many(self, slices, outfiles=None, fformat=None, **pltkwargs):
+        """
+        Compute several slices reading the boxes intersecting
+        the slicing planes once
+        ____
+        slices: list of (normal, pos) tuples for each slice, with the
+                same conventions as the arguments of Mandoline.slice
+                (pos can be None for the domain center)
+        outfiles: list of the output files of each slice (the default
+                  output file of each slice is used if None)
+        fformat: output format of the slices (see Mandoline.slice)
+        ----
+        pltkwargs are the keyword arguments of the plotting function
+        Returns the list of the outputs of each slice for
+        fformat="return" (a dict as in Mandoline.slice)
+        ```
+        mand = Mandoline("plt00100", fields="temp")
+        out_x, out_z = mand.slice_many([(0, 0.01), (2, None)], fformat="return")
+        ```
+        """
+        if self.ndims == 2:
+            raise ValueError("Multiple slices are only defined for 3D plotfiles")
+        if fformat is None:
+            fformat = "image"
+        self.check_output_level(fformat)
+        if outfiles is None:
+            outfiles = [None for _ in slices]
+        # Slicing coordinates of each slice
+        coords = [self.define_slicing_coordinates(normal, pos)
+                  for normal, pos in slices]
+        # The slicing coordinates of Mandoline.slice are
+        # restored after computing the slices
+        saved_coords = (self.cn, self.cx, self.cy, self.pos)
+        try:
+            return self.slice_batch(coords, outfiles, fformat, **pltkwargs)
+        finally:
+            self.cn, self.cx, self.cy, self.pos = saved_coords
+
+    def slice_batch(self, coords, outfiles, fformat, **pltkwargs):
+        """
+        Compute the slices of Mandoline.slice_many from their
+        slicing coordinates (cn, cx, cy, pos)
+        """
+        # Objects to store the slices (see Mandoline.slice)
+        keep_boxes = fformat == "plotfile"
+        if keep_boxes:
+            plane_data = [[] for _ in coords]
+        else:
+            planes = []
+            for coord in coords:
+                self.cn, self.cx, self.cy, self.pos = coord
+                planes.append(self.new_slice_planes())
+        for Lv in range(self.limit_level + 1):
+            read_start = time.time()
+            # Inputs of the slices intersecting each box
+            box_inputs = {}
+            for sid, coord in enumerate(coords):
+                self.cn, self.cx, self.cy, self.pos = coord
+                for p_in in self.compute_mpinput_3d(Lv, skip_covered=not keep_boxes):
+                    p_in['sid'] = sid
+                    box_inputs.setdefault(p_in['bidx'], []).append(p_in)
+                if keep_boxes:
+                    plane_data[sid].append([])
+            # Each box is read once for all the slices
+            pool_inputs = [box_inputs[bidx] for bidx in sorted(box_inputs)]
+            nbytes = [sum(self.slice_nbytes(inputs)) for inputs in pool_inputs]
+            box_outputs = self.stream_slice_outputs(slice_box_many,
+                                                    pool_inputs,
+                                                    nbytes,
+                                                    ordered=keep_boxes)
+            # Dispatch the planes to their slice
+            for outputs in box_outputs:
+                # The box index is the last item of the outputs
+                for p_in, output in zip(box_inputs[outputs[0][3]], outputs):
+                    sid = p_in['sid']
+                    if keep_boxes:
+                        plane_data[sid][Lv].append(output)
+                    else:
+                        self.cn, self.cx, self.cy, self.pos = coords[sid]
+                        self.add_slice_output(planes[sid], output, Lv)
 
+            if self.v > 0:
+                print(f"Time to read Lv {Lv} ({len(pool_inputs)} boxes):",
+                      np.around(time.time() - read_start, 2))
+        # Output each slice
+        all_outputs = []
+        for sid, coord in enumerate(coords):
+            self.cn, self.cx, self.cy, self.pos = coord
+            if keep_boxes:
+                all_outputs.append(self.write_slice_plotfile(plane_data[sid],
+                                                             outfiles[sid]))
+            else:
+                all_data = self.interpolate_slice_planes(planes[sid])
+                # Release the planes of the slice
+                planes[sid] = None
+                all_outputs.append(self.output_slice(all_data,
+                                                     outfiles[sid],
+                                                     fformat,
+                                                     **pltkwargs))
+        if fformat == "return":
+            return all_outputs
 
-        # For plotfiles we keep the data needed to reconstruct the multilevel grid
-        elif fformat == "plotfile":
-            output_start = time.time()
-            # Interpolate for each level
-            all_data_bylevel, indexes, headers  = self.interpolate_bylevel(plane_data)
-            # Define the plotfile name
+    def stream_slice_outputs(self, fun, pool_inputs, nbytes, ordered=False):
+        """
+        Apply the box slicing function to the pool inputs (in serial
+        or in parallel) and yield the outputs as they are computed
+        (in order if ordered=True). With transport="shared_memory", the
+        outputs of the worker processes are sent back through the shared
+        memory arena so only the boxes of a batch fitting in the arena
+        are in flight
+        ___
+        fun: slice_box or slice_box_many
+        pool_inputs: inputs of fun
+        nbytes: size in bytes of the arrays returned for each input
+        """
+        if self.serial:
+            for output in map(fun, pool_inputs):
+                yield output
+        else:
+            # Reuse the worker pool of the PlotfileCooker
+            for output in self.pool_outputs(fun, pool_inputs, nbytes,
+                                            ordered=ordered):
+                yield output
+
+    def output_slice(self, all_data, outfile, fformat, **pltkwargs):
+        """
+        Save the interpolated slice data in the array, image
+        or return output format (see Mandoline.slice)
+        """
+        if fformat == "return":
+            output = self.format_array_output(all_data)
+            return output
+        if fformat == "array":
             if outfile is None:
                 outfile = self.default_output_path()
-            # Create the plotfile dir
-            try:
-                os.mkdir(outfile)
-            except FileExistsError:
-                shutil.rmtree(outfile)
-                os.mkdir(outfile)
-            # Rewrite the header
-            with open(os.path.join(outfile, "Header"), "w") as hfile:
-                self.write_2d_slice_global_header(hfile,
-                                                  self.fields_in_slice(),
-                                                  indexes)
-            # Write the level data
-            for lv in range(self.limit_level + 1):
-                self.write_cell_data_at_level(outfile,
-                                              lv,
-                                              all_data_bylevel[lv],
-                                              indexes[lv])
-            if self.v > 0:
-                print("Time to save AMReX plotfile: ", 
-                      np.around(time.time() - output_start, 2))
+            outfile += ".npz"
+            output = self.format_array_output(all_data)
+            np.savez_compressed(outfile, **output)
+            return
+        if fformat == "image":
+            self.plot_slice(all_data, outfile, **pltkwargs)
+
+    def write_slice_plotfile(self, plane_data, outfile):
+        """
+        Interpolate the sliced box data of each level and save
+        it in a 2D AMReX plotfile keeping the levels
+        """
+        # For plotfiles we keep the data needed to reconstruct the multilevel grid
+        output_start = time.time()
+        # Interpolate for each level
+        all_data_bylevel, indexes, headers  = self.interpolate_bylevel(plane_data)
+        # Define the plotfile name
+        if outfile is None:
+            outfile = self.default_output_path()
+        # Create the plotfile dir
+        try:
+            os.mkdir(outfile)
+        except FileExistsError:
+            shutil.rmtree(outfile)
+            os.mkdir(outfile)
+        # Rewrite the header
+        with open(os.path.join(outfile, "Header"), "w") as hfile:
+            self.write_2d_slice_global_header(hfile,
+                                              self.fields_in_slice(),
+                                              indexes)
+        # Write the level data
+        for lv in range(self.limit_level + 1):
+            self.write_cell_data_at_level(outfile,
+                                          lv,
+                                          all_data_bylevel[lv],
+                                          indexes[lv])
+        if self.v > 0:
+            print("Time to save AMReX plotfile: ", 
+                  np.around(time.time() - output_start, 2))
 
     def thick_slice(self, normal=None, pos=None, 
                     outfile=None, thickness=None):
@@ -207,7 +364,7 @@ class Mandoline(PlotfileCooker):
             outfile = self.default_output_path()
         # Multiprocessing
         if not self.serial:
-            pool = multiprocessing.Pool()
+            pool = self.pool()
         # The slice is just the header data
         # Object to store the slices
         plane_data = []
@@ -236,13 +393,17 @@ class Mandoline(PlotfileCooker):
         # Parse the multiprocessing output
         # Do levels sequentially to update with finer data
         for Lv in range(self.limit_level + 1):
+            # Cells of the level averaged in each output cell
+            if Lv > self.target_level:
+                counts = np.zeros(all_data[0].shape, dtype=int)
+            else:
+                counts = None
             for out in plane_data[Lv]:
                 # Add the slices if they are defined
                 xa, xo = out['sx']  # x slice
                 ya, yo = out['sy']  # y slice
                 # add the field data
-                for i in range(self.nfidxs):
-                    all_data[i][xa:xo, ya:yo] = out['data'][i]
+                self.write_window(all_data, out, counts)
                 # add the normal coordinate
                 # broadcast the grid level to the grid if needed
                 if self.do_grid:
@@ -374,6 +535,7 @@ class Mandoline(PlotfileCooker):
                      'cy':1,
                      'dx':self.dx,
                      'limit_level':self.limit_level,
+                     'target_level':self.target_level,
                      'fidxs':self.fidxs,
                      'Lv':lv,
                      'indexes':indexes,
@@ -383,43 +545,106 @@ class Mandoline(PlotfileCooker):
             pool_inputs.append(p_in) # Add to inputs
         return pool_inputs
 
-    def compute_mpinput_3d(self, lv):
+    def slicing_plane_bounds(self):
+        """
+        Lower and upper bounds of the slicing plane
+        """
+        plane_lo = np.array(self.geo_low, dtype=float)
+        plane_hi = np.array(self.geo_high, dtype=float)
+        plane_lo[self.cn] = self.pos
+        plane_hi[self.cn] = self.pos
+        return plane_lo, plane_hi
+
+    def covered_plane_cells(self, lv):
+        """
+        Boolean array of the cells of the slicing plane at level lv
+        (in the plane index space of the level) where the boxes of the
+        finer levels provide the data on both sides of the plane
+        """
+        shape = self.grid_sizes[lv][[self.cx, self.cy]]
+        left = np.zeros(shape, dtype=bool)
+        right = np.zeros(shape, dtype=bool)
+        plane_lo, plane_hi = self.slicing_plane_bounds()
+        for flv in range(lv + 1, self.limit_level + 1):
+            ratio = self.grid_sizes[flv][self.cx] // self.grid_sizes[lv][self.cx]
+            for idx in self.box_index().region_boxes(flv, plane_lo, plane_hi):
+                box = self.boxes[flv][idx]
+                indexes = self.cells[flv]['indexes'][idx]
+                # Coarse cells completely inside the box footprint
+                x_lo = -(-indexes[0][self.cx] // ratio)
+                x_hi = (indexes[1][self.cx] + 1) // ratio
+                y_lo = -(-indexes[0][self.cy] // ratio)
+                y_hi = (indexes[1][self.cy] + 1) // ratio
+                # Same sides as the planes returned by slice_box
+                first_pt = box[self.cn][0] + self.dx[flv][self.cn]/2
+                last_pt = box[self.cn][1] - self.dx[flv][self.cn]/2
+                if not self.pos < first_pt:
+                    left[x_lo:x_hi, y_lo:y_hi] = True
+                if not self.pos > last_pt:
+                    right[x_lo:x_hi, y_lo:y_hi] = True
+        return left & right
+
+    def compute_mpinput_3d(self, lv, skip_covered=False):
         """
         Find the intersecting boxes and add the to the
         multiprocessing input for a given level
+        skip_covered: if True the boxes where the finer levels
+                      provide the data on both sides of the
+                      slicing plane are not read
         """
         pool_inputs = []
-        # For each box in that level
-        for idx, box in enumerate(self.boxes[lv]):
-            # Check if the box intersect the slicing plane
-            if (box[self.cn][0] <= self.pos and 
-                box[self.cn][1] >= self.pos):
-                # ----
-                # Here, intersecting boxes at each level
-                # Are added to the slice, even if there are
-                # Higher level boxes covering the lower level
-                # Box region in the plane. This is a little
-                # wastefull as more data is readed than needed
-                # to create the plane, but finding if the box is
-                # Completely covered is a nightmare (and slower).
-                # -----
-                # Everything needed by the slice reader
-                p_in  = {'cx':self.cx,
-                         'cy':self.cy,
-                         'cn':self.cn,
-                         'dx':self.dx,
-                         'pos':self.pos,
-                         'limit_level':self.limit_level,
-                         'fidxs':self.fidxs,
-                         'Lv':lv,
-                         'bidx':idx,
-                         'indexes':self.cells[lv]['indexes'][idx],
-                         'cfile':self.cells[lv]['files'][idx],
-                         'offset':self.cells[lv]['offsets'][idx],
-                         'box':box}
-                pool_inputs.append(p_in) # Add to inputs
+        # Slicing plane bounds
+        plane_lo, plane_hi = self.slicing_plane_bounds()
+        # Plane cells covered by the finer levels
+        covered = None
+        if skip_covered and lv < self.limit_level:
+            covered = self.covered_plane_cells(lv)
+        # For each box intersecting the slicing plane
+        for idx in self.box_index().region_boxes(lv, plane_lo, plane_hi):
+            idx = int(idx)
+            box = self.boxes[lv][idx]
+            # Completely covered boxes are overwritten by
+            # the finer levels when reducing the data
+            if covered is not None:
+                indexes = self.cells[lv]['indexes'][idx]
+                if covered[indexes[0][self.cx]:indexes[1][self.cx] + 1,
+                           indexes[0][self.cy]:indexes[1][self.cy] + 1].all():
+                    continue
+            # Everything needed by the slice reader
+            p_in  = {'cx':self.cx,
+                     'cy':self.cy,
+                     'cn':self.cn,
+                     'dx':self.dx,
+                     'pos':self.pos,
+                     'limit_level':self.limit_level,
+                     'target_level':self.target_level,
+                     'fidxs':self.fidxs,
+                     'Lv':lv,
+                     'bidx':idx,
+                     'indexes':self.cells[lv]['indexes'][idx],
+                     'cfile':self.cells[lv]['files'][idx],
+                     'offset':self.cells[lv]['offsets'][idx],
+                     'box':box}
+            pool_inputs.append(p_in) # Add to inputs
         return pool_inputs
 
+    def slice_nbytes(self, pool_inputs):
+        """
+        Size in bytes of the expanded slice data on both
+        sides of the plane returned by slice_box for each box
+        """
+        nbytes = []
+        for inp in pool_inputs:
+            factor = 2.0**(inp['target_level'] - inp['Lv'])
+            shape = inp['indexes'][1] - inp['indexes'][0] + 1
+            # Rounded up for the finer levels averaged down
+            plane_size = int(np.ceil(shape[inp['cx']] * factor + 1)
+                             * np.ceil(shape[inp['cy']] * factor + 1))
+            # With the number of cells averaged in each output cell
+            narrays = self.nfidxs + int(factor < 1)
+            nbytes.append(2 * narrays * plane_size * 8)
+        return nbytes
+
     def define_slicing_coordinates(self, normal=None, pos=None):
         """
         Parse the normal and position input to define the slicing
@@ -573,16 +798,43 @@ class Mandoline(PlotfileCooker):
             else:
                 pass
 
+    def define_target_level(self, target_level=None, resolution=None):
+        """
+        Level of the grid of the uniform slices from the target_level
+        or resolution arguments of the constructor
+        """
+        if resolution is not None:
+            # Coarsest level with the requested resolution
+            for lv in range(self.limit_level + 1):
+                if np.max(self.grid_sizes[lv]) >= resolution:
+                    return lv
+            return self.limit_level
+        if target_level is None:
+            return self.limit_level
+        if target_level < 0 or target_level > self.limit_level:
+            raise ValueError(f"The target level {target_level} is not between"
+                             f" 0 and the limit level {self.limit_level}")
+        return target_level
+
+    def check_output_level(self, fformat):
+        """
+        The 2D plotfile output keeps the levels up to limit_level
+        """
+        if fformat == "plotfile" and self.target_level != self.limit_level:
+            raise ValueError("The plotfile output is not defined for a target"
+                             f" level ({self.target_level}) coarser than the"
+                             f" limit level ({self.limit_level})")
+
     def limit_level_arr(self):
         """
         Return an empty numpy array with the dimensions of the
-        limit_level grid
+        target_level grid (limit_level grid by default)
         """
         if (self.cx is None or
             self.cy is None):
             self.cn, self.cx, self.cy, self.pos = self.define_slicing_coordinates()
 
-        shape = self.grid_sizes[self.limit_level][[self.cx, self.cy]]
+        shape = self.grid_sizes[self.target_level][[self.cx, self.cy]]
         arr = np.empty(shape)
         return arr
 
@@ -592,65 +844,123 @@ class Mandoline(PlotfileCooker):
         Left and Right arrays for both sides of the plane
         (For orthogonal planes)
         """
+        planes = self.new_slice_planes()
+        # Do levels sequentially to update with finer data
+        for Lv in range(self.limit_level + 1):
+            for output in plane_data[Lv]:
+                self.add_slice_output(planes, output, Lv)
+        return self.interpolate_slice_planes(planes)
+
+    def new_slice_planes(self):
+        """
+        Preallocated arrays on both sides of the slicing plane in
+        which the output of slice_box is written as it is computed
+        """
         # Array for the "left" side of the plane (could be down whatever)
         left = {'data':[self.limit_level_arr() for _ in range(self.nfidxs)],
                 'normal':self.limit_level_arr()}
         # Array for the "right" or up side of the plane
         # The only convention is that "left" < slice_coordinate < "right"
         right = {'data':[self.limit_level_arr() for _ in range(self.nfidxs)],
-                'normal':self.limit_level_arr()}
+                 'normal':self.limit_level_arr()}
 
         if self.do_grid:
             grid_level = {'left':self.limit_level_arr(),
                           'right':self.limit_level_arr()}
         else:
             grid_level = None
+        # Number of cells of the finer levels averaged down
+        # in each cell of the target level grid
+        if self.target_level < self.limit_level:
+            shape = self.grid_sizes[self.target_level][[self.cx, self.cy]]
+            counts = {'left':np.zeros(shape, dtype=int),
+                      'right':np.zeros(shape, dtype=int),
+                      'level':None}
+        else:
+            counts = None
+        return {'left':left, 'right':right, 'grid_level':grid_level,
+                'counts':counts}
 
-        # Parse the multiprocessing output
-        # Do levels sequentially to update with finer data
-        for Lv in range(self.limit_level + 1):
-            first_grid_pt = self.geo_low[self.cn] + self.dx[Lv][self.cn]/2
-            last_grid_pt = self.geo_high[self.cn] - self.dx[Lv][self.cn]/2
-            for output in plane_data[Lv]:
-                # Add the slices if they are defined
-                if output[0] is not None:
-                    out = output[0]
-                    xa, xo = out['sx']  # x slice
-                    ya, yo = out['sy']  # y slice
-                    # add the field data
-                    for i, arr in enumerate(left['data']):
-                        left['data'][i][xa:xo, ya:yo] = out['data'][i]
-                    # add the normal coordinate
-                    left['normal'][xa:xo, ya:yo] = out['normal']
-                    # broadcast the grid level to the grid if needed
-                    if self.do_grid:
-                        grid_level['left'][xa:xo, ya:yo] = out['level']
-                    # Case when the slice plane is after the last grid
-                    if np.isclose(out['normal'], last_grid_pt):
-                        # add the field data
-                        for i, arr in enumerate(right['data']):
-                            right['data'][i][xa:xo, ya:yo] = out['data'][i]
-                        # add the normal coordinate
-                        right['normal'][xa:xo, ya:yo] = out['normal']
-                        
-                # Same for the right side
-                if output[1] is not None:
-                    out = output[1]
-                    xa, xo = out['sx']  # x slice
-                    ya, yo = out['sy']  # y slice
-                    for i, arr in enumerate(left['data']):
-                        right['data'][i][xa:xo, ya:yo] = out['data'][i]
-                    right['normal'][xa:xo, ya:yo] = out['normal']
-                    # broadcast the grid level to the grid if needed
-                    if self.do_grid:
-                        grid_level['right'][xa:xo, ya:yo] = out['level']
-                    # Case when the slice plane is before the first grid
-                    if np.isclose(out['normal'], first_grid_pt):
-                        # add the field data
-                        for i, arr in enumerate(left['data']):
-                            left['data'][i][xa:xo, ya:yo] = out['data'][i]
-                        # add the normal coordinate
-                        left['normal'][xa:xo, ya:yo] = out['normal']
+    def add_slice_output(self, planes, output, Lv):
+        """
+        Write the output of slice_box for a box at level Lv in the
+        slice planes (the levels must be added from coarse to fine
+        so the finer data overwrites the coarser data)
+        """
+        left = planes['left']
+        right = planes['right']
+        grid_level = planes['grid_level']
+        counts = planes['counts']
+        # The cells averaged down are only counted for the current level
+        if counts is not None and counts['level'] != Lv:
+            counts['left'][...] = 0
+            counts['right'][...] = 0
+            counts['level'] = Lv
+        first_grid_pt = self.geo_low[self.cn] + self.dx[Lv][self.cn]/2
+        last_grid_pt = self.geo_high[self.cn] - self.dx[Lv][self.cn]/2
+        sides = []
+        # Add the slices if they are defined
+        if output[0] is not None:
+            sides.append(('left', output[0]))
+            # Case when the slice plane is after the last grid
+            if np.isclose(output[0]['normal'], last_grid_pt):
+                sides.append(('right', output[0]))
+        # Same for the right side
+        if output[1] is not None:
+            sides.append(('right', output[1]))
+            # Case when the slice plane is before the first grid
+            if np.isclose(output[1]['normal'], first_grid_pt):
+                sides.append(('left', output[1]))
+        for side, out in sides:
+            xa, xo = out['sx']  # x slice
+            ya, yo = out['sy']  # y slice
+            # add the field data
+            self.write_window(planes[side]['data'],
+                              out,
+                              None if counts is None else counts[side])
+            # add the normal coordinate
+            planes[side]['normal'][xa:xo, ya:yo] = out['normal']
+            # broadcast the grid level to the grid if needed
+            if self.do_grid:
+                grid_level[side][xa:xo, ya:yo] = out['level']
+
+    def write_window(self, arrays, out, counts):
+        """
+        Write the data of a box output in its window of the arrays of
+        the output grid. The data of the finer levels averaged down
+        to the target level is averaged with the data of the boxes
+        of the same level written before in the cells they share
+        counts: number of cells of the level averaged in each cell
+                of the output grid (updated, None if not averaging)
+        """
+        xa, xo = out['sx']  # x slice
+        ya, yo = out['sy']  # y slice
+        if out.get('counts') is None:
+            for arr, data in zip(arrays, out['data']):
+                arr[xa:xo, ya:yo] = data
+            return
+        box_counts = out['counts']
+        # Cells partially covered by boxes written before
+        window_counts = counts[xa:xo, ya:yo]
+        shared = window_counts > 0
+        total = window_counts[shared] + box_counts[shared]
+        for arr, data in zip(arrays, out['data']):
+            window = arr[xa:xo, ya:yo]
+            merged = (window[shared] * window_counts[shared]
+                      + data[shared] * box_counts[shared]) / total
+            window[...] = data
+            window[shared] = merged
+        window_counts += box_counts
+
+    def interpolate_slice_planes(self, planes):
+        """
+        Linear interpolation between the planes on both sides
+        of the slicing plane, the interpolated data is written
+        in the left planes which are returned
+        """
+        left = planes['left']
+        right = planes['right']
+        grid_level = planes['grid_level']
         # Do the linear interpolation if normals are not the same
         # Empty arrays for the final data
         all_data = []
@@ -658,14 +968,16 @@ class Mandoline(PlotfileCooker):
         bint = ~np.isclose(left['normal'], right['normal'])
         # Iterate with the number of fields
         for i in range(self.nfidxs):
-            data = self.limit_level_arr()
+            data = left['data'][i]
             # Linear interpolation
-            term1 = left['data'][i][bint] * (right['normal'][bint] - self.pos) 
+            term1 = data[bint] * (right['normal'][bint] - self.pos) 
             term2 = right['data'][i][bint] * (self.pos - left['normal'][bint])
             term3 = right['normal'][bint] - left['normal'][bint]
             data[bint] =  (term1 + term2) / term3
             # Could be either
             data[~bint] = right['data'][i][~bint]
+            # The right side is not needed anymore
+            right['data'][i] = None
             # For some reason
             all_data.append(data.T)
 
@@ -763,17 +1075,18 @@ class Mandoline(PlotfileCooker):
             self.cy is None):
             self.cn, self.cx, self.cy, self.pos = self.define_slicing_coordinates()
         # grids a from x_lo + dx/2 to y_hi - dx/2 for cell centered data
+        lv = self.target_level
         x_grid = np.linspace(self.geo_low[self.cx]\
-                             + self.dx[self.limit_level][self.cx]/2,
+                             + self.dx[lv][self.cx]/2,
                              self.geo_high[self.cx]\
-                             - self.dx[self.limit_level][self.cx]/2,
-                             self.grid_sizes[self.limit_level][self.cx])
+                             - self.dx[lv][self.cx]/2,
+                             self.grid_sizes[lv][self.cx])
 
         y_grid = np.linspace(self.geo_low[self.cy]\
-                             + self.dx[self.limit_level][self.cy]/2,
+                             + self.dx[lv][self.cy]/2,
                              self.geo_high[self.cy]\
-                             - self.dx[self.limit_level][self.cy]/2,
-                             self.grid_sizes[self.limit_level][self.cy])
+                             - self.dx[lv][self.cy]/2,
+                             self.grid_sizes[lv][self.cy])
 
         return x_grid, y_grid
 
@@ -856,7 +1169,7 @@ class Mandoline(PlotfileCooker):
             cell_indexes.append(cidx)
             size_x = cidx[1][self.cx] - cidx[0][self.cx] + 1
             size_y = cidx[1][self.cy] - cidx[0][self.cy] + 1
-            total_size += size_x * size_y * self.nfidxs * 8
+            total_size += int(size_x * size_y) * self.nfidxs * 8
 
         # Divide by 1 MB and add one so there is a file
         nfiles = total_size // int(1e6) + 1
@@ -870,7 +1183,7 @@ class Mandoline(PlotfileCooker):
         field_min_vals = []
         # For each chunk
         for cfile, i in zip(fnames, range(0, len(cell_indexes), chunk_size)):
-            with open(os.path.join(outfile, f"Level_{lv}", cfile), "wb") as bfile:
+            with open_binary(os.path.join(outfile, f"Level_{lv}", cfile), "wb") as bfile:
                 curr_offsets = []
                 subcells_indexes = cell_indexes[i:i+chunk_size]
                 for idxs in subcells_indexes:
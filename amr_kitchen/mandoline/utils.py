@@ -26,6 +26,58 @@ def expand_array(arr, factor):
     return exp
 
 
+def coarsening_blocks(size, factor, start):
+    """
+    First cell and number of cells of the blocks of [factor]
+    cells aligned with the lower level grid along an axis of
+    size cells starting at the index start of the higher
+    level grid
+    """
+    cuts = np.arange(-(start % factor), size, factor)
+    cuts[0] = 0
+    counts = np.diff(np.append(cuts, size))
+    return cuts, counts
+
+def coarsen_counts(shape, factor, start=(0, 0)):
+    """
+    Number of cells of the 2D array of shape averaged in
+    each block by coarsen_array (less than factor**2 for
+    the blocks partially covered by the array)
+    """
+    counts = [coarsening_blocks(shape[axis], factor, start[axis])[1]
+              for axis in range(2)]
+    return np.outer(counts[0], counts[1])
+
+def coarsen_array(arr, factor, start=(0, 0)):
+    """
+    Data reading utility
+    ----
+    Average higher resolution 2D array over blocks of [factor]
+    x [factor] cells to reduce it to a lower AMR level grid.
+    start is the index of the first cell of the array in the
+    higher level grid so the blocks are aligned with the lower
+    level grid (the blocks partially covered by the array are
+    averaged over the covered cells).
+    ----
+    Example:
+    >> coarsen_array([[1, 1, 2, 2],
+                      [1, 1, 2, 2],
+                      [3, 3, 4, 4],
+                      [3, 3, 4, 4]], factor=2)
+    >> [[1, 2],
+        [3, 4]]
+    """
+    out = arr
+    for axis in range(2):
+        cuts, counts = coarsening_blocks(arr.shape[axis], factor, start[axis])
+        out = np.add.reduceat(out, cuts, axis=axis)
+        if axis == 0:
+            out = out / counts[:, np.newaxis]
+        else:
+            out = out / counts[np.newaxis, :]
+    return out
+
+
 def sanitize_field_name(fname):
     """
     Remove parentheses from field names
@@ -7,7 +7,6 @@ from scipy.interpolate import NearestNDInterpolator
 import numpy as np
 from tqdm import tqdm
 from amr_kitchen import PlotfileCooker
-from amr_kitchen.utils import expand_array3d
 
 FIELD_ID = None
 LV = None
@@ -59,7 +58,7 @@ def main():
     # INPUTS
     plotfile = sys.argv[1]
     field = sys.argv[2]
-    pck = PlotfileCooker(plotfile, ghost=True)
+    pck = PlotfileCooker(plotfile)
     plane_point = [0.00, 0.0015 + 1 * 7.8125e-05, 0.00]
     plane_normal = [0, -1, 0.577]
     global FIELD_ID
@@ -97,23 +96,10 @@ def main():
         # use box indices in list
         lv_indices = []
         lv_masks = []
-        next_lv_factors = pck.grid_sizes[lv + 1] // pck.box_arrays[lv + 1].shape
         for box_id in intersect_indices[lv]:
             pbar.update(1)
-            indices = pck.cells[lv]['indexes'][box_id]
-            # Convert to box array indices at lv + 1
-            barr_starts = np.array((indices[0] * 2) // next_lv_factors, dtype=int)
-            barr_ends = np.array((indices[1] * 2) // next_lv_factors, dtype=int)
-            # Get all the intersecting box ids at lv + 1
-            next_level_boxes = pck.box_arrays[lv + 1][barr_starts[0]:barr_ends[0]+1,
-                                                      barr_starts[1]:barr_ends[1]+1,
-                                                      barr_starts[2]:barr_ends[2]+1]
-            # Convert the upper level box slice to lower level bool
-            bcast_factor = next_lv_factors[0] // 2
-            next_lv_map = expand_array3d(next_level_boxes, bcast_factor)
-            mask = np.zeros_like(next_lv_map, dtype=bool)
-            # mask is true where the value is -1 (means no upper level data)
-            mask[next_lv_map == -1] = 1
+            # mask is true where there is no upper level data
+            mask = pck.valid_mask(lv, box_id)
             # Add only partially or not covered lower level boxes
             if not np.all(~mask):
                 x, y, z = pck.box_points(lv, box_id)
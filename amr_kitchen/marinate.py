@@ -1,16 +1,18 @@
 import sys
-import pickle
 from amr_kitchen import PlotfileCooker
 
 
 def main():
     if sys.argv[1] in ['-h', '--help']:
-        print(("Saves the PlotfileCooker object of a plotfile"
-               " to a pickle file"))
+        print(("Saves the parsed headers of a plotfile to a binary index"
+               " file (plotfile.kidx by default) that is memory mapped by"
+               " PlotfileCooker.from_index(path)\n"
+               "usage: marinate plotfile [index_file]"))
     else:
-        pck = PlotfileCooker(sys.argv[1],
-                             maxmins=True,
-                             ghost=True)
-        with open(sys.argv[1] + '.pkl', 'wb') as pfile:
-            pickle.dump(pck, pfile)
-
+        pck = PlotfileCooker(sys.argv[1], maxmins=True)
+        # The box adjacency is saved in the index
+        pck.adjacency = pck.compute_adjacency()
+        if len(sys.argv) > 2:
+            pck.write_index(sys.argv[2])
+        else:
+            pck.write_index()
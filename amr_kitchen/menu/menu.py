@@ -92,8 +92,10 @@ class Menu(PlotfileCooker):
         self.finest_lv = finest_lv
 
         if self.min_max or self.finest_lv:
+            # Only the finest level header is needed with finest_lv
             super().__init__(plt_file,
-                             maxmins=True,)
+                             maxmins=True,
+                             lazy=self.finest_lv)
         else:
             self.plt_file = plt_file
             # Let's find the plotfile's fields
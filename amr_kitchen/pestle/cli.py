@@ -3,6 +3,7 @@ import argparse
 from .pestle import volume_integral
 from amr_kitchen import PlotfileCooker
 from .pestle import field_units
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 
 def main():
@@ -27,7 +28,11 @@ def main():
             "plotfile", type=str,
             help="Path of the plotfile to integrate")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
     """
     Input arguments sanity check
     """
@@ -35,9 +40,8 @@ def main():
         raise ValueError("Must specify a plotfile to integrate")
 
     # Creating a PlotfileCooker instance
-    try:
-        pck = PlotfileCooker(args.plotfile, ghost=True)
-    except:
+    pck = PlotfileCooker(args.plotfile)
+    if pck.ndims < 3:
         print("This tool is not supported for plotfiles with ndims < 3")
         print(("You can use mandoline to create a 2D uniform grid and"
                " integrate it manually"))
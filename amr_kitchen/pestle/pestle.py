@@ -5,7 +5,7 @@ from tqdm import tqdm
 import numpy as np
 import matplotlib.pyplot as plt
 from amr_kitchen.utils import shape_from_header
-from amr_kitchen.utils import expand_array3d
+from amr_kitchen.profiling import open_binary, read_array, profile_pool
 #from mpi4py.futures import MPIPoolExecutor
 
 # Dict. with field names and their units after a volume integral 
@@ -36,7 +36,7 @@ def increment_sum_masked(args):
     """
     Increments sum with data from each bfile of a level
     """
-    with open(args["file"], 'rb') as bf:
+    with open_binary(args["file"]) as bf:
         bf.seek(args["offset"])
         h = bf.readline()
         shape = shape_from_header(h.decode('ascii'))
@@ -44,7 +44,7 @@ def increment_sum_masked(args):
         # skip field_pos 
         bf.seek(np.prod(box_shape)*args['id_int']*8, 1)
         # Only read the data from one box
-        data = np.fromfile(bf, 'float64', np.prod(box_shape))
+        data = read_array(bf, 'float64', np.prod(box_shape))
         data = data.reshape(box_shape, order='F')
         if args['id_vol'] is not None:
             # skip volfrag_pos
@@ -52,7 +52,7 @@ def increment_sum_masked(args):
             h = bf.readline()
             bf.seek(np.prod(box_shape)*args['id_vol']*8, 1)
             # Only read the data from one box
-            data_volfrag = np.fromfile(bf, 'float64', np.prod(box_shape))
+            data_volfrag = read_array(bf, 'float64', np.prod(box_shape))
             data_volfrag = data_volfrag.reshape(box_shape, order='F')
             return args["dV"] * np.sum(data[args["covering_mask"]] *  data_volfrag[args["covering_mask"]])
         else:
@@ -62,7 +62,7 @@ def increment_sum(args):
     """
     Increments sum with data from each bfile of the finest level
     """
-    with open(args["file"], 'rb') as bf:
+    with open_binary(args["file"]) as bf:
        bf.seek(args["offset"])
        h = bf.readline()
        shape = shape_from_header(h.decode('ascii'))
@@ -70,7 +70,7 @@ def increment_sum(args):
        # skip field_pos 
        bf.seek(np.prod(box_shape)*args['id_int']*8, 1)
        # Only read the data from one box
-       data = np.fromfile(bf, 'float64', np.prod(box_shape))
+       data = read_array(bf, 'float64', np.prod(box_shape))
        data = data.reshape(box_shape, order='F')
        if args['id_vol'] is not None:
            # skip volfrag_pos
@@ -78,7 +78,7 @@ def increment_sum(args):
            h = bf.readline()
            bf.seek(np.prod(box_shape)*args['id_vol']*8, 1)
            # Only read the data from one box
-           data_volfrag = np.fromfile(bf, 'float64', np.prod(box_shape))
+           data_volfrag = read_array(bf, 'float64', np.prod(box_shape))
            data_volfrag = data_volfrag.reshape(box_shape, order='F')
            return args["dV"] * np.sum(data * data_volfrag)
        else:
@@ -89,6 +89,9 @@ def volume_integral(pck, field, limit_level=None, use_volfrac=False):
     """
     Prints the volume integral of the chosen field
     """
+    if pck.ndims < 3:
+        raise ValueError(("The volume integral is not available for"
+                          " plotfiles with ndims < 3"))
     # Integration field
     id_int = pck.fields[field]
     print(f"Integrating {field} in {pck.pfile}")
@@ -100,66 +103,50 @@ def volume_integral(pck, field, limit_level=None, use_volfrac=False):
 
     covering_masks = []
     for lv in range(pck.limit_level): # Last level is not masked
-        # use box indices in list
-        lv_masks = []
-        next_lv_factors = pck.grid_sizes[lv + 1] // pck.box_arrays[lv + 1].shape
-        for idx, indices in enumerate(pck.cells[lv]['indexes']):
-            # Convert to box array indices at lv + 1
-            barr_starts = np.array((indices[0] * 2) // next_lv_factors, dtype=int)
-            barr_ends = np.array((indices[1] * 2) // next_lv_factors, dtype=int)
-            next_level_boxes = pck.box_arrays[lv + 1][barr_starts[0]:barr_ends[0]+1,
-                                                      barr_starts[1]:barr_ends[1]+1,
-                                                      barr_starts[2]:barr_ends[2]+1]
-            # Convert the upper level box slice to lower level bool
-            bcast_factor = next_lv_factors[0] // 2
-            next_lv_map = expand_array3d(next_level_boxes, bcast_factor)
-            mask = np.zeros_like(next_lv_map, dtype=bool)
-            # mask is true where the value is -1
-            mask[next_lv_map == -1] = 1
-            # -1 means there is no box at this level
-            lv_masks.append(mask)
+        # True where the cells are not covered by lv + 1
+        lv_masks = [pck.valid_mask(lv, idx) for idx in range(len(pck.boxes[lv]))]
         covering_masks.append(lv_masks)
 
     integral = 0
-    pool = multiprocessing.Pool()
-    if not limit_level:
-        for lv in range(pck.limit_level):
-            mp_calls = []
-            dV = np.prod(pck.dx[lv])
-            for bid, file, offset in zip(range(len(pck.boxes[lv])),
-                                                pck.cells[lv]['files'],
-                                                pck.cells[lv]['offsets']):
-                mp_call = {"file":file,
-                        "offset":offset,
-                        'id_vol':id_vol,
-                        'id_int':id_int,
-                        "covering_mask":covering_masks[lv][bid],
-                        "dV":dV,}
-                mp_calls.append(mp_call)
-            now = time.time()
-            print(f'Integrating level {lv}...')
-            for box_int in tqdm(pool.imap(increment_sum_masked,
-                                        mp_calls), total=len(mp_calls)):
-                integral += box_int
-            print(f'Done! ({time.time() - now:.2f} s)')
+    with profile_pool(multiprocessing.Pool()) as pool:
+        if not limit_level:
+            for lv in range(pck.limit_level):
+                mp_calls = []
+                dV = np.prod(pck.dx[lv])
+                for bid, file, offset in zip(range(len(pck.boxes[lv])),
+                                                    pck.cells[lv]['files'],
+                                                    pck.cells[lv]['offsets']):
+                    mp_call = {"file":file,
+                            "offset":offset,
+                            'id_vol':id_vol,
+                            'id_int':id_int,
+                            "covering_mask":covering_masks[lv][bid],
+                            "dV":dV,}
+                    mp_calls.append(mp_call)
+                now = time.time()
+                print(f'Integrating level {lv}...')
+                for box_int in tqdm(pool.imap(increment_sum_masked,
+                                            mp_calls), total=len(mp_calls)):
+                    integral += box_int
+                print(f'Done! ({time.time() - now:.2f} s)')
 
-    mp_calls = []
-    dV = np.prod(pck.dx[pck.limit_level])
-    for bid, file, offset in zip(range(len(pck.boxes[pck.limit_level])),
-                                 pck.cells[pck.limit_level]['files'],
-                                 pck.cells[pck.limit_level]['offsets']):
+        mp_calls = []
+        dV = np.prod(pck.dx[pck.limit_level])
+        for bid, file, offset in zip(range(len(pck.boxes[pck.limit_level])),
+                                     pck.cells[pck.limit_level]['files'],
+                                     pck.cells[pck.limit_level]['offsets']):
 
-            mp_call = {"file":file,
-                       "offset":offset,
-                       'id_vol':id_vol,
-                       'id_int':id_int,
-                       "dV":dV,}
-            mp_calls.append(mp_call)
-    now = time.time()
-    print(f'Integrating level {pck.limit_level}...')
-    for box_int in tqdm(pool.imap(increment_sum,
-                                  mp_calls), total=len(mp_calls)):
-        integral += box_int
-    print(f'Done! ({time.time() - now:.2f})')
+                mp_call = {"file":file,
+                           "offset":offset,
+                           'id_vol':id_vol,
+                           'id_int':id_int,
+                           "dV":dV,}
+                mp_calls.append(mp_call)
+        now = time.time()
+        print(f'Integrating level {pck.limit_level}...')
+        for box_int in tqdm(pool.imap(increment_sum,
+                                      mp_calls), total=len(mp_calls)):
+            integral += box_int
+        print(f'Done! ({time.time() - now:.2f})')
 
     return integral
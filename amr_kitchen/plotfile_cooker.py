@@ -1,49 +1,107 @@
 import os
+import time
+import weakref
 import shutil
 import traceback
+import queue
+import threading
+import collections
 import multiprocessing
+import multiprocessing.pool
+from multiprocessing import resource_tracker
 import numpy as np
 from tqdm import tqdm
 from scipy.ndimage import map_coordinates, zoom
 from amr_kitchen.utils import TastesBadError, shape_from_header
+from amr_kitchen.utils import shapes_from_header_vardims
+from amr_kitchen.utils import read_box_bounds, read_level_header
+from amr_kitchen.profiling import (open_binary, read_array, pread_into,
+                                   preadv_into, profile_pool)
+from amr_kitchen.arena import SharedArena, ARENA_BYTES
+from amr_kitchen.readers import ReaderConfig, BoxCache, THREAD_READERS
+from amr_kitchen.kitchen_index import (write_kitchen_index, read_kitchen_index,
+                                       KITCHEN_INDEX_EXT)
+from amr_kitchen.box_index import BoxIndex, box_adjacency
+
+# Binary sidecar file storing the parsed plotfile headers
+INDEX_CACHE_NAME = "kitchen_index.npz"
+# Incremented when the content of the sidecar file changes
+INDEX_CACHE_VERSION = 1
+# Binary sidecar file storing the covering masks of the boxes
+MASK_CACHE_NAME = "kitchen_masks.npz"
+MASK_CACHE_VERSION = 1
+# Maximum size in bytes of a single coalesced read
+COALESCED_READ_MAX = 2**26
 
 def mp_read_box_single_field(args):
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         bf.seek(args[1])
         shape = shape_from_header(bf.readline().decode('ascii'))
         bf.seek(np.prod(shape[:-1]) * args[2] * 8, 1)
-        data = np.fromfile(bf, 'float64', np.prod(shape[:-1]))
+        data = read_array(bf, 'float64', np.prod(shape[:-1]))
     return data.reshape(shape[:-1], order='F')
 
 def mp_read_box_slice_field(args):
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         bf.seek(args[1])
         shape = shape_from_header(bf.readline().decode('ascii'))
-        start, stop = args[2].indices(shape[-1])[:2]
+        start, stop, step = args[2].indices(shape[-1])
         slice_size = stop - start
         bf.seek(np.prod(shape[:-1]) * start * 8, 1)
-        data = np.fromfile(bf, 'float64', np.prod(shape[:-1]) * slice_size)
+        data = read_array(bf, 'float64', np.prod(shape[:-1]) * slice_size)
     data = data.reshape(np.append(shape[:-1], slice_size), order='F')
-    return data[..., args[2]]
+    # The read data starts at the slice start
+    return data[..., ::step]
+
+def field_runs(field_indices):
+    """
+    Split the field indices into runs of consecutive fields
+    returns a list of (output index, first field, number of fields)
+    """
+    runs = []
+    for out_idx, field in enumerate(field_indices):
+        if runs and field == runs[-1][1] + runs[-1][2]:
+            runs[-1][2] += 1
+        else:
+            runs.append([out_idx, field, 1])
+    return [tuple(run) for run in runs]
+
+def gather_box_fields(bf, data_start, shape, field_indices):
+    """
+    Read only the selected fields of a box with one positioned
+    read per run of consecutive fields into a preallocated array
+    bf: binary file opened in 'rb' mode
+    data_start: position of the box data in the binary file
+    shape: shape of the box data (the last value is the number of fields)
+    field_indices: indices of the fields to read
+    """
+    block_size = int(np.prod(shape[:-1])) * 8
+    data = np.empty(np.append(shape[:-1], len(field_indices)),
+                    dtype='float64',
+                    order='F')
+    # Each field is a contiguous block of the output
+    buffer = data.ravel(order='F').view('uint8')
+    for out_idx, field, count in field_runs(field_indices):
+        pread_into(bf,
+                   buffer[out_idx * block_size:(out_idx + count) * block_size],
+                   data_start + field * block_size)
+    return data
 
 def mp_read_box_index_field(args):
-    diff = args[2][-1] - args[2][0] + 1
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         bf.seek(args[1])
         shape = shape_from_header(bf.readline().decode('ascii'))
-        bf.seek(np.prod(shape[:-1]) * args[2][0] * 8, 1)
-        data = np.fromfile(bf, 'float64', np.prod(shape[:-1])*diff)
-    data = data.reshape(np.append(shape[:-1], diff), order='F')
-    return data[..., np.array(args[2]) - args[2][0]]
+        data = gather_box_fields(bf, bf.tell(), shape, args[2])
+    return data
 
 def mp_read_bfile_single_field(args):
     file_data = []
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         while True:
             try:
                 shape = shape_from_header(bf.readline().decode('ascii'))
                 bf.seek(np.prod(shape[:-1]) * args[1] * 8, 1)
-                data = np.fromfile(bf, 'float64', np.prod(shape[:-1]))
+                data = read_array(bf, 'float64', np.prod(shape[:-1]))
                 bf.seek(np.prod(shape[:-1]) * (shape[-1] - args[1] - 1) * 8, 1)
                 file_data.append(data.reshape(shape[:-1], order='F'))
             except:
@@ -52,45 +110,189 @@ def mp_read_bfile_single_field(args):
 
 def mp_read_bfile_slice_field(args):
     file_data = []
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         while True:
             try:
                 shape = shape_from_header(bf.readline().decode('ascii'))
-                start, stop = args[1].indices(shape[-1])[:2]
+                start, stop, step = args[1].indices(shape[-1])
                 slice_size = stop - start
                 bf.seek(np.prod(shape[:-1]) * start * 8, 1)
-                data = np.fromfile(bf, 'float64', np.prod(shape[:-1]) * slice_size)
+                data = read_array(bf, 'float64', np.prod(shape[:-1]) * slice_size)
                 bf.seek(np.prod(shape[:-1]) * (shape[-1] - slice_size - start) * 8, 1)
                 data = data.reshape(np.append(shape[:-1], slice_size), order='F')
-                file_data.append(data[..., args[1]])
+                file_data.append(data[..., ::step])
             except Exception as e:
                 print(type(e), e)
                 break
     return file_data
 
 def mp_read_bfile_index_field(args):
-    diff = args[1][-1] - args[1][0] + 1
     file_data = []
-    with open(args[0], 'rb') as bf:
+    with open_binary(args[0]) as bf:
         while True:
             try:
                 shape = shape_from_header(bf.readline().decode('ascii'))
-                bf.seek(np.prod(shape[:-1]) * args[1][0] * 8, 1)
-                data = np.fromfile(bf, 'float64', np.prod(shape[:-1]) * diff)
-                bf.seek(np.prod(shape[:-1]) * (shape[-1] - args[1][-1] - 1) * 8, 1)
-                data = data.reshape(np.append(shape[:-1], diff), order='F')
-                file_data.append(data[..., np.array(args[1]) - args[1][0]])
+                data_start = bf.tell()
+                file_data.append(gather_box_fields(bf, data_start, shape, args[1]))
+                # Go to the next box
+                bf.seek(data_start + np.prod(shape) * 8)
             except:
                 break
     return file_data
 
+def mp_read_box_run(args):
+    """
+    Read a run of boxes sorted by binary file and offset
+    and return the data in the original order
+    args: (read_fun, bfiles, offsets, field_arg) where read_fun
+          is one of the mp_read_box_* functions
+    """
+    read_fun, bfiles, offsets, field_arg = args
+    run_data = [None] * len(bfiles)
+    for i in np.lexsort((offsets, bfiles)):
+        run_data[i] = read_fun((bfiles[i], offsets[i], field_arg))
+    return run_data
+
+def mp_read_coalesced(args):
+    """
+    Read a contiguous byte range of a binary file directly into
+    a new array for each data block it contains
+    args: (bfile, start, stop, blocks) where blocks is a list of
+          (position, shape) tuples with the position of the block
+          relative to start and its Fortran ordered shape
+    """
+    bfile, start, stop, blocks = args
+    block_data = [np.empty(np.prod(shape)) for _, shape in blocks]
+    # The bytes between the blocks (box headers and unread
+    # fields) are read in a scratch buffer
+    positions = np.array([position for position, _ in blocks], dtype=np.int64)
+    ends = positions + np.array([data.nbytes for data in block_data], dtype=np.int64)
+    gaps = positions - np.append(0, ends[:-1])
+    with open_binary(bfile) as bf:
+        if np.all(gaps >= 0):
+            scratch = memoryview(bytearray(np.max(gaps)))
+            buffers = []
+            for gap, data in zip(gaps, block_data):
+                buffers.append(scratch[:gap])
+                buffers.append(data)
+            preadv_into(bf, buffers, start)
+        else:
+            # Overlapping blocks (boxes requested more than once)
+            for (position, _), data in zip(blocks, block_data):
+                pread_into(bf, data, start + position)
+    return [data.reshape(shape, order='F')
+            for data, (_, shape) in zip(block_data, blocks)]
+
+def plan_coalesced_reads(bfiles, starts, stops, gap, max_size=COALESCED_READ_MAX):
+    """
+    Sort the byte ranges to read in the binary files and merge the
+    contiguous or nearly contiguous ones into single sequential reads
+    ___
+    bfiles: binary file of each byte range
+    starts: start of each byte range
+    stops: end (exclusive) of each byte range
+    gap: ranges separated by at most gap bytes are merged (the
+         bytes in between are read and discarded)
+    max_size: maximum size in bytes of a merged read
+    returns a list of (bfile, start, stop, range_indices) tuples
+    """
+    order = np.lexsort((starts, bfiles))
+    reads = []
+    current = None
+    for i in order:
+        if (current is not None and
+            bfiles[i] == current[0] and
+            starts[i] - current[2] <= gap and
+            max(stops[i], current[2]) - current[1] <= max_size):
+            current[2] = max(current[2], stops[i])
+            current[3].append(i)
+        else:
+            if current is not None:
+                reads.append(tuple(current))
+            current = [bfiles[i], starts[i], stops[i], [i]]
+    if current is not None:
+        reads.append(tuple(current))
+    return reads
+
+def mmap_read_box(bmap, offset, field_arg):
+    """
+    Box data as a view into the memory mapped binary file
+    (Only indexing the fields with a list makes a copy)
+    bmap: np.memmap of the binary file (uint8)
+    offset: offset of the box header in the binary file
+    field_arg: field index, slice or list of indices
+    """
+    # The box header is an ascii line before the data
+    size = 256
+    while True:
+        head = bytes(bmap[offset:offset + size])
+        end = head.find(b'\n')
+        if end >= 0 or offset + size >= len(bmap):
+            break
+        size *= 2
+    shape = shape_from_header(head[:end].decode('ascii'))
+    data = np.ndarray(shape,
+                      dtype='float64',
+                      buffer=bmap,
+                      offset=offset + end + 1,
+                      order='F')
+    if isinstance(field_arg, int):
+        return data[..., field_arg]
+    elif isinstance(field_arg, slice):
+        return data[..., field_arg]
+    else:
+        return data[..., np.array(field_arg)]
+
+def box_header_matches(header, shape, nvars):
+    """
+    Check that the bytes before the data of a box are its header:
+    a single ascii line ending with a newline describing a box
+    of the expected shape with nvars fields
+    header: bytestring read at the offset of the box
+    shape: shape of the box (number of cells in each direction)
+    """
+    if not header.endswith(b'\n') or b'\n' in header[:-1]:
+        return False
+    try:
+        header_shape = shapes_from_header_vardims(header, len(shape))
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return False
+    return list(header_shape) == list(shape) + [nvars]
+
+def timed_iterator(iterator, stats):
+    """
+    Iterate and add the time spent waiting for the
+    items to stats['read']
+    """
+    while True:
+        start = time.time()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stats['read'] += time.time() - start
+        yield item
+
+def closing_imap(fun, iterable):
+    """
+    imap over a new worker pool which is stopped once the
+    iteration ends (when no PlotfileCooker pool is available)
+    """
+    with profile_pool(multiprocessing.Pool()) as pool:
+        yield from pool.imap(fun, iterable)
+
 class LevelDataIterator(object):
 
-    def __init__(self, fun, bfiles, field_arg):
-        pool = multiprocessing.Pool()
-        self.iterator = pool.imap(fun,
-                                  zip(bfiles,
-                                      [field_arg]*len(bfiles)))
+    def __init__(self, fun, bfiles, field_arg, pck=None):
+        args = zip(bfiles, [field_arg]*len(bfiles))
+        # Worker pool of the PlotfileCooker
+        if pck is not None:
+            pck.pool_stats['reads'] += 1
+            self.iterator = timed_iterator(pck.pool().imap(fun, args),
+                                           pck.pool_stats)
+        else:
+            self.iterator = closing_imap(fun, args)
         self._data = self.iterator.__next__().__iter__()
 
     def __iter__(self):
@@ -105,11 +307,18 @@ class LevelDataIterator(object):
 
 class LevelDataStream(object):
 
-    def __init__(self, bfiles, offsets, field_arg):
+    def __init__(self, bfiles, offsets, field_arg, pck=None, level=None):
         self.bfiles = np.array(bfiles)
         self.offsets = np.array(offsets)
         self.size = len(bfiles)
         self.farg = field_arg
+        # PlotfileCooker owning the data (io mode, worker pool and cache)
+        self.pck = pck
+        self.level = level
+        self.cache = None
+        if pck is not None and pck.io != "mmap":
+            self.cache = pck.box_cache
+        self.mmap = pck is not None and pck.io == "mmap"
         if isinstance(self.farg, int):
             self.read_fun = mp_read_box_single_field
             self.file_fun = mp_read_bfile_single_field
@@ -124,71 +333,390 @@ class LevelDataStream(object):
             self.file_fun = mp_read_bfile_index_field
 
     def __getitem__(self, idx):
-        if isinstance(idx, int):
+        # Views into the memory mapped files (no copy)
+        if self.mmap:
+            return self.mmap_getitem(idx)
+        # Only read the boxes missing from the cache
+        if self.cache is not None:
+            return self.cached_getitem(idx)
+        if isinstance(idx, (int, np.integer)):
             return self.read_fun((self.bfiles[idx],
                                   self.offsets[idx],
                                   self.farg))
         elif isinstance(idx, slice):
+            # Merge the reads of neighbouring boxes
+            data = self.coalesced_read(np.arange(self.size)[idx])
+            if data is not None:
+                return data
             slice_size = len(range(*idx.indices(self.size)))
-            pool = multiprocessing.Pool()
-            return pool.map(self.read_fun,
-                            zip(self.bfiles[idx],
-                                self.offsets[idx],
-                                [self.farg]*slice_size))
+            return self.pool_map(zip(self.bfiles[idx],
+                                     self.offsets[idx],
+                                     [self.farg]*slice_size),
+                                 nbytes=self.box_nbytes(np.arange(self.size)[idx]))
         elif (isinstance(idx, list) or
               isinstance(idx, np.ndarray)):
             if len(idx) == 0:
                 return []
             idx = np.array(idx)
             assert idx.ndim == 1, "Box slice indices must be one dimensional"
-            pool = multiprocessing.Pool()
+            data = self.coalesced_read(np.arange(self.size)[idx])
+            if data is not None:
+                return data
             if idx.dtype == int:
                 count = len(idx)
             elif idx.dtype == bool:
                 count = np.count_nonzero(idx)
-            return pool.map(self.read_fun,
-                            zip(self.bfiles[idx],
-                                self.offsets[idx],
-                                [self.farg]*count))
+            return self.pool_map(zip(self.bfiles[idx],
+                                     self.offsets[idx],
+                                     [self.farg]*count),
+                                 nbytes=self.box_nbytes(np.arange(self.size)[idx]))
     def __iter__(self):
+        # With memory maps the boxes are iterated in order
+        if self.mmap:
+            return self.mmap_iter(slice(None))
         return LevelDataIterator(self.file_fun,
                                  np.unique(self.bfiles),
-                                 self.farg)
+                                 self.farg,
+                                 pck=self.pck)
     def iter(self, idx):
         """
         Manual data iterator to support reading data
         on the fly for slices
         """
-        if isinstance(idx, int):
+        if self.mmap:
+            if isinstance(idx, (int, np.integer)):
+                return self.mmap_getitem(idx)
+            return self.mmap_iter(idx)
+        if self.cache is not None and isinstance(idx, (int, np.integer)):
+            return self.cached_getitem(idx)
+        if isinstance(idx, (int, np.integer)):
             return self.read_fun((self.bfiles[idx],
                                   self.offsets[idx],
                                   self.farg))
         elif isinstance(idx, slice):
             slice_size = len(range(*idx.indices(self.size)))
-            pool = multiprocessing.Pool()
-            return pool.imap(self.read_fun,
-                            zip(self.bfiles[idx],
-                                self.offsets[idx],
-                                [self.farg]*slice_size))
+            return self.pool_imap(zip(self.bfiles[idx],
+                                      self.offsets[idx],
+                                      [self.farg]*slice_size))
         elif (isinstance(idx, list) or
               isinstance(idx, np.ndarray)):
             if len(idx) == 0:
                 return []
             idx = np.array(idx)
             assert idx.ndim == 1, "Box slice indices must be one dimensional"
-            pool = multiprocessing.Pool()
             if idx.dtype == int:
                 count = len(idx)
             elif idx.dtype == bool:
                 count = np.count_nonzero(idx)
-            return pool.imap(self.read_fun,
-                            zip(self.bfiles[idx],
-                                self.offsets[idx],
-                                [self.farg]*count))
+            return self.pool_imap(zip(self.bfiles[idx],
+                                      self.offsets[idx],
+                                      [self.farg]*count))
+
+    def cache_key(self, idx):
+        """
+        Key of the data of box idx in the cache
+        """
+        if isinstance(self.farg, slice):
+            field_key = (self.farg.start, self.farg.stop, self.farg.step)
+        elif isinstance(self.farg, int):
+            field_key = self.farg
+        else:
+            field_key = tuple(self.farg.tolist())
+        return (str(self.bfiles[idx]), int(self.offsets[idx]), field_key)
+
+    def cached_getitem(self, idx):
+        """
+        Box data from the cache of the PlotfileCooker, reading
+        and caching the boxes missing from it
+        """
+        if isinstance(idx, (int, np.integer)):
+            key = self.cache_key(idx)
+            data = self.cache.get(key)
+            if data is None:
+                data = self.read_fun((self.bfiles[idx],
+                                      self.offsets[idx],
+                                      self.farg))
+                self.cache.put(key, data)
+            return data
+        box_indices = np.asarray(self.box_indices(idx), dtype=int)
+        keys = [self.cache_key(i) for i in box_indices]
+        data = [self.cache.get(key) for key in keys]
+        missing = [i for i, box_data in enumerate(data) if box_data is None]
+        if len(missing) > 0:
+            missing_ids = box_indices[missing]
+            # Same reads as without the cache
+            missing_data = self.coalesced_read(missing_ids)
+            if missing_data is None:
+                missing_data = self.pool_map(zip(self.bfiles[missing_ids],
+                                                 self.offsets[missing_ids],
+                                                 [self.farg]*len(missing_ids)),
+                                             nbytes=self.box_nbytes(missing_ids))
+            for i, box_data in zip(missing, missing_data):
+                data[i] = box_data
+                self.cache.put(keys[i], box_data)
+        return data
+
+    def box_nbytes(self, idx):
+        """
+        Size in bytes of the selected fields data of the boxes idx
+        (None without the PlotfileCooker headers)
+        """
+        if self.pck is None or self.level is None:
+            return None
+        indexes = np.asarray(self.pck.cells[self.level]['indexes'])[idx]
+        ncells = np.prod(indexes[:, 1] - indexes[:, 0] + 1, axis=1)
+        return ncells * len(self.field_indices()) * 8
+
+    def field_indices(self):
+        """
+        Indices of the selected fields
+        """
+        return np.arange(self.pck.nvars)[self.farg].reshape(-1)
+
+    def coalesced_read(self, idx):
+        """
+        Read the boxes idx with sequential reads merging the
+        byte ranges of the boxes written close to each other
+        in the binary files (see plan_coalesced_reads). Only
+        the runs of consecutive selected fields are read
+        returns None if the reads cannot be planned
+        """
+        if (self.pck is None or
+            self.level is None or
+            self.pck.read_gap is None or
+            len(idx) == 0):
+            return None
+        fields = self.field_indices()
+        if len(fields) == 0:
+            return None
+        header_sizes = self.pck.box_header_sizes(self.level)[idx]
+        # Unknown box layout in the binary files
+        if np.any(header_sizes < 0):
+            return None
+        indexes = np.asarray(self.pck.cells[self.level]['indexes'])[idx]
+        shapes = indexes[:, 1] - indexes[:, 0] + 1
+        ncells = np.prod(shapes, axis=1)
+        runs = field_runs(fields)
+        # Byte range of each run of fields in each box
+        # (flattened with index box * len(runs) + run)
+        data_starts = self.offsets[idx] + header_sizes
+        run_fields = np.array([run[1] for run in runs])
+        run_counts = np.array([run[2] for run in runs])
+        starts = (data_starts[:, None] + ncells[:, None] * run_fields * 8).reshape(-1)
+        stops = starts + (ncells[:, None] * run_counts * 8).reshape(-1)
+        reads = plan_coalesced_reads(np.repeat(self.bfiles[idx], len(runs)),
+                                     starts,
+                                     stops,
+                                     self.pck.read_gap)
+        args = []
+        for bfile, start, stop, ranges in reads:
+            blocks = []
+            for k in ranges:
+                shape = np.append(shapes[k // len(runs)], run_counts[k % len(runs)])
+                blocks.append((starts[k] - start, shape))
+            args.append((bfile, start, stop, blocks))
+        # Put the box data back in the requested order
+        data = [None] * len(idx)
+        read_data = self.pool_map(args,
+                                  mp_read_coalesced,
+                                  nbytes=[stop - start for _, start, stop, _ in reads])
+        for read, read_data in zip(reads, read_data):
+            for k, block in zip(read[3], read_data):
+                i, r = divmod(k, len(runs))
+                if len(runs) == 1:
+                    data[i] = block
+                    continue
+                # Assemble the boxes read in multiple runs
+                if data[i] is None:
+                    data[i] = np.empty(np.append(shapes[i], len(fields)), order='F')
+                out_idx = runs[r][0]
+                data[i][..., out_idx:out_idx + run_counts[r]] = block
+        if isinstance(self.farg, int):
+            data = [box_data[..., 0] for box_data in data]
+        return data
+
+    def pool_map(self, args, fun=None, nbytes=None):
+        """
+        Read the boxes in parallel with the worker pool
+        of the PlotfileCooker
+        nbytes: size in bytes of the data read for each item of args,
+                needed to send the data through shared memory
+        """
+        if fun is None:
+            fun = self.read_fun
+        if self.pck is None:
+            with profile_pool(multiprocessing.Pool()) as pool:
+                return pool.map(fun, args)
+        pool = self.pck.pool()
+        start = time.time()
+        if (nbytes is not None and
+            self.pck.transport == "shared_memory" and
+            self.pck.io_backend == "processes"):
+            data = list(self.pck.arena().map(pool, fun, args, nbytes))
+        else:
+            data = pool.map(fun, args)
+        self.pck.pool_stats['read'] += time.time() - start
+        self.pck.pool_stats['reads'] += 1
+        return data
+
+    def pool_imap(self, args):
+        """
+        Iterator reading the boxes in parallel with the worker
+        pool of the PlotfileCooker
+        """
+        if self.pck is None:
+            return closing_imap(self.read_fun, args)
+        pool = self.pck.pool()
+        self.pck.pool_stats['reads'] += 1
+        return timed_iterator(pool.imap(self.read_fun, args),
+                              self.pck.pool_stats)
+
+    def with_ghosts(self, idx, n=1, coarse="constant"):
+        """
+        Data of the box idx padded with n layers of ghost cells
+        filled with the neighbouring boxes at the same level or the
+        coarser level data ("constant" or "linear" interpolation).
+        A list of padded boxes is returned for non integer indices
+        """
+        if isinstance(idx, (int, np.integer)):
+            return self.padded_boxes([idx], n, coarse)[0]
+        return self.padded_boxes(self.box_indices(idx), n, coarse)
+
+    def iter_with_ghosts(self, n=1, coarse="constant", idx=slice(None), batch_size=64):
+        """
+        Iterate over the boxes padded with n layers of ghost cells in
+        the header order, reading batch_size boxes and their neighbours
+        at once
+        """
+        box_ids = self.box_indices(idx)
+        for start in range(0, len(box_ids), batch_size):
+            for data in self.padded_boxes(box_ids[start:start + batch_size],
+                                          n, coarse):
+                yield data
+
+    def padded_boxes(self, box_ids, n, coarse):
+        """
+        Ghost cell padded boxes with the field axis of self[idx]
+        """
+        padded = self.pck.ghost_padded_boxes(self.level,
+                                             list(box_ids),
+                                             self.farg,
+                                             n,
+                                             coarse)
+        if isinstance(self.farg, int):
+            return [data[..., 0] for data in padded]
+        return padded
+
+    def box_indices(self, idx):
+        """
+        Box indices from a slice or an array like index
+        """
+        if isinstance(idx, slice):
+            return range(*idx.indices(self.size))
+        idx = np.array(idx)
+        assert idx.ndim == 1, "Box slice indices must be one dimensional"
+        if idx.dtype == bool:
+            return np.nonzero(idx)[0]
+        return idx
+
+    def mmap_getitem(self, idx):
+        """
+        Box data as views into the memory mapped binary files
+        """
+        if isinstance(idx, (int, np.integer)):
+            return mmap_read_box(self.pck.mmap_file(self.bfiles[idx]),
+                                 self.offsets[idx],
+                                 self.farg)
+        return list(self.mmap_iter(idx))
+
+    def mmap_iter(self, idx):
+        """
+        Iterate over the box data views in the order of idx
+        """
+        for i in self.box_indices(idx):
+            yield mmap_read_box(self.pck.mmap_file(self.bfiles[i]),
+                                self.offsets[i],
+                                self.farg)
+
+    def stream(self, ordered=True, prefetch=None, run_size=16, idx=slice(None)):
+        """
+        Streaming iterator over the box data with bounded memory
+        ___
+        ordered: if True the boxes are yielded in the order of the
+                 level header, else as soon as they are read
+        prefetch: maximum number of box runs read ahead by the workers
+                  (defaults to twice the number of workers)
+        run_size: number of consecutive boxes read by a worker at once
+                  (sorted by binary file and offset)
+        idx: box indices to iterate over (slice or array like)
+        At most prefetch * run_size boxes are held in memory
+        """
+        box_indices = np.asarray(self.box_indices(idx), dtype=int)
+        # Views are already read on access
+        if self.mmap:
+            yield from self.mmap_iter(box_indices)
+            return
+        if len(box_indices) == 0:
+            return
+        # Runs of consecutive boxes read by a single worker
+        runs = [box_indices[start:start + run_size]
+                for start in range(0, len(box_indices), run_size)]
+        if prefetch is None:
+            prefetch = 2 * (getattr(self.pck, 'workers', None) or os.cpu_count())
+        if self.pck is not None:
+            self.pck.pool_stats['reads'] += 1
+            yield from self.stream_runs(self.pck.pool(), runs, ordered,
+                                        prefetch, self.pck.pool_stats)
+        else:
+            with profile_pool(multiprocessing.Pool()) as pool:
+                yield from self.stream_runs(pool, runs, ordered,
+                                            prefetch, {'read':0.0})
+
+    def stream_runs(self, pool, runs, ordered, prefetch, stats):
+        """
+        Read the runs of boxes with the worker pool keeping at most
+        prefetch runs in flight and yield their box data (see stream)
+        stats: dict in which the time waiting for the data is added
+        """
+        # Keys of the runs read by the workers (unordered)
+        done = queue.Queue()
+        def read_run(key, run):
+            args = ((self.read_fun,
+                     self.bfiles[run],
+                     self.offsets[run],
+                     self.farg),)
+            if ordered:
+                return pool.apply_async(mp_read_box_run, args)
+            # The errors are raised by get()
+            return pool.apply_async(mp_read_box_run, args,
+                                    callback=lambda _: done.put(key),
+                                    error_callback=lambda _: done.put(key))
+        runs = enumerate(runs)
+        pending = collections.OrderedDict()
+        # Fill the read ahead window
+        for key, run in runs:
+            pending[key] = read_run(key, run)
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            start = time.time()
+            if ordered:
+                _, result = pending.popitem(last=False)
+            else:
+                # First run read by the workers
+                result = pending.pop(done.get())
+            run_data = result.get()
+            stats['read'] += time.time() - start
+            # Read the next run while the data is used
+            key, run = next(runs, (None, None))
+            if run is not None:
+                pending[key] = read_run(key, run)
+            yield from run_data
 
 class LevelDataSelector(object):
 
-    def __init__(self, fields, cells, field_arg, limit_level, boxes = None, dx = None):
+    def __init__(self, fields, cells, field_arg, limit_level, boxes = None, dx = None, pck = None,
+                 geo_low = None):
         # Convert key to field index
         if isinstance(field_arg, str):
             field_arg = fields[field_arg]
@@ -209,6 +737,11 @@ class LevelDataSelector(object):
         self.limit_level = limit_level
         self.boxes = boxes
         self.dx = dx
+        self.pck = pck
+        # Lower corner of the domain (the origin by default)
+        if geo_low is None and dx is not None:
+            geo_low = np.zeros(len(dx[0]))
+        self.geo_low = geo_low
 
     def __getitem__(self, key):
         if key > self.limit_level:
@@ -216,7 +749,9 @@ class LevelDataSelector(object):
                               f" is {self.limit_level}"))
         return LevelDataStream(self.cells[key]['files'],
                                self.cells[key]['offsets'],
-                               self.farg)
+                               self.farg,
+                               pck=self.pck,
+                               level=key)
 
     def __call__(self, *args):
 
@@ -232,39 +767,23 @@ class LevelDataSelector(object):
         box_matches_exact = {}
         box_matches_inner = {}
         box_matches_outer = {}
+        # Spatial index of the boxes
+        if self.pck is not None:
+            box_index = self.pck.box_index()
+        else:
+            box_index = BoxIndex(self.boxes, [np.array(dx) / 2 for dx in self.dx])
         for level in range(self.limit_level + 1):
-            # Convert box limits to numpy array
-            boxes = np.array(self.boxes[level])
             # grid resolution at level
-            dx = self.dx[level]
+            dx = np.array(self.dx[level])
             # Boxes where the point is contained within the box boundary:
-            box_match_exact = (boxes[:, 0, 0] <= point[0]) & \
-                              (point[0] <= boxes[:, 0, 1]) & \
-                              (boxes[:, 1, 0] <= point[1]) & \
-                              (point[1] <= boxes[:, 1, 1]) & \
-                              (boxes[:, 2, 0] <= point[2]) & \
-                              (point[2] <= boxes[:, 2, 1] )
-            box_matches_exact[level] = np.nonzero(box_match_exact)[0]
+            box_matches_exact[level] = box_index.point_boxes(level, point)
             # These are boxes where the point is contained within the bounding
             # cells centers
-            box_match_inner = (boxes[:, 0, 0] + dx[0]/2 <= point[0]) & \
-                              (point[0] <= boxes[:, 0, 1] - dx[0]/2) & \
-                              (boxes[:, 1, 0] + dx[1]/2 <= point[1]) & \
-                              (point[1] <= boxes[:, 1, 1] - dx[1]/2) & \
-                              (boxes[:, 2, 0] + dx[2]/2 <= point[2]) & \
-                              (point[2] <= boxes[:, 2, 1] - dx[2]/2)
-            box_matches_inner[level] = np.nonzero(box_match_inner)[0]
-
+            box_matches_inner[level] = box_index.point_boxes(level, point, -dx/2)
             # These are boxes neigboring boxes containing the point when the
             # point is between the cell center of the boundary cells and the box
             # limit
-            box_match_outer = (boxes[:, 0, 0] - dx[0]/2 <= point[0]) & \
-                              (point[0] <= boxes[:, 0, 1] + dx[0]/2) & \
-                              (boxes[:, 1, 0] - dx[1]/2 <= point[1]) & \
-                              (point[1] <= boxes[:, 1, 1] + dx[1]/2) & \
-                              (boxes[:, 2, 0] - dx[2]/2 <= point[2]) & \
-                              (point[2] <= boxes[:, 2, 1] + dx[2]/2)
-            box_matches_outer[level] = np.nonzero(box_match_outer)[0]
+            box_matches_outer[level] = box_index.point_boxes(level, point, dx/2)
 
         # Finest matching level for each box bounds condition
         match_lv_exact = [lv for lv in box_matches_exact if len(box_matches_exact[lv]) != 0][-1]
@@ -288,8 +807,9 @@ class LevelDataSelector(object):
             # dx at the interpolation level
             dx = self.dx[match_lv_inner]
             # Converts point to indices at this level
-            # Scales back by 0.5, because the domain starts at dx/2 (index = 0)
-            point_idx = (point / dx) - 0.5
+            # Scales back by 0.5, because the first cell center is at
+            # geo_low + dx/2 (index = 0)
+            point_idx = (point - np.array(self.geo_low)) / dx - 0.5
             # 3D data for a single box at the finest matching level
             data_arrays = self[match_lv_inner][match_box_id]
             # Indices of the box we just read
@@ -324,9 +844,9 @@ class LevelDataSelector(object):
             # The finest level of the box neighbouring the point
             load_lv_hi = match_lv_outer
             # Use finest level dx
-            dx = self.dx[load_lv_hi]
+            dx = np.array(self.dx[load_lv_hi])
             # Converts point to indices at this level
-            point_idx = (point / dx) - 0.5
+            point_idx = (point - np.array(self.geo_low)) / dx - 0.5
             # Find out the shape of the array of concatenated boxes
             all_box_indices = []
             all_box_data = {}
@@ -386,6 +906,115 @@ class LevelDataSelector(object):
             return point_data
 
 
+class FileColumn(object):
+    """
+    Binary file path of each box in a level stored as a table of the
+    unique paths and the index of the file of each box in the table.
+    Behaves like the list of paths (indexing, iteration, np.array)
+    """
+
+    def __init__(self, table, ids):
+        """
+        table: unique binary file paths
+        ids: index in the table of the binary file of each box
+        """
+        self.table = np.asarray(table, dtype=str)
+        self.ids = np.asarray(ids, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return str(self.table[self.ids[key]])
+        return self.table[self.ids[key]]
+
+    def __iter__(self):
+        table = self.table.tolist()
+        for i in self.ids:
+            yield table[i]
+
+    def __array__(self, dtype=None, copy=None):
+        files = self.table[self.ids]
+        if dtype is not None:
+            return files.astype(dtype)
+        return files
+
+    def __eq__(self, other):
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __repr__(self):
+        return f"FileColumn({list(self)})"
+
+
+class LevelHeaders(object):
+    """
+    Sequence of the level headers data (PlotfileCooker.cells)
+    where each level is parsed on first access. Levels can also
+    be parsed ahead of time in a background thread.
+    """
+
+    def __init__(self, read_level, nlevels, background=False):
+        """
+        read_level: function returning the header data of a level
+                    from its index
+        nlevels: number of levels in the sequence
+        background: if True the levels are parsed in order by a
+                    background thread
+        """
+        self.read_level = read_level
+        self._levels = [None] * nlevels
+        # One lock per level so a level is only parsed once
+        self._locks = [threading.Lock() for _ in range(nlevels)]
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self.load_all,
+                                           kwargs={'fail':False},
+                                           daemon=True)
+            self.thread.start()
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[lv] for lv in range(*key.indices(len(self)))]
+        lv = range(len(self))[key]
+        with self._locks[lv]:
+            if self._levels[lv] is None:
+                self._levels[lv] = self.read_level(lv)
+        return self._levels[lv]
+
+    def __iter__(self):
+        for lv in range(len(self)):
+            yield self[lv]
+
+    def __reduce__(self):
+        """
+        Pickle as a plain list with every level parsed
+        """
+        return (list, (list(self),))
+
+    def is_loaded(self, lv):
+        """
+        True if the header data of level lv was already parsed
+        """
+        return self._levels[lv] is not None
+
+    def load_all(self, fail=True):
+        """
+        Parse every level not already parsed
+        fail: if False the exceptions are ignored so they are raised
+              when the level is accessed (used by the background thread)
+        """
+        for lv in range(len(self)):
+            try:
+                self[lv]
+            except Exception:
+                if fail:
+                    raise
+
+
 class PlotfileCooker(object):
 
     def __init__(self,
@@ -394,7 +1023,12 @@ class PlotfileCooker(object):
                  header_only: bool = False,
                  validate_mode: bool = False,
                  maxmins: bool = False,
-                 ghost: bool = False):
+                 ghost: bool = False,
+                 index_cache: bool = False,
+                 lazy: bool = False,
+                 background: bool = False,
+                 readers: ReaderConfig = None,
+                 **reader_options):
         """
         Parse the header data and save as attributes
         ___
@@ -409,7 +1043,33 @@ class PlotfileCooker(object):
                  boxes are read (a bit slower)
         ghost: if True the ghost cells around each box are computed by creating
                3D arrays where the value is the index of the box for each level
+               (self.box_arrays, self.barr_indices) and the boxes sharing the
+               faces of each box are stored in self.ghost_map (3D plotfiles
+               only). The adjacency used by box_neighbours and with_ghosts is
+               computed when first needed without it
+        index_cache: if True the parsed header data is saved to a binary
+                     sidecar file in the plotfile directory (kitchen_index.npz)
+                     and loaded from it on the next instantiations. The cache
+                     is rebuilt if the plotfile headers were modified
+        lazy: if True the level headers (Cell_H) are only parsed when a level
+              is first accessed in self.cells, so the startup cost scales
+              with the levels used (the index cache is not written in
+              this mode)
+        background: with lazy=True, parse the level headers in a background
+                    thread after the constructor returns
+        readers: ReaderConfig with the options of the readers of the box
+                 data (io mode, parallel backend and transport, number of
+                 workers, coalesced reads and box cache), defaults to
+                 ReaderConfig(). The worker pool is created on first use
+                 and reused until self.close() is called, the class can
+                 also be used as a context manager:
+                 `with PlotfileCooker(plotfile) as pck:`
+        reader_options: the options of ReaderConfig (io, io_backend,
+                        transport, workers, read_gap, cache_bytes) can
+                        also be passed directly as keyword arguments:
+                        `PlotfileCooker(plotfile, io="mmap")`
         """
+        self.init_readers(readers, **reader_options)
         self.pfile = plotfile_path
         filepath = os.path.join(self.pfile, 'Header')
         with open(filepath) as hfile:
@@ -461,9 +1121,15 @@ class PlotfileCooker(object):
                 raise ValueError((f"The limit level must be less or equal than"
                                   f" the maximum AMR level of the plotfile:"
                                   f" {limit_level} > {self.max_level}"))
+            # Try to load the parsed headers from the binary index
+            # (Never when validating as this would skip the parsing)
+            cached = False
+            if index_cache and not validate_mode:
+                cached = self.read_index_cache(maxmins)
             # Read the box geometry
             try:
-                self.box_centers, self.boxes = self.read_boxes(hfile)
+                if not cached:
+                    self.box_centers, self.boxes = self.read_boxes(hfile)
             except Exception as e:
                 # If the class is created from a Taster class
                 if validate_mode:
@@ -482,7 +1148,13 @@ class PlotfileCooker(object):
         self.grids = self.compute_global_grids()
 
         # Read the cell data
-        if not header_only:
+        # Levels are parsed when accessed
+        if lazy and not header_only and not cached and not validate_mode:
+            read_level = lambda lv: self.read_level_cells(lv, maxmins)
+            self.cells = LevelHeaders(read_level,
+                                      self.limit_level + 1,
+                                      background=background)
+        elif not header_only and not cached:
             try:
                 self.cells = self.read_cell_headers(maxmins, validate_mode)
             except Exception as e:
@@ -497,21 +1169,91 @@ class PlotfileCooker(object):
                                           f" \n {catched_tback}"))
                 else:
                     raise e
+            # Save the parsed headers for the next time
+            if index_cache and not validate_mode:
+                self.write_index_cache(maxmins)
         # Gets the number fields in the plt_file
         self.nfields = len(self.fields)
         # Compute the ghost boxes map around each box
         if ghost:
             if self.ndims == 3:
                 self.box_arrays, self.barr_indices = self.compute_box_array()
+                self.adjacency = self.compute_adjacency()
                 self.ghost_map = self.compute_ghost_map()
             else:
                 raise ValueError(("Ghost boxes are not available for plotfiles with"
                                   " ndims < 3"))
 
+    def init_readers(self, readers=None, **reader_options):
+        """
+        Initialize the worker pool, the caches and the data
+        computed when first needed from the reader options
+        (ReaderConfig or its keyword arguments, see
+        PlotfileCooker.__init__)
+        """
+        if readers is None:
+            readers = ReaderConfig(**reader_options)
+        elif reader_options:
+            raise ValueError((f"The reader options {list(reader_options)}"
+                              f" can not be combined with readers={readers}"))
+        self.readers = readers
+        self.io = readers.io
+        self.io_backend = readers.io_backend
+        self.transport = readers.transport
+        self._arena = None
+        # Memory maps of the binary files (io="mmap")
+        self.mmaps = {}
+        # Worker pool reading the box data (created on first use)
+        self.workers = readers.workers
+        self._pool = None
+        # Cache of the box data
+        self.box_cache = None
+        if readers.cache_bytes:
+            self.box_cache = BoxCache(readers.cache_bytes)
+        # Spatial index of the boxes (built on first use)
+        self.spatial_index = None
+        # Adjacent boxes at each level (computed when first needed
+        # if ghost=False)
+        self.adjacency = None
+        self.wide_adjacency = {}
+        self.ghost_map = None
+        # Coalesced reads of neighbouring boxes
+        self.read_gap = readers.read_gap
+        self.header_sizes = {}
+        # Packed covering masks of the boxes by level
+        self.valid_masks = {}
+        # Time spent starting the pool and reading with it
+        self.pool_stats = {"startup":0.0,
+                           "read":0.0,
+                           "pools":0,
+                           "reads":0}
+
     """
     Methods defining operator overloading
     """
 
+    def __getstate__(self):
+        """
+        The memory maps of the binary files, the worker
+        pool and the cached box data are not pickled
+        """
+        state = self.__dict__.copy()
+        state['mmaps'] = {}
+        state['_pool'] = None
+        state.pop('_pool_finalizer', None)
+        state['_arena'] = None
+        state.pop('_arena_finalizer', None)
+        # Or the cached data
+        if self.box_cache is not None:
+            state['box_cache'] = BoxCache(self.box_cache.budget)
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
     def __eq__(self, other):
         """
         Overload the '==' operator to use it to test for plotfile
@@ -625,8 +1367,30 @@ class PlotfileCooker(object):
         for i in range(len(PlotfileCooker.boxes[lv])):
             box_data = PlotfileCooker["field"][lv][i]
         ```
+
+        With `readers=ReaderConfig(io="mmap")` the binary files are
+        memory mapped and the box data are read-only views into the
+        mappings, so serial access runs at page cache speed. In this
+        mode the iterator preserves the box order.
+
+        To preserve the box order with bounded memory, the boxes can be
+        streamed in the header order while the workers read ahead a
+        limited number of runs of consecutive boxes:
+        ```
+        for box_data in PlotfileCooker["field"][lv].stream(prefetch=8):
+            pass
+        ```
+
+        The boxes can also be padded with ghost cells filled with the
+        data of the neighbouring boxes, or of the coarser level:
+        ```
+        T_5 = PlotfileCooker["temp"][lv].with_ghosts(5, n=2)
+        for T_box in PlotfileCooker["temp"][lv].iter_with_ghosts(n=1):
+            pass
+        ```
         """
-        return LevelDataSelector(self.fields, self.cells, key, self.limit_level, self.boxes, self.dx)
+        return LevelDataSelector(self.fields, self.cells, key, self.limit_level, self.boxes, self.dx, self,
+                                 self.geo_low)
 
     """
     Method for constructing the class from plotfile mesh data
@@ -656,17 +1420,9 @@ class PlotfileCooker(object):
             assert current_level == lv
             # Key for the dict
             self.npoints.append(n_cells)
-            lv_points = []
-            lv_boxes = []
-            for i in range(n_cells):
-                point = []
-                box = []
-                for i in range(self.ndims):
-                    lo, hi = [float(n) for n in hfile.readline().split()]
-                    box.append([lo, hi])
-                    point.append(lo + (hi - lo)/2)
-                lv_points.append(point)
-                lv_boxes.append(box)
+            # Parse all the box bounds at once
+            lv_boxes = read_box_bounds(hfile, n_cells, self.ndims)
+            lv_points = lv_boxes[..., 0] + (lv_boxes[..., 1] - lv_boxes[..., 0])/2
             cell_dir = hfile.readline().split('/')[0]
             self.cell_paths.append(cell_dir)
             points.append(lv_points)
@@ -675,65 +1431,454 @@ class PlotfileCooker(object):
 
     def read_cell_headers(self, maxmins, validate_mode):
         """
-        Read the cell header data and the maxs/mins for a given level
+        Read the cell header data and the maxs/mins for every level
         """
         cells = []
-        all_maxs = []
-        all_mins = []
-        for i in range(self.limit_level + 1):
-            lvcells = {}
-            all_maxs.append({})
-            all_mins.append({})
-            cfile_path = os.path.join(self.pfile, self.cell_paths[i], "Cell_H")
-            with open(cfile_path) as cfile:
-                # Skip 2 lines
-                cfile.readline()
-                cfile.readline()
-                # Are we good
-                n_fields_valid = cfile.readline()
-                assert int(n_fields_valid) == len(self.fields)
-                cfile.readline()
-                n_cells = int(cfile.readline().split()[0].replace('(', ''))
-                indexes = []
-                for _ in range(n_cells):
-                    start, stop, _ = cfile.readline().split()
-                    start = np.array(start.replace('(', '').replace(')', '').split(','), dtype=int)
-                    stop = np.array(stop.replace('(', '').replace(')', '').split(','), dtype=int)
-                    indexes.append([start, stop])
-                lvcells["indexes"] = indexes
-                cfile.readline()
-                assert n_cells == int(cfile.readline())
-                files = []
-                offsets = []
-                for _ in range(n_cells):
-                    _, file, offset = cfile.readline().split()
-                    files.append(os.path.join(self.pfile, self.cell_paths[i], file))
-                    offsets.append(int(offset))
-                if maxmins:
-                    lvmaxs = []
-                    lvmins = []
-                    cfile.readline()
-                    cfile.readline()
-                    for _ in range(n_cells):
-                        mins_str = cfile.readline().split(',')
-                        lvmins.append(np.array(mins_str[:-1], dtype=float))
-                    cfile.readline()
-                    cfile.readline()
-                    for _ in range(n_cells):
-                        maxs_str = cfile.readline().split(',')
-                        lvmaxs.append(np.array(maxs_str[:-1], dtype=float))
-            lvcells["files"] = files
-            lvcells["offsets"] = offsets
+        for lv in range(self.limit_level + 1):
+            cells.append(self.read_level_cells(lv, maxmins))
+        return cells
+
+    def read_level_cells(self, lv, maxmins):
+        """
+        Read the cell header data and the maxs/mins for a given level
+        """
+        lvcells = {}
+        cfile_path = os.path.join(self.pfile, self.cell_paths[lv], "Cell_H")
+        level_data = read_level_header(cfile_path,
+                                       len(self.fields),
+                                       self.ndims,
+                                       maxmins)
+        # (nboxes, 2, ndims) int32 array of the box indices
+        lvcells["indexes"] = level_data["indexes"]
+        # Table of the binary files and file index of each box
+        lv_path = os.path.join(self.pfile, self.cell_paths[lv])
+        file_names, file_ids = np.unique(level_data["files"], return_inverse=True)
+        file_table = [os.path.join(lv_path, bf) for bf in file_names]
+        lvcells["files"] = FileColumn(file_table, file_ids)
+        # (nboxes,) int64 array of the box offsets
+        lvcells["offsets"] = level_data["offsets"]
+        if maxmins:
+            lvcells['mins'] = {}
+            lvcells['maxs'] = {}
+            for field, minvals, maxvals in zip(self.fields, 
+                                               level_data["mins"].T,
+                                               level_data["maxs"].T):
+                lvcells['mins'][field] = minvals
+                lvcells['maxs'][field] = maxvals
+        return lvcells
+
+    """
+    Methods for the binary index cache of the plotfile headers
+    """
+
+    def index_cache_path(self):
+        """
+        Path of the binary sidecar file storing the parsed headers
+        """
+        return os.path.join(self.pfile, INDEX_CACHE_NAME)
+
+    def index_cache_signature(self, limit_level, cell_paths):
+        """
+        Size and modification time of the plotfile header and
+        the level headers up to limit_level. A cache with a
+        different signature is stale.
+        """
+        header_paths = [os.path.join(self.pfile, 'Header')]
+        for lv in range(limit_level + 1):
+            header_paths.append(os.path.join(self.pfile,
+                                             cell_paths[lv],
+                                             'Cell_H'))
+        signature = []
+        for pth in header_paths:
+            stat = os.stat(pth)
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        return np.array(signature, dtype=np.int64)
+
+    def read_index_cache(self, maxmins):
+        """
+        Load the box geometry and the level headers data from
+        the binary index cache. Returns False if the cache is
+        missing, stale or was written without the data needed
+        so that the headers are parsed instead.
+        """
+        try:
+            with np.load(self.index_cache_path()) as cache:
+                # Validate the cache content
+                if int(cache['version']) != INDEX_CACHE_VERSION:
+                    return False
+                cache_level = int(cache['limit_level'])
+                if cache_level < self.limit_level:
+                    return False
+                if maxmins and not bool(cache['maxmins']):
+                    return False
+                if int(cache['nfields']) != len(self.fields):
+                    return False
+                cell_paths = [str(pth) for pth in cache['cell_paths']]
+                signature = self.index_cache_signature(cache_level,
+                                                       cell_paths)
+                if not np.array_equal(signature, cache['signature']):
+                    return False
+                # Header data
+                self.step = str(cache['step'])
+                self.cell_paths = cell_paths[:self.limit_level + 1]
+                self.npoints = []
+                self.boxes = []
+                self.box_centers = []
+                self.cells = []
+                for lv in range(self.limit_level + 1):
+                    boxes = cache[f'boxes_{lv}']
+                    self.npoints.append(boxes.shape[0])
+                    self.boxes.append(boxes)
+                    centers = boxes[..., 0] + (boxes[..., 1] - boxes[..., 0])/2
+                    self.box_centers.append(centers)
+                    # Level header data
+                    lvcells = {}
+                    lvcells['indexes'] = cache[f'indexes_{lv}'].astype(np.int32)
+                    file_table = [os.path.join(self.pfile, str(bf))
+                                  for bf in cache[f'files_{lv}']]
+                    lvcells['files'] = FileColumn(file_table,
+                                                  cache[f'file_ids_{lv}'])
+                    lvcells['offsets'] = cache[f'offsets_{lv}']
+                    if maxmins:
+                        lvcells['mins'] = {}
+                        lvcells['maxs'] = {}
+                        for field, minvals, maxvals in zip(self.fields,
+                                                           cache[f'mins_{lv}'].T,
+                                                           cache[f'maxs_{lv}'].T):
+                            lvcells['mins'][field] = minvals
+                            lvcells['maxs'][field] = maxvals
+                    self.cells.append(lvcells)
+        # Missing, unreadable or incomplete cache
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def write_index_cache(self, maxmins):
+        """
+        Save the box geometry and the level headers data to
+        the binary index cache. This silently does nothing if
+        the plotfile directory is read only.
+        """
+        cache = {'version':INDEX_CACHE_VERSION,
+                 'limit_level':self.limit_level,
+                 'maxmins':maxmins,
+                 'nfields':len(self.fields),
+                 'step':self.step,
+                 'cell_paths':np.array(self.cell_paths),
+                 'signature':self.index_cache_signature(self.limit_level,
+                                                        self.cell_paths)}
+        for lv in range(self.limit_level + 1):
+            cache[f'boxes_{lv}'] = np.array(self.boxes[lv], dtype=float)
+            cache[f'indexes_{lv}'] = np.array(self.cells[lv]['indexes'],
+                                              dtype=np.int32)
+            # Store the binary files as a table of relative paths
+            # and the index of each box file in the table
+            files = self.cells[lv]['files']
+            cache[f'files_{lv}'] = np.array([os.path.relpath(bf, self.pfile)
+                                             for bf in files.table])
+            cache[f'file_ids_{lv}'] = files.ids
+            cache[f'offsets_{lv}'] = np.array(self.cells[lv]['offsets'],
+                                              dtype=np.int64)
             if maxmins:
+                cache[f'mins_{lv}'] = np.transpose([self.cells[lv]['mins'][f]
+                                                    for f in self.fields])
+                cache[f'maxs_{lv}'] = np.transpose([self.cells[lv]['maxs'][f]
+                                                    for f in self.fields])
+        # Write to a temporary file so a concurrent reader
+        # never sees a partially written cache
+        cache_path = self.index_cache_path()
+        tmp_path = cache_path + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as cfile:
+                np.savez(cfile, **cache)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    """
+    Methods for the portable binary index of the headers (marinate)
+    """
+
+    def write_index(self, path=None):
+        """
+        Write the parsed headers (header data, box geometry, level
+        headers, maxs/mins and adjacency of the boxes if they were
+        read or computed) to a kitchen index file that can be memory
+        mapped by PlotfileCooker.from_index
+        path: path of the index file (defaults to the plotfile
+              path with the .kidx extension)
+        returns the path of the index file
+        """
+        if path is None:
+            path = os.path.normpath(self.pfile) + KITCHEN_INDEX_EXT
+        maxmins = 'mins' in self.cells[0]
+        header = {"plotfile":os.path.abspath(self.pfile),
+                  "maxmins":maxmins,
+                  "ghost":self.adjacency is not None,
+                  "header":{"version":self.version,
+                            "fields":[[f, int(i)] for f, i in self.fields.items()],
+                            "ndims":self.ndims,
+                            "time":self.time,
+                            "max_level":self.max_level,
+                            "limit_level":self.limit_level,
+                            "geo_low":self.geo_low,
+                            "geo_high":self.geo_high,
+                            "factors":self.factors,
+                            "grid_sizes":[np.asarray(g).tolist() for g in self.grid_sizes],
+                            "step_numbers":self.step_numbers,
+                            "dx":self.dx,
+                            "sys_coord":self.sys_coord,
+                            "step":self.step,
+                            "cell_paths":self.cell_paths},
+                  "files":[]}
+        arrays = {}
+        for lv in range(self.limit_level + 1):
+            arrays[f'boxes_{lv}'] = np.array(self.boxes[lv], dtype=float)
+            arrays[f'indexes_{lv}'] = np.array(self.cells[lv]['indexes'],
+                                               dtype=np.int32)
+            # Binary files relative to the plotfile directory
+            files = self.cells[lv]['files']
+            header["files"].append([os.path.relpath(bf, self.pfile)
+                                    for bf in files.table])
+            arrays[f'file_ids_{lv}'] = files.ids
+            arrays[f'offsets_{lv}'] = np.array(self.cells[lv]['offsets'],
+                                               dtype=np.int64)
+            if maxmins:
+                arrays[f'mins_{lv}'] = np.transpose([self.cells[lv]['mins'][f]
+                                                     for f in self.fields])
+                arrays[f'maxs_{lv}'] = np.transpose([self.cells[lv]['maxs'][f]
+                                                     for f in self.fields])
+            if self.adjacency is not None:
+                arrays[f'ghost_starts_{lv}'] = self.adjacency[lv]["starts"]
+                arrays[f'ghost_neighbours_{lv}'] = self.adjacency[lv]["neighbours"]
+        return write_kitchen_index(path, header, arrays)
+
+    @classmethod
+    def from_index(cls, path, plotfile=None, readers=None, **reader_options):
+        """
+        Create the class from a kitchen index file written by
+        PlotfileCooker.write_index (or marinate) without parsing the
+        plotfile headers. The index is memory mapped and each level
+        (boxes, level headers, adjacency) is only materialized when
+        first accessed, the box data is read from the plotfile
+        ___
+        path: path of the index file
+        plotfile: path of the plotfile (defaults to the path of the
+                  plotfile when the index was written)
+        readers: ReaderConfig with the options of the readers of the box
+                 data (see PlotfileCooker.__init__)
+        reader_options: keyword arguments of ReaderConfig, used
+                        instead of readers (ex: read_gap=None)
+        """
+        index, arrays = read_kitchen_index(path)
+        pck = cls.__new__(cls)
+        pck.init_readers(readers, **reader_options)
+        pck.pfile = plotfile if plotfile is not None else index["plotfile"]
+        header = index["header"]
+        pck.version = header["version"]
+        pck.fields = {field:idx for field, idx in header["fields"]}
+        pck.nvars = len(header["fields"])
+        pck.nfields = len(pck.fields)
+        pck.ndims = header["ndims"]
+        pck.time = header["time"]
+        pck.max_level = header["max_level"]
+        pck.limit_level = header["limit_level"]
+        pck.geo_low = header["geo_low"]
+        pck.geo_high = header["geo_high"]
+        pck.factors = header["factors"]
+        pck.grid_sizes = [np.array(g) for g in header["grid_sizes"]]
+        pck.step_numbers = header["step_numbers"]
+        pck.dx = header["dx"]
+        pck.sys_coord = header["sys_coord"]
+        pck.step = header["step"]
+        pck.cell_paths = header["cell_paths"]
+        nlevels = pck.limit_level + 1
+        pck.npoints = [arrays[f'boxes_{lv}'].shape[0] for lv in range(nlevels)]
+        pck.grids = pck.compute_global_grids()
+
+        def read_centers(lv):
+            boxes = arrays[f'boxes_{lv}']
+            return boxes[..., 0] + (boxes[..., 1] - boxes[..., 0])/2
+
+        def read_level(lv):
+            lvcells = {'indexes':arrays[f'indexes_{lv}']}
+            file_table = [os.path.join(pck.pfile, bf) for bf in index["files"][lv]]
+            lvcells['files'] = FileColumn(file_table, arrays[f'file_ids_{lv}'])
+            lvcells['offsets'] = arrays[f'offsets_{lv}']
+            if index["maxmins"]:
                 lvcells['mins'] = {}
                 lvcells['maxs'] = {}
-                for field, minvals, maxvals in zip(self.fields, 
-                                                   np.transpose(lvmins),
-                                                   np.transpose(lvmaxs)):
-                    lvcells['mins'][field] = minvals
-                    lvcells['maxs'][field] = maxvals
-            cells.append(lvcells)
-        return cells
+                for i, field in enumerate(pck.fields):
+                    lvcells['mins'][field] = arrays[f'mins_{lv}'][:, i]
+                    lvcells['maxs'][field] = arrays[f'maxs_{lv}'][:, i]
+            return lvcells
+
+        pck.boxes = LevelHeaders(lambda lv: arrays[f'boxes_{lv}'], nlevels)
+        pck.box_centers = LevelHeaders(read_centers, nlevels)
+        pck.cells = LevelHeaders(read_level, nlevels)
+        if index["ghost"]:
+            pck.adjacency = LevelHeaders(lambda lv: {"starts":arrays[f'ghost_starts_{lv}'],
+                                                     "neighbours":arrays[f'ghost_neighbours_{lv}']},
+                                         nlevels)
+        return pck
+
+    """
+    Methods managing the worker pool
+    """
+
+    def pool(self):
+        """
+        Worker pool used to read the box data, created on
+        first use and reused by every indexing operation
+        """
+        if self._pool is None:
+            start = time.time()
+            if self.io_backend == "processes":
+                nworkers = self.workers or os.cpu_count()
+                # The workers must share the tracker of the shared
+                # memory blocks with the main process (the arena can
+                # be created after the pool)
+                if os.name == "posix":
+                    resource_tracker.ensure_running()
+                self._pool = multiprocessing.Pool(nworkers)
+            elif self.io_backend == "threads":
+                nworkers = self.workers or THREAD_READERS
+                self._pool = multiprocessing.pool.ThreadPool(nworkers)
+            # Count the I/O of the workers
+            self._pool = profile_pool(self._pool, nworkers)
+            # Stop the workers when the class is garbage collected
+            # or at exit if close() is not called
+            self._pool_finalizer = weakref.finalize(self, self._pool.terminate)
+            # Wait for the workers to be ready
+            self._pool.map(abs, range(nworkers), chunksize=1)
+            self.pool_stats['startup'] += time.time() - start
+            self.pool_stats['pools'] += 1
+        return self._pool
+
+    def close(self):
+        """
+        Close the worker pool, the shared memory arena and the memory maps
+        (A new pool is created if the data is read again)
+        """
+        if self._pool is not None:
+            self._pool_finalizer.detach()
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._arena is not None:
+            self._arena_finalizer.detach()
+            self._arena.close()
+            self._arena = None
+        self.close_mmaps()
+
+    def arena(self):
+        """
+        Shared memory arena in which the worker processes write the
+        box data with transport="shared_memory", created on first use
+        """
+        if self._arena is None:
+            self._arena = SharedArena(ARENA_BYTES)
+            # Remove the shared memory block at exit
+            self._arena_finalizer = weakref.finalize(self, self._arena.close)
+        return self._arena
+
+    def pool_outputs(self, fun, iterable, nbytes, ordered=True):
+        """
+        Iterator over the outputs of fun applied to the items of
+        iterable with the worker pool. With transport="shared_memory"
+        and the processes backend, the arrays of the outputs are sent
+        back through the shared memory arena, else they are pickled
+        (or returned as is by the threads)
+        nbytes: size in bytes of the arrays returned for each item
+        ordered: if False the outputs are yielded as they are computed
+        """
+        pool = self.pool()
+        if self.transport == "shared_memory" and self.io_backend == "processes":
+            return self.arena().map(pool, fun, iterable, nbytes, ordered=ordered)
+        if ordered:
+            return pool.imap(fun, iterable)
+        return pool.imap_unordered(fun, iterable)
+
+    def pool_report(self):
+        """
+        Time spent starting the worker pool compared with
+        the time spent reading the box data with it
+        """
+        stats = self.pool_stats
+        return (f"Worker pool: {stats['pools']} startup(s) in"
+                f" {stats['startup']:.3f} s, {stats['reads']} read(s)"
+                f" in {stats['read']:.3f} s")
+
+    def box_index(self):
+        """
+        Spatial index of the boxes at each level (BoxIndex) built on
+        first use. The boxes are binned with a margin of half a cell
+        so point queries can match the boxes neighbouring a point
+        """
+        if self.spatial_index is None:
+            margins = [np.array(self.dx[lv]) / 2 for lv in range(self.limit_level + 1)]
+            self.spatial_index = BoxIndex(self.boxes, margins)
+        return self.spatial_index
+
+    def box_header_sizes(self, lv):
+        """
+        Size in bytes of the ascii header before the data of each
+        box at level lv. Inferred from the offset of the next box
+        in the binary file as the boxes are written back to back
+        and validated by parsing the header bytes (the header line
+        of the box is parsed when the inferred size does not hold
+        a header of the box shape, -1 if no valid header is found)
+        """
+        if lv not in self.header_sizes:
+            files = np.asarray(self.cells[lv]['files'])
+            offsets = np.asarray(self.cells[lv]['offsets'])
+            indexes = np.asarray(self.cells[lv]['indexes'])
+            shapes = indexes[:, 1] - indexes[:, 0] + 1
+            data_sizes = np.prod(shapes, axis=1) * self.nvars * 8
+            sizes = np.zeros(len(offsets), dtype=np.int64)
+            for bfile in np.unique(files):
+                bids = np.nonzero(files == bfile)[0]
+                bids = bids[np.argsort(offsets[bids])]
+                # The size of the last box header stays 0 and is parsed
+                sizes[bids[:-1]] = offsets[bids[1:]] - offsets[bids[:-1]] - data_sizes[bids[:-1]]
+                with open_binary(bfile) as bf:
+                    for bid in bids:
+                        bf.seek(offsets[bid])
+                        # Headers are a single short line
+                        if 0 < sizes[bid] <= 4096:
+                            header = bf.read(sizes[bid])
+                            if box_header_matches(header, shapes[bid], self.nvars):
+                                continue
+                            bf.seek(offsets[bid])
+                        # Parse the header line of the box
+                        header = bf.readline(4096)
+                        if box_header_matches(header, shapes[bid], self.nvars):
+                            sizes[bid] = len(header)
+                        else:
+                            sizes[bid] = -1
+            self.header_sizes[lv] = sizes
+        return self.header_sizes[lv]
+
+    """
+    Methods for the memory mapped data access (io="mmap")
+    """
+
+    def mmap_file(self, bfile):
+        """
+        Memory map of a binary file (created once per file)
+        """
+        bfile = str(bfile)
+        if bfile not in self.mmaps:
+            self.mmaps[bfile] = np.memmap(bfile, dtype='uint8', mode='r')
+        return self.mmaps[bfile]
+
+    def close_mmaps(self):
+        """
+        Drop the memory maps of the binary files
+        (The mappings are released once no box view uses them)
+        """
+        self.mmaps = {}
 
     def field_index(self, field):
         """ return the index of a data field """
@@ -795,6 +1940,203 @@ class PlotfileCooker(object):
         z_box = np.repeat([np.repeat([z_loc], shape[1], axis=0)], shape[0], axis=0)
         return x_box, y_box, z_box
 
+    """
+    Methods interpolating the data at arbitrary points
+    """
+
+    def ghost_padded_boxes(self, lv, box_ids, fields, nghost=1, coarse="constant"):
+        """
+        Box data padded with nghost layers of ghost cells filled with
+        the data of the neighbouring boxes at the same level, else
+        with the data of the coarser level, else by repeating the box
+        edge values at the domain boundaries
+        lv: AMR level of the boxes
+        box_ids: indices of the boxes at level lv
+        fields: field selection as in PlotfileCooker[fields]
+        nghost: number of ghost cell layers
+        coarse: interpolation of the coarser level data, "constant"
+                (piecewise constant) or "linear"
+        All the boxes needed to fill the ghost cells are read once
+        in a single (coalesced) read per level
+        returns a list of arrays with shape (nx + 2 * nghost, ..., nfields)
+        """
+        if coarse not in ["constant", "linear"]:
+            raise ValueError((f"Unknown coarse interpolation '{coarse}',"
+                              f" use 'constant' or 'linear'"))
+        selector = self[fields]
+        indexes = {lv:np.asarray(self.cells[lv]['indexes'])}
+        fine_size = np.asarray(self.grid_sizes[lv])
+        if lv > 0:
+            indexes[lv - 1] = np.asarray(self.cells[lv - 1]['indexes'])
+            ratio = self.factors[lv - 1]
+            coarse_size = np.asarray(self.grid_sizes[lv - 1])
+            coarse_dx = np.array(self.dx[lv - 1])
+
+        def overlap(lo, hi, nlo, nhi):
+            """
+            Slices of the intersection of the boxes [lo, hi] and
+            [nlo, nhi] in each box (None if they do not intersect)
+            """
+            ilo = np.maximum(lo, nlo)
+            ihi = np.minimum(hi, nhi)
+            if np.any(ilo > ihi):
+                return None
+            target = tuple([slice(l - o, h - o + 1) for l, h, o in zip(ilo, ihi, lo)])
+            source = tuple([slice(l - o, h - o + 1) for l, h, o in zip(ilo, ihi, nlo)])
+            return target, source
+
+        # Find the boxes needed to fill the ghost cells
+        # from the box indices only
+        neighbours = {}
+        covered = {}
+        patches = {}
+        needed = {lv:set(box_ids)}
+        for bid in box_ids:
+            plo = indexes[lv][bid][0] - nghost
+            phi = indexes[lv][bid][1] + nghost
+            neighbours[bid] = self.box_neighbours(lv, bid, nghost)
+            needed[lv].update(neighbours[bid])
+            # Cells filled by the box, the same level neighbours
+            # or outside the domain
+            covered[bid] = np.ones(tuple(phi - plo + 1), dtype=bool)
+            inside = overlap(plo, phi, np.zeros_like(plo), fine_size - 1)
+            covered[bid][inside[0]] = False
+            for nid in np.append(neighbours[bid], bid):
+                target, _ = overlap(plo, phi, *indexes[lv][nid])
+                covered[bid][target] = True
+            # Coarse cells around the remaining ghost cells
+            # (with one more layer for the linear interpolation)
+            if lv > 0 and not np.all(covered[bid]):
+                clo = np.maximum(plo // ratio - 1, 0)
+                chi = np.minimum(phi // ratio + 1, coarse_size - 1)
+                cids = self.box_index().region_boxes(lv - 1,
+                                                     self.geo_low + clo * coarse_dx,
+                                                     self.geo_low + (chi + 1) * coarse_dx)
+                cidx = indexes[lv - 1][cids]
+                cids = cids[np.all(cidx[:, 0] <= chi, axis=1) &
+                            np.all(clo <= cidx[:, 1], axis=1)]
+                patches[bid] = (clo, chi, cids)
+                needed.setdefault(lv - 1, set()).update(cids)
+        # Read all the needed boxes once
+        box_data = {}
+        for nlv in needed:
+            nids = np.array(sorted(needed[nlv]), dtype=int)
+            if len(nids) == 0:
+                continue
+            for nid, data in zip(nids, selector[nlv][nids]):
+                # Always keep a field axis
+                if isinstance(selector.farg, int):
+                    data = data[..., np.newaxis]
+                box_data[(nlv, nid)] = data
+        padded_boxes = []
+        for bid in box_ids:
+            data = box_data[(lv, bid)]
+            padding = [(nghost, nghost)] * self.ndims + [(0, 0)]
+            # Domain boundaries repeat the edge values
+            padded = np.pad(data, padding, mode='edge')
+            # Indices of the padded box at level lv
+            plo = indexes[lv][bid][0] - nghost
+            phi = indexes[lv][bid][1] + nghost
+            # Coarse level data
+            if bid in patches:
+                clo, chi, cids = patches[bid]
+                patch = np.full(tuple(chi - clo + 1) + (data.shape[-1],), np.nan)
+                for cid in cids:
+                    target, source = overlap(clo, chi, *indexes[lv - 1][cid])
+                    patch[target] = box_data[(lv - 1, cid)][source]
+                ghosts = np.nonzero(~covered[bid])
+                fine = [ghosts[d] + plo[d] for d in range(self.ndims)]
+                values = patch[tuple([fine[d] // ratio - clo[d]
+                                      for d in range(self.ndims)])]
+                if coarse == "linear":
+                    # Fine cell centers in the coarse patch indices
+                    coords = [(fine[d] + 0.5) / ratio - 0.5 - clo[d]
+                              for d in range(self.ndims)]
+                    linear = np.transpose([map_coordinates(patch[..., fid],
+                                                           coords,
+                                                           order=1,
+                                                           mode='nearest')
+                                           for fid in range(patch.shape[-1])])
+                    # Piecewise constant where the stencil is incomplete
+                    values = np.where(np.isnan(linear), values, linear)
+                # Edge values where there is no coarse data
+                padded[ghosts] = np.where(np.isnan(values), padded[ghosts], values)
+            # Same level data
+            for nid in neighbours[bid]:
+                target, source = overlap(plo, phi, *indexes[lv][nid])
+                padded[target] = box_data[(lv, nid)][source]
+            padded_boxes.append(padded)
+        return padded_boxes
+
+    def probe(self, points, fields, batch_size=256, order=3):
+        """
+        Interpolate the data at many points at once
+        ___
+        points: (npoints, ndims) array of coordinates
+        fields: field selection as in PlotfileCooker[fields]
+        batch_size: number of boxes held in memory at once
+        order: spline order of the interpolation (scipy map_coordinates)
+               3 as when calling PlotfileCooker[fields](x, y, z),
+               1 for a linear interpolation
+        Each point is interpolated in the box containing
+        it at the finest level, using one layer of ghost cells for the
+        points between the cell centers and the box boundary. Each box
+        is read once and all its points are interpolated together.
+        The points are mapped to the cell indices as when calling
+        PlotfileCooker[fields](x, y, z): (point - geo_low)/dx - 0.5,
+        the values only differ slightly (mostly close to the box
+        boundaries) as the spline of probe also spans the ghost cells.
+        returns an array (npoints,) for a single field or
+        (npoints, nfields) with NaN for points outside the domain
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if points.shape[1] != self.ndims:
+            raise ValueError((f"The points must have {self.ndims} coordinates"
+                              f" (shape {points.shape} was given)"))
+        selector = self[fields]
+        box_index = self.box_index()
+        single_field = isinstance(selector.farg, int)
+        nfields = 1 if single_field else len(np.arange(self.nvars)[selector.farg])
+        values = np.full((len(points), nfields), np.nan)
+        # Finest level box containing each point
+        point_levels = np.full(len(points), -1)
+        point_boxes = np.full(len(points), -1)
+        for lv in range(self.limit_level, -1, -1):
+            remaining = np.nonzero(point_boxes < 0)[0]
+            if len(remaining) == 0:
+                break
+            lv_boxes = box_index.locate_points(lv, points[remaining])
+            found = lv_boxes >= 0
+            point_levels[remaining[found]] = lv
+            point_boxes[remaining[found]] = lv_boxes[found]
+        for lv in range(self.limit_level + 1):
+            lv_points = np.nonzero(point_levels == lv)[0]
+            if len(lv_points) == 0:
+                continue
+            dx = np.array(self.dx[lv])
+            indexes = np.asarray(self.cells[lv]['indexes'])
+            # Group the points by box
+            box_points = lv_points[np.argsort(point_boxes[lv_points], kind='stable')]
+            box_ids, first = np.unique(point_boxes[box_points], return_index=True)
+            groups = np.split(box_points, first[1:])
+            for start in range(0, len(box_ids), batch_size):
+                batch = box_ids[start:start + batch_size]
+                padded_boxes = self.ghost_padded_boxes(lv, batch, fields)
+                for bid, padded, pids in zip(batch,
+                                             padded_boxes,
+                                             groups[start:start + batch_size]):
+                    # Point coordinates in the padded box indices
+                    coords = ((points[pids] - self.geo_low) / dx - 0.5
+                              - indexes[bid][0] + 1)
+                    for fid in range(nfields):
+                        values[pids, fid] = map_coordinates(padded[..., fid],
+                                                            coords.T,
+                                                            order=order,
+                                                            mode='nearest')
+        if single_field:
+            return values[:, 0]
+        return values
+
     """
     Iterators to loop over plotfile data manually
     """
@@ -970,6 +2312,125 @@ class PlotfileCooker(object):
                 mp_call[ky] = kwargs[ky]
             yield mp_call
 
+    """
+    Methods computing the cells covered by the finer levels
+    """
+
+    def covering_boxes(self, lv, bid):
+        """
+        Indices of the boxes at level lv + 1 covering part of the
+        box bid at level lv and their global indices coarsened to
+        level lv and clipped to the box (shape (nboxes, 2, ndims))
+        """
+        indexes = np.asarray(self.cells[lv]['indexes'][bid])
+        # Candidate boxes from the spatial index
+        box = np.asarray(self.boxes[lv][bid])
+        fine_ids = self.box_index().region_boxes(lv + 1, box[:, 0], box[:, 1])
+        fine_indexes = np.asarray(self.cells[lv + 1]['indexes'])[fine_ids]
+        # Exact intersection with the coarsened indices
+        # (Floor division keeps partially covered coarse cells
+        #  but the refinement factors divide the fine boxes)
+        coarse = fine_indexes // self.factors[lv]
+        overlap = (np.all(coarse[:, 0] <= indexes[1], axis=1) &
+                   np.all(coarse[:, 1] >= indexes[0], axis=1))
+        coarse = coarse[overlap]
+        coarse[:, 0] = np.maximum(coarse[:, 0], indexes[0])
+        coarse[:, 1] = np.minimum(coarse[:, 1], indexes[1])
+        return fine_ids[overlap], coarse
+
+    def valid_mask(self, lv, bid):
+        """
+        Boolean array with the shape of the box bid at level lv which
+        is True where the cells are not covered by level lv + 1
+        (The boxes at self.limit_level are never covered). The masks
+        are cached as packed bits in self.valid_masks and can be saved
+        with self.write_mask_cache()
+        """
+        indexes = np.asarray(self.cells[lv]['indexes'][bid])
+        shape = tuple(indexes[1] - indexes[0] + 1)
+        if lv >= self.limit_level:
+            return np.ones(shape, dtype=bool)
+        lv_masks = self.valid_masks.setdefault(lv, {})
+        if bid not in lv_masks:
+            mask = np.ones(shape, dtype=bool)
+            _, coarse = self.covering_boxes(lv, bid)
+            for lo, hi in coarse - indexes[0]:
+                mask[tuple(slice(l, h + 1) for l, h in zip(lo, hi))] = False
+            lv_masks[bid] = np.packbits(mask, axis=None)
+            return mask
+        packed = lv_masks[bid]
+        return np.unpackbits(packed, count=int(np.prod(shape))).reshape(shape).astype(bool)
+
+    def covered_fraction(self, lv):
+        """
+        Fraction of the cells of each box at level lv covered by
+        level lv + 1
+        """
+        fractions = np.zeros(len(self.boxes[lv]))
+        if lv < self.limit_level:
+            for bid in range(len(fractions)):
+                fractions[bid] = 1 - np.mean(self.valid_mask(lv, bid))
+        return fractions
+
+    def mask_cache_path(self):
+        """
+        Path of the binary sidecar file storing the covering masks
+        """
+        return os.path.join(self.pfile, MASK_CACHE_NAME)
+
+    def write_mask_cache(self, path=None):
+        """
+        Compute the covering masks of the boxes up to self.limit_level - 1
+        and save them as packed bits in a binary sidecar file (by default
+        in the plotfile directory). Returns the path of the file
+        """
+        path = path or self.mask_cache_path()
+        cache = {'version':MASK_CACHE_VERSION,
+                 'limit_level':self.limit_level,
+                 'signature':self.index_cache_signature(self.limit_level,
+                                                        self.cell_paths)}
+        for lv in range(self.limit_level):
+            packed = []
+            for bid in range(len(self.boxes[lv])):
+                if bid not in self.valid_masks.get(lv, {}):
+                    self.valid_mask(lv, bid)
+                packed.append(self.valid_masks[lv][bid])
+            # Concatenated bits and start of each box
+            sizes = [len(p) for p in packed]
+            cache[f'bits_{lv}'] = np.concatenate(packed)
+            cache[f'starts_{lv}'] = np.concatenate([[0], np.cumsum(sizes)])
+        tmp_path = path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as cfile:
+            np.savez_compressed(cfile, **cache)
+        os.replace(tmp_path, path)
+        return path
+
+    def read_mask_cache(self, path=None):
+        """
+        Load the covering masks from a binary sidecar file written
+        by self.write_mask_cache(). Returns False if the file is
+        missing or was written for a different plotfile or limit level
+        """
+        path = path or self.mask_cache_path()
+        try:
+            with np.load(path) as cache:
+                if int(cache['version']) != MASK_CACHE_VERSION:
+                    return False
+                if int(cache['limit_level']) != self.limit_level:
+                    return False
+                signature = self.index_cache_signature(self.limit_level,
+                                                       self.cell_paths)
+                if not np.array_equal(signature, cache['signature']):
+                    return False
+                for lv in range(self.limit_level):
+                    bits = cache[f'bits_{lv}']
+                    starts = cache[f'starts_{lv}']
+                    self.valid_masks[lv] = {bid:bits[starts[bid]:starts[bid + 1]]
+                                            for bid in range(len(starts) - 1)}
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
     """
     Methods resolving the box adjacency in the plotfile
     """
@@ -983,7 +2444,6 @@ class PlotfileCooker(object):
         """
         # Cell resolution in each direction
         box_shapes = self.unique_box_shapes()
-        #box_rez = np.min(box_shapes, axis=0)
         box_rez = np.min(box_shapes)
         box_arrays = []
         box_array_indices = []
@@ -1002,41 +2462,73 @@ class PlotfileCooker(object):
             box_array_indices.append(lv_barray_indices)
         return box_arrays, box_array_indices
 
+    def compute_adjacency(self, nghost=1):
+        """
+        This computes the indices of the boxes adjacent to each
+        box (sharing a face, an edge or a corner) at every level.
+        The map of each level is a dict with the neighbours in
+        compressed sparse row format:
+            "starts": array with shape (nboxes + 1,)
+            "neighbours": the neighbours of box i are
+                          neighbours[starts[i]:starts[i + 1]]
+        """
+        adjacency = []
+        for lv in range(self.limit_level + 1):
+            starts, neighbours = box_adjacency(self.cells[lv]['indexes'], nghost)
+            adjacency.append({"starts":starts,
+                              "neighbours":neighbours})
+        return adjacency
+
     def compute_ghost_map(self):
         """
         This computes indices of the boxes adjacent
         to a given box. Indices have shape 3x2 for the
         low and high faces of every dimension. If no box
-        is adjacent in a given direction the index is set
-        to None
+        is adjacent in a given direction the list is empty
         """
         ghost_map = []
         for lv in range(self.limit_level + 1):
             lv_gmap = []
-            barr_shape = self.box_arrays[lv].shape
-            for box_index, indices in enumerate(self.barr_indices[lv]):
-                gmap = [[[], []], [[], []], [[], []]]
-                for coo in range(self.ndims):
-                    idx_lo = np.copy(indices)
-                    idx_lo[0][coo] = max(idx_lo[0][coo] - 1, 0)
-                    for bid in np.unique(self.box_arrays[lv][idx_lo[0][0]:idx_lo[1][0],
-                                                             idx_lo[0][1]:idx_lo[1][1],
-                                                             idx_lo[0][2]:idx_lo[1][2]]):
-                        if bid != box_index:
-                            gmap[coo][0].append(bid)
-
-                    idx_hi = np.copy(indices)
-                    idx_hi[1] += 1
-                    idx_hi[1][coo] = min(idx_hi[1][coo] + 1, barr_shape[coo] - 1)
-                    for bid in np.unique(self.box_arrays[lv][idx_hi[0][0]:idx_hi[1][0],
-                                                             idx_hi[0][1]:idx_hi[1][1],
-                                                             idx_hi[0][2]:idx_hi[1][2]]):
-                        if bid != box_index:
-                            gmap[coo][1].append(bid)
-                lv_gmap.append(gmap)
+            for bid in range(len(self.cells[lv]['indexes'])):
+                lv_gmap.append([[low.tolist(), high.tolist()] for low, high
+                                in self.face_neighbours(lv, bid)])
             ghost_map.append(lv_gmap)
         return ghost_map
 
+    def box_neighbours(self, lv, bid, nghost=1):
+        """
+        Indices of the boxes adjacent to the box bid at level lv
+        (or intersecting it when extended by nghost cells)
+        """
+        if nghost == 1:
+            if self.adjacency is None:
+                self.adjacency = self.compute_adjacency()
+            lv_map = self.adjacency[lv]
+        else:
+            if nghost not in self.wide_adjacency:
+                self.wide_adjacency[nghost] = self.compute_adjacency(nghost)
+            lv_map = self.wide_adjacency[nghost][lv]
+        return lv_map["neighbours"][lv_map["starts"][bid]:lv_map["starts"][bid + 1]]
+
+    def face_neighbours(self, lv, bid):
+        """
+        Indices of the boxes sharing the low and high faces of the
+        box bid at level lv in each dimension:
+        [[low face boxes, high face boxes], ...] (ndims x 2)
+        """
+        indexes = np.asarray(self.cells[lv]['indexes'])
+        lo, hi = indexes[bid]
+        nids = self.box_neighbours(lv, bid)
+        nlo, nhi = indexes[nids, 0], indexes[nids, 1]
+        faces = []
+        for dim in range(self.ndims):
+            # Overlap in the other dimensions
+            others = [d for d in range(self.ndims) if d != dim]
+            overlap = (np.all(nlo[:, others] <= hi[others], axis=1) &
+                       np.all(lo[others] <= nhi[:, others], axis=1))
+            faces.append([nids[overlap & (nhi[:, dim] == lo[dim] - 1)],
+                          nids[overlap & (nlo[:, dim] == hi[dim] + 1)]])
+        return faces
 
     """
     Methods to write new plotfiles using existing structure
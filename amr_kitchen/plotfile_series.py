@@ -0,0 +1,245 @@
+import os
+import glob
+import hashlib
+import collections
+import multiprocessing
+import numpy as np
+from amr_kitchen.plotfile_cooker import PlotfileCooker
+from amr_kitchen.profiling import profile_pool
+
+
+def read_series_member(args):
+    """
+    Multiprocessing function parsing the headers of a plotfile
+    of a PlotfileSeries. The mesh data of the plotfiles with a
+    layout already read by the main process is not sent back
+    args: (plotfile path, PlotfileCooker keyword arguments,
+           layout keys already read)
+    returns (layout key, PlotfileCooker)
+    """
+    path, kwargs, known_layouts = args
+    pck = PlotfileCooker(path, **kwargs)
+    key = layout_key(pck)
+    if key in known_layouts:
+        strip_mesh(pck)
+    return key, pck
+
+def strip_mesh(pck):
+    """
+    Drop the mesh data of a plotfile (restored from a plotfile
+    with the same layout by PlotfileSeries.share_mesh)
+    """
+    pck.boxes = None
+    pck.box_centers = None
+    pck.grids = None
+    for lv in range(pck.limit_level + 1):
+        pck.cells[lv]['indexes'] = None
+    pck.adjacency = None
+    pck.spatial_index = None
+
+def layout_key(pck):
+    """
+    Hash of the mesh of a plotfile: the domain geometry and the
+    box indices of each level up to pck.limit_level. Plotfiles with
+    the same key have the same boxes (pck1 == pck2 is True)
+    """
+    digest = hashlib.sha1()
+    digest.update(np.array([pck.ndims, pck.limit_level], dtype=np.int64).tobytes())
+    digest.update(np.array([pck.geo_low, pck.geo_high], dtype=float).tobytes())
+    for lv in range(pck.limit_level + 1):
+        digest.update(np.asarray(pck.dx[lv], dtype=float).tobytes())
+        indexes = np.ascontiguousarray(pck.cells[lv]['indexes'], dtype=np.int64)
+        digest.update(np.array(indexes.shape, dtype=np.int64).tobytes())
+        digest.update(indexes.tobytes())
+    return digest.hexdigest()
+
+
+class PlotfileSeries(object):
+    """
+    Time series of plotfiles where the plotfiles with the same
+    mesh share their mesh data (boxes, box indices, grids, ghost
+    map, spatial index and the covering masks computed from them)
+    to save memory
+    """
+
+    def __init__(self, plotfiles, workers=None, **kwargs):
+        """
+        Parse the headers of the plotfiles in parallel and share
+        the mesh data of the plotfiles with identical box layouts
+        ___
+        plotfiles: glob pattern matching the plotfile directories
+                   (e.g. "run/plt*") or list of plotfile paths
+        workers: number of processes parsing the headers (defaults
+                 to the number of CPUs, 0 parses them in serial)
+        kwargs: keyword arguments of the PlotfileCooker of each
+                plotfile (limit_level, maxmins, ...)
+        The plotfiles are sorted by time, then by step and path:
+        ```
+        series = PlotfileSeries("run/plt*", limit_level=1)
+        series.times  # time of each plotfile
+        series.steps  # step number of each plotfile
+        series[-1]    # PlotfileCooker of the last plotfile
+        ```
+        """
+        if isinstance(plotfiles, str):
+            paths = sorted(glob.glob(plotfiles))
+        else:
+            paths = [str(p) for p in plotfiles]
+        # Only the plotfile directories
+        paths = [p for p in paths if os.path.isfile(os.path.join(p, "Header"))]
+        if len(paths) == 0:
+            raise ValueError(f"No plotfile found in {plotfiles}")
+        # The lazy headers are parsed before pickling anyway
+        kwargs.pop('lazy', None)
+        kwargs.pop('background', None)
+        members, member_keys = [], []
+        # Plotfile with the mesh data of each layout
+        mesh_refs = {}
+        for key, pck in self.read_members(paths, kwargs, workers):
+            # The mesh is shared as the plotfiles are received
+            if key in mesh_refs:
+                self.share_mesh(mesh_refs[key], pck)
+            else:
+                mesh_refs[key] = pck
+            members.append(pck)
+            member_keys.append(key)
+        # Sort by time
+        order = sorted(range(len(members)),
+                       key=lambda i: (members[i].time, int(members[i].step), paths[i]))
+        self.plotfiles = [members[i] for i in order]
+        self.paths = [paths[i] for i in order]
+        self.times = np.array([pck.time for pck in self.plotfiles])
+        self.steps = np.array([int(pck.step) for pck in self.plotfiles])
+        # Index of the layout of each plotfile
+        self.layout_ids = np.empty(len(self.plotfiles), dtype=int)
+        # First plotfile of each layout
+        self.layouts = []
+        keys = {}
+        for i, pck in enumerate(self.plotfiles):
+            key = member_keys[order[i]]
+            if key not in keys:
+                keys[key] = len(self.layouts)
+                self.layouts.append(pck)
+            self.layout_ids[i] = keys[key]
+
+    @staticmethod
+    def read_members(paths, kwargs, workers):
+        """
+        Parse the headers of the plotfiles (in parallel with
+        workers processes) and yield their (layout key,
+        PlotfileCooker) in order. Each plotfile read after the
+        first plotfile of its layout is received comes back
+        without its mesh data to keep the peak memory low
+        """
+        known_layouts = set()
+        if workers == 0 or len(paths) == 1:
+            for path in paths:
+                key, pck = read_series_member((path, kwargs, known_layouts))
+                known_layouts.add(key)
+                yield key, pck
+            return
+        nworkers = workers or os.cpu_count()
+        with profile_pool(multiprocessing.Pool(nworkers)) as pool:
+            def read_member(path):
+                return pool.apply_async(read_series_member,
+                                        ((path, kwargs, frozenset(known_layouts)),))
+            paths = iter(paths)
+            pending = collections.deque()
+            # One plotfile read by each worker at once
+            for path in paths:
+                pending.append(read_member(path))
+                if len(pending) >= nworkers:
+                    break
+            while pending:
+                key, pck = pending.popleft().get()
+                known_layouts.add(key)
+                path = next(paths, None)
+                if path is not None:
+                    pending.append(read_member(path))
+                yield key, pck
+
+    @staticmethod
+    def share_mesh(ref, pck):
+        """
+        Replace the mesh data of pck by the one of ref
+        (both plotfiles must have the same layout)
+        """
+        pck.boxes = ref.boxes
+        pck.box_centers = ref.box_centers
+        pck.grids = ref.grids
+        for lv in range(pck.limit_level + 1):
+            pck.cells[lv]['indexes'] = ref.cells[lv]['indexes']
+        # Shared if already built for the layout, else each
+        # plotfile builds them when first needed
+        if ref.adjacency is not None:
+            pck.adjacency = ref.adjacency
+        if ref.spatial_index is not None:
+            pck.spatial_index = ref.spatial_index
+        # Computed when first needed for any of the plotfiles
+        pck.valid_masks = ref.valid_masks
+        pck.wide_adjacency = ref.wide_adjacency
+
+    def __len__(self):
+        return len(self.plotfiles)
+
+    def __iter__(self):
+        return iter(self.plotfiles)
+
+    def __getitem__(self, key):
+        """
+        PlotfileCooker of a plotfile of the series from its
+        index (or list of PlotfileCookers for a slice)
+        """
+        return self.plotfiles[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the worker pools of the plotfiles
+        """
+        for pck in self.plotfiles:
+            pck.close()
+
+    def index_at(self, time):
+        """
+        Index of the plotfile with the time closest to time
+        """
+        return int(np.argmin(np.abs(self.times - time)))
+
+    def at_time(self, time):
+        """
+        PlotfileCooker of the plotfile with the time closest to time
+        """
+        return self.plotfiles[self.index_at(time)]
+
+    def at_step(self, step):
+        """
+        PlotfileCooker of the plotfile at a step number
+        """
+        matches = np.nonzero(self.steps == step)[0]
+        if len(matches) == 0:
+            raise KeyError(f"No plotfile at step {step}")
+        return self.plotfiles[matches[0]]
+
+    def layout(self, idx):
+        """
+        Plotfiles with the same mesh as the plotfile idx
+        """
+        return [self.plotfiles[i] for i in
+                np.nonzero(self.layout_ids == self.layout_ids[idx])[0]]
+
+    def regrids(self):
+        """
+        Indices of the plotfiles with a different mesh
+        than the previous plotfile of the series
+        """
+        return np.nonzero(np.diff(self.layout_ids) != 0)[0] + 1
+
+    def __repr__(self):
+        return (f"PlotfileSeries({len(self)} plotfiles, {len(self.layouts)}"
+                f" layout(s), t = {self.times[0]} to {self.times[-1]})")
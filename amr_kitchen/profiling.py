@@ -0,0 +1,461 @@
+"""
+I/O accounting of the binary files of the plotfiles and of the
+idle time of the worker pools (AMR_KITCHEN_PROFILE)
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import threading
+import multiprocessing
+import numpy as np
+
+# Environment variable enabling the I/O accounting, its value is the
+# path of the JSON report written at exit ("1" for the default path)
+PROFILE_ENV = "AMR_KITCHEN_PROFILE"
+PROFILE_REPORT = "kitchen_profile.json"
+PROFILE_VERSION = 1
+
+class IOCounters(object):
+    """
+    I/O accounting of the binary files accessed by a process or by
+    a task of a worker: number of opens, reads, seeks and writes, bytes
+    read and written and wall time spent in the file operations of
+    each file, with the tasks run by the workers and their busy time
+    """
+    FIELDS = ["opens", "reads", "seeks", "writes",
+              "bytes_read", "bytes_written", "time"]
+
+    def __init__(self):
+        self.files = {}
+        self.tasks = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def count(self, path, op, nbytes=0, elapsed=0.0):
+        """
+        Count an operation on the file at path
+        op: one of "opens", "reads", "seeks" and "writes"
+        nbytes: bytes read or written by the operation
+        elapsed: wall time of the operation
+        """
+        with self.lock:
+            if path not in self.files:
+                self.files[path] = dict.fromkeys(self.FIELDS, 0)
+            stats = self.files[path]
+            stats[op] += 1
+            stats['time'] += elapsed
+            if op == "reads":
+                stats['bytes_read'] += nbytes
+            elif op == "writes":
+                stats['bytes_written'] += nbytes
+
+    def state(self):
+        """
+        Picklable copy of the counters
+        """
+        with self.lock:
+            return {"files":{path:dict(stats) for path, stats in self.files.items()},
+                    "tasks":self.tasks,
+                    "busy":self.busy}
+
+    def merge(self, state):
+        """
+        Add the counters returned by IOCounters.state()
+        """
+        with self.lock:
+            for path, stats in state["files"].items():
+                if path not in self.files:
+                    self.files[path] = dict.fromkeys(self.FIELDS, 0)
+                for key in self.FIELDS:
+                    self.files[path][key] += stats[key]
+            self.tasks += state["tasks"]
+            self.busy += state["busy"]
+
+# Counters of the current process
+PROCESS_COUNTERS = IOCounters()
+# Counters of the task running in the current thread (set by profiled_call)
+TASK_COUNTERS = threading.local()
+# Profiled worker pools, their idle time is counted in the report
+PROFILED_POOLS = []
+# Time at which the I/O accounting was enabled
+PROFILE_START = [time.time()]
+# Whether the report is written at exit
+REPORT_REGISTERED = [False]
+
+def profiling_enabled():
+    """
+    True if the I/O accounting is enabled with the
+    AMR_KITCHEN_PROFILE environment variable
+    """
+    return os.environ.get(PROFILE_ENV, "") not in ["", "0"]
+
+def profile_report_path():
+    """
+    Path of the JSON report of the I/O accounting
+    """
+    value = os.environ.get(PROFILE_ENV, "")
+    if value in ["", "0", "1"]:
+        return PROFILE_REPORT
+    return value
+
+def io_counters():
+    """
+    Counters of the task running in the current thread
+    or of the current process
+    """
+    return getattr(TASK_COUNTERS, 'counters', None) or PROCESS_COUNTERS
+
+class ProfiledFile(object):
+    """
+    Binary file counting its operations in the I/O counters
+    (The other attributes are the ones of the file object)
+    """
+
+    def __init__(self, path, mode='rb', buffering=-1):
+        self.path = os.path.abspath(str(path))
+        start = time.perf_counter()
+        self.file = open(path, mode, buffering)
+        self.record("opens", 0, start)
+
+    def record(self, op, nbytes, start):
+        io_counters().count(self.path, op, nbytes,
+                            time.perf_counter() - start)
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.file.read(size)
+        self.record("reads", len(data), start)
+        return data
+
+    def readline(self, size=-1):
+        start = time.perf_counter()
+        line = self.file.readline(size)
+        self.record("reads", len(line), start)
+        return line
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        nread = self.file.readinto(buffer)
+        self.record("reads", nread or 0, start)
+        return nread
+
+    def write(self, data):
+        start = time.perf_counter()
+        nwritten = self.file.write(data)
+        self.record("writes", nwritten or 0, start)
+        return nwritten
+
+    def seek(self, offset, whence=0):
+        start = time.perf_counter()
+        position = self.file.seek(offset, whence)
+        self.record("seeks", 0, start)
+        return position
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+def open_binary(path, mode='rb', buffering=-1):
+    """
+    Open a binary file of the plotfile, the file operations
+    are counted when the I/O accounting is enabled
+    buffering: buffer size in bytes of the file object (a small
+               buffer avoids reading ahead of the box header when
+               only parts of the box data are read)
+    """
+    if profiling_enabled():
+        register_profile_report()
+        return ProfiledFile(path, mode, buffering)
+    return open(path, mode, buffering)
+
+def read_array(bf, dtype, count):
+    """
+    np.fromfile for the files opened with open_binary
+    """
+    if isinstance(bf, ProfiledFile):
+        start = time.perf_counter()
+        data = np.fromfile(bf.file, dtype, count)
+        bf.record("reads", data.nbytes, start)
+        return data
+    return np.fromfile(bf, dtype, count)
+
+def pread_into(bf, buffer, position):
+    """
+    Fill buffer with the bytes of the binary file starting at
+    position using positioned reads (without moving the file
+    position when os.preadv is available)
+    bf: binary file opened with open_binary
+    buffer: writable contiguous buffer (e.g. a numpy array)
+    """
+    block = memoryview(buffer).cast('B')
+    # Positioned reads may return less bytes than requested
+    while len(block) > 0:
+        if hasattr(os, 'preadv'):
+            start = time.perf_counter()
+            nread = os.preadv(bf.fileno(), [block], position)
+            if isinstance(bf, ProfiledFile):
+                bf.record("reads", nread, start)
+        else:
+            bf.seek(position)
+            nread = bf.readinto(block)
+        if not nread:
+            raise ValueError(f"Unexpected end of the binary file {bf.name}")
+        block = block[nread:]
+        position += nread
+
+def preadv_into(bf, buffers, position, max_buffers=1024):
+    """
+    Fill the buffers with the consecutive bytes of the binary file
+    starting at position using vectored positioned reads (a single
+    read for up to max_buffers buffers when os.preadv is available)
+    bf: binary file opened with open_binary
+    buffers: writable contiguous buffers filled in order
+    """
+    blocks = [memoryview(b).cast('B') for b in buffers]
+    blocks = [block for block in blocks if len(block) > 0]
+    if not hasattr(os, 'preadv'):
+        for block in blocks:
+            pread_into(bf, block, position)
+            position += len(block)
+        return
+    while len(blocks) > 0:
+        start = time.perf_counter()
+        nread = os.preadv(bf.fileno(), blocks[:max_buffers], position)
+        if isinstance(bf, ProfiledFile):
+            bf.record("reads", nread, start)
+        if not nread:
+            raise ValueError(f"Unexpected end of the binary file {bf.name}")
+        position += nread
+        # Drop the filled buffers and the filled part of the next one
+        filled = 0
+        while filled < len(blocks) and nread >= len(blocks[filled]):
+            nread -= len(blocks[filled])
+            filled += 1
+        blocks = blocks[filled:]
+        if len(blocks) > 0:
+            blocks[0] = blocks[0][nread:]
+
+def profiled_call(args):
+    """
+    Worker side of ProfiledPool: run the task with its own
+    I/O counters and return them with its output
+    args: (fun, fun_args, star) fun(*fun_args) is called if star
+          is True else fun(fun_args)
+    """
+    fun, fun_args, star = args
+    counters = IOCounters()
+    TASK_COUNTERS.counters = counters
+    start = time.perf_counter()
+    try:
+        output = fun(*fun_args) if star else fun(fun_args)
+    finally:
+        TASK_COUNTERS.counters = None
+    counters.tasks += 1
+    counters.busy += time.perf_counter() - start
+    return output, counters.state()
+
+class ProfiledResult(object):
+    """
+    AsyncResult of a task submitted to a ProfiledPool
+    """
+
+    def __init__(self, result):
+        self.result = result
+
+    def ready(self):
+        return self.result.ready()
+
+    def wait(self, timeout=None):
+        self.result.wait(timeout)
+
+    def get(self, timeout=None):
+        output, state = self.result.get(timeout)
+        PROCESS_COUNTERS.merge(state)
+        return output
+
+class ProfiledPool(object):
+    """
+    Worker pool wrapper collecting the I/O counters of the tasks
+    with their outputs. The idle time of the workers is the lifetime
+    of the pool times the number of workers minus their busy time
+    """
+
+    def __init__(self, pool, nworkers):
+        self.pool = pool
+        self.nworkers = nworkers
+        self.start = time.perf_counter()
+        self.stop = None
+        PROFILED_POOLS.append(self)
+
+    def lifetime(self):
+        """
+        Wall time between the creation and the end of the pool
+        """
+        stop = self.stop if self.stop is not None else time.perf_counter()
+        return stop - self.start
+
+    def collect(self, results):
+        for output, state in results:
+            PROCESS_COUNTERS.merge(state)
+            yield output
+
+    def map(self, fun, iterable, chunksize=None):
+        tasks = [(fun, arg, False) for arg in iterable]
+        return list(self.collect(self.pool.map(profiled_call, tasks, chunksize)))
+
+    def imap(self, fun, iterable):
+        tasks = ((fun, arg, False) for arg in iterable)
+        return self.collect(self.pool.imap(profiled_call, tasks))
+
+    def imap_unordered(self, fun, iterable):
+        tasks = ((fun, arg, False) for arg in iterable)
+        return self.collect(self.pool.imap_unordered(profiled_call, tasks))
+
+    def apply_async(self, fun, args=(), callback=None, error_callback=None):
+        # The counters are merged by ProfiledResult.get()
+        if callback is not None:
+            task_callback = lambda result: callback(result[0])
+        else:
+            task_callback = None
+        return ProfiledResult(self.pool.apply_async(profiled_call,
+                                                    ((fun, args, True),),
+                                                    callback=task_callback,
+                                                    error_callback=error_callback))
+
+    def close(self):
+        self.pool.close()
+
+    def join(self):
+        self.pool.join()
+        if self.stop is None:
+            self.stop = time.perf_counter()
+
+    def terminate(self):
+        self.pool.terminate()
+        if self.stop is None:
+            self.stop = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.terminate()
+
+def profile_pool(pool, nworkers=None):
+    """
+    Wrap a worker pool in a ProfiledPool when the I/O
+    accounting is enabled (returns the pool otherwise)
+    nworkers: number of workers of the pool (read from
+              the multiprocessing pool if not given)
+    """
+    if not profiling_enabled():
+        return pool
+    register_profile_report()
+    if nworkers is None:
+        nworkers = getattr(pool, '_processes', None) or os.cpu_count()
+    return ProfiledPool(pool, nworkers)
+
+def profile_report():
+    """
+    I/O accounting of the current process (including the tasks
+    of its profiled worker pools) as a dictionary with the totals,
+    the counters of each level directory and of each file and the
+    usage of the workers
+    """
+    state = PROCESS_COUNTERS.state()
+    totals = dict.fromkeys(IOCounters.FIELDS, 0)
+    levels = {}
+    for path, stats in state["files"].items():
+        # Level_n directories of the plotfiles
+        directory = os.path.dirname(path)
+        if re.match(r"Level_\d+$", os.path.basename(directory)) is None:
+            directory = "other"
+        if directory not in levels:
+            levels[directory] = dict.fromkeys(IOCounters.FIELDS, 0)
+            levels[directory]["files"] = 0
+        levels[directory]["files"] += 1
+        for key in IOCounters.FIELDS:
+            totals[key] += stats[key]
+            levels[directory][key] += stats[key]
+    capacity = sum([p.lifetime() * p.nworkers for p in PROFILED_POOLS])
+    workers = {"pools":len(PROFILED_POOLS),
+               "workers":sum([p.nworkers for p in PROFILED_POOLS]),
+               "tasks":state["tasks"],
+               "busy_time":state["busy"],
+               "idle_time":max(capacity - state["busy"], 0.0),
+               "utilization":state["busy"] / capacity if capacity > 0 else 0.0}
+    return {"version":PROFILE_VERSION,
+            "command":sys.argv,
+            "wall_time":time.time() - PROFILE_START[0],
+            "totals":totals,
+            "levels":levels,
+            "files":state["files"],
+            "workers":workers}
+
+def write_profile_report(path=None):
+    """
+    Write the I/O accounting report to a JSON file
+    (by default the value of AMR_KITCHEN_PROFILE)
+    """
+    if path is None:
+        path = profile_report_path()
+    with open(path, 'w') as rfile:
+        json.dump(profile_report(), rfile, indent=2)
+    return path
+
+def write_profile_report_at_exit():
+    # Only the main process writes the report
+    if (profiling_enabled() and
+        multiprocessing.current_process().name == "MainProcess"):
+        print(f"I/O accounting report written to {write_profile_report()}")
+
+def register_profile_report():
+    """
+    Write the report at exit, registered once when the I/O
+    accounting is first used (never when importing the module)
+    """
+    if not REPORT_REGISTERED[0]:
+        atexit.register(write_profile_report_at_exit)
+        REPORT_REGISTERED[0] = True
+
+def enable_profiling(path=None):
+    """
+    Enable the I/O accounting of the current process and of the
+    worker processes it starts, the JSON report is written to path
+    at exit (used by the --profile flag of the command line tools)
+    path: path of the report (defaults to the value of the
+          AMR_KITCHEN_PROFILE environment variable if it is
+          a path, else kitchen_profile.json)
+    """
+    if path is None:
+        path = profile_report_path()
+    os.environ[PROFILE_ENV] = str(path)
+    PROFILE_START[0] = time.time()
+    register_profile_report()
+
+def add_profile_argument(parser):
+    """
+    Add the --profile flag of the command line tools to an
+    argparse parser (enable_profiling is called when it is set)
+    """
+    parser.add_argument(
+            "--profile", action="store_true",
+            help=("Count the binary file operations (opens, seeks, reads and"
+                  " bytes) and the idle time of the workers, the JSON report"
+                  " is written at exit to the path in AMR_KITCHEN_PROFILE"
+                  " or to kitchen_profile.json"))
+
+# Enabled from the environment before the module was imported
+if profiling_enabled():
+    register_profile_report()
@@ -0,0 +1,125 @@
+"""
+Options and helpers of the readers of the box data:
+the least recently used box cache
+"""
+import collections
+
+# Supported modes to access the box data
+IO_MODES = ["file", "mmap"]
+# Parallel readers of the box data (io="file")
+IO_BACKENDS = ["processes", "threads"]
+# Default number of reads in flight with the threads backend
+THREAD_READERS = 64
+# How the box data read by the worker processes is sent back
+TRANSPORTS = ["pickle", "shared_memory"]
+
+class ReaderConfig(object):
+    """
+    Options of the readers of the box data of a PlotfileCooker
+    """
+
+    def __init__(self, io="file", io_backend="processes", transport="pickle",
+                 workers=None, read_gap=65536, cache_bytes=0):
+        """
+        io: how the box data is accessed when indexing the class:
+            "file": each box is read from the binary file (multiprocessing
+                    is used when reading more than one box)
+            "mmap": each binary file is memory mapped once and the box data
+                    is returned as views into the mapping (read-only, without
+                    copy or multiprocessing)
+        io_backend: parallel readers of the box data with io="file":
+            "processes": a multiprocessing pool, the data is pickled back
+                         to the main process
+            "threads": a pool of threads in the main process keeping many
+                       positioned reads in flight (the reads release the
+                       GIL), suited to high latency parallel filesystems
+        transport: how the box data read by the worker processes is sent
+                   back to the main process (io_backend="processes"):
+            "pickle": through the pipes of the multiprocessing pool
+            "shared_memory": the workers write the data in a block of
+                             shared memory reused between reads
+                             (SharedArena) and only its location is
+                             pickled back
+        workers: number of processes in the worker pool used to read the
+                 box data (defaults to the number of CPUs, or to the number
+                 of reads in flight with the threads backend:
+                 THREAD_READERS = 64)
+        read_gap: when reading multiple boxes, the byte ranges separated by
+                  at most read_gap bytes in a binary file are merged into
+                  a single sequential read (None reads each box separately)
+        cache_bytes: size in bytes of a least recently used cache of the box
+                     data read when indexing the class (0 disables it). With
+                     the cache, the returned arrays are read-only as they are
+                     shared between reads
+        """
+        if io not in IO_MODES:
+            raise ValueError((f"Unknown io mode '{io}', available"
+                              f" modes are {IO_MODES}"))
+        if io_backend not in IO_BACKENDS:
+            raise ValueError((f"Unknown io backend '{io_backend}', available"
+                              f" backends are {IO_BACKENDS}"))
+        if transport not in TRANSPORTS:
+            raise ValueError((f"Unknown transport '{transport}', available"
+                              f" transports are {TRANSPORTS}"))
+        self.io = io
+        self.io_backend = io_backend
+        self.transport = transport
+        self.workers = workers
+        self.read_gap = read_gap
+        self.cache_bytes = cache_bytes
+
+    def __repr__(self):
+        return (f"ReaderConfig(io={self.io!r}, io_backend={self.io_backend!r},"
+                f" transport={self.transport!r}, workers={self.workers},"
+                f" read_gap={self.read_gap}, cache_bytes={self.cache_bytes})")
+
+class BoxCache(object):
+    """
+    Least recently used cache of box data with a budget in bytes
+    """
+
+    def __init__(self, budget):
+        """
+        budget: maximum size of the cached data in bytes
+        """
+        self.budget = budget
+        self.nbytes = 0
+        self.data = collections.OrderedDict()
+        self.stats = {"hits":0,
+                      "misses":0,
+                      "evictions":0}
+
+    def get(self, key):
+        """
+        Cached data for key (None if it is not in the cache)
+        """
+        data = self.data.get(key)
+        if data is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+            self.data.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        """
+        Add the data to the cache and evict the least recently
+        used data until the cache fits in the budget
+        """
+        if data.nbytes > self.budget or key in self.data:
+            return
+        # The cached arrays are shared between reads
+        data.flags.writeable = False
+        self.data[key] = data
+        self.nbytes += data.nbytes
+        while self.nbytes > self.budget:
+            _, evicted = self.data.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """
+        Remove all the data from the cache
+        """
+        self.data = collections.OrderedDict()
+        self.nbytes = 0
@@ -4,6 +4,7 @@ import numpy as np
 import argparse
 from .taste import Taster
 from tqdm import tqdm
+from amr_kitchen.profiling import enable_profiling, add_profile_argument
 
 
 def main():
@@ -40,7 +41,11 @@ def main():
             "--verbose", "-v", type=int,
             help="Verbosity level (Defaults to 1)")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
     """
     Input arguments sanity check
     """
@@ -2,11 +2,11 @@ import os
 import sys
 import time
 import traceback
-import multiprocessing
 import pickle
 import numpy as np
 from tqdm import tqdm
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import open_binary, read_array
 from amr_kitchen.utils import TastesBadError
 from amr_kitchen.utils import indexes_and_shape_from_header
 from amr_kitchen.utils import shapes_from_header_vardims
@@ -23,12 +23,12 @@ def mp_read_binary_data(args):
     """
     bfilename = args[0]
     bfile_data = []
-    with open(args, 'rb') as bfile:
+    with open_binary(args) as bfile:
         while True:
             try:
                 h = bfile.readline().decode('ascii')
                 shape = shape_from_header(h)
-                arr = np.fromfile(bfile, 'float64', np.prod(shape))
+                arr = read_array(bfile, 'float64', np.prod(shape))
                 arr = arr.reshape(shape, order='F')
                 bfile_data.append(arr)
             except Exception as e:
@@ -36,7 +36,7 @@ def mp_read_binary_data(args):
     return bfile_data
 
 def mp_fun_headers(args):
-    with open(args['bfile'], 'rb') as bf:
+    with open_binary(args['bfile']) as bf:
         for ofs, idx, bid in zip(args['offsets'],
                                  args['indices'],
                                  args['box_ids']):
@@ -70,7 +70,7 @@ def mp_fun_headers(args):
                 return error
 
 def mp_fun_shape(args):
-    with open(args['bfile'], 'rb') as bf:
+    with open_binary(args['bfile']) as bf:
         # Iterate with the index so we can infer what the
         # next binary header is
         # Read the first header
@@ -189,8 +189,8 @@ class Taster(PlotfileCooker):
         |3 - The boxes' coordinates        |
         |4 - The NaNs                      |
         """
-        # Multiprocessing pool
-        self.pool = multiprocessing.Pool()
+        # Start the worker pool of the PlotfileCooker
+        self.pool()
         # First check that no binary files are missing
         self.taste_plotfile_structure()
         # If flagged check that the boxes bounds match
@@ -229,7 +229,7 @@ class Taster(PlotfileCooker):
                            " binary data assumes that the"
                            " binary headers and the data shape"
                            " are valid"))
-                self.taste_binary_data()
+            self.taste_binary_data()
 
     def taste_plotfile_structure(self):
         """
@@ -324,7 +324,7 @@ class Taster(PlotfileCooker):
                          'lv':lv,
                          'nfields':len(self.fields)}
                 mp_inputs.append(mp_in)
-            for mp_out in tqdm(self.pool.imap(mp_fun_headers, mp_inputs),
+            for mp_out in tqdm(self.pool().imap(mp_fun_headers, mp_inputs),
                                total=len(mp_inputs)):
                 if mp_out is not None:
                     self.raise_error(TastesBadError, mp_out)
@@ -359,7 +359,7 @@ class Taster(PlotfileCooker):
                          'nfields':len(self.fields),
                          'lv':lv}
                 mp_inputs.append(mp_in)
-            for mp_out in self.pool.imap(mp_fun_shape, mp_inputs):
+            for mp_out in self.pool().imap(mp_fun_shape, mp_inputs):
                 if mp_out is not None:
                     self.raise_error(TastesBadError, mp_out)
 
@@ -382,6 +382,9 @@ class Taster(PlotfileCooker):
             lv_boxes_ids = np.arange(len(self.cells[lv]['offsets']))
             # For every binary file
             bfile_data = {}
+            bfile_sizes = []
+            lv_indexes = np.asarray(self.cells[lv]['indexes'])
+            box_sizes = np.prod(lv_indexes[:, 1] - lv_indexes[:, 0] + 1, axis=1)
             for bfile in np.unique(self.cells[lv]['files']):
                 # mask of the boxes in the binary file
                 bf_mask = np.array(self.cells[lv]['files']) == bfile
@@ -399,13 +402,18 @@ class Taster(PlotfileCooker):
                         mins[f] = self.cells[lv]['mins'][f][bf_mask][ofst_sort]
                 # Divide the data between binary file to access with the
                 # multiprocessing output
-                bfile_data['maxs'] = maxs
-                bfile_data['mins'] = mins
-                bfile_data['bids'] = box_ids
+                bfile_data[bfile] = {'maxs':maxs,
+                                     'mins':mins,
+                                     'bids':box_ids}
+                # Size of the data in the binary file
+                bfile_sizes.append(np.sum(box_sizes[bf_mask]) * self.nvars * 8)
             # Iterate over every binary file
+            # (the data is sent back through the pool, or shared
+            # memory with transport="shared_memory")
             for bfile, data_out in zip(bfile_data.keys(),
-                                       pool.imap(mp_read_binary_data,
-                                                 bfile_data.keys())):
+                                       self.pool_outputs(mp_read_binary_data,
+                                                         bfile_data.keys(),
+                                                         bfile_sizes)):
                 # Loop over every box as the data is read
                 # TODO: maybe it would be faster to compute the np.max/np.nanmax
                 # in the multiprocessing function and send back only the max/mins
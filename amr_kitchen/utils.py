@@ -1,3 +1,5 @@
+import warnings
+from itertools import islice
 import numpy as np
 
 class TastesBadError(Exception):
@@ -126,3 +128,89 @@ def global2local(indices, refindices, n_ghost=1):
              indices[1][1] - j_start,
              indices[1][2] - k_start]]
 
+
+def numbers_from_text(text, dtype, count):
+    """
+    Parse a block of whitespace separated numbers in a
+    single pass and validate the amount of numbers read
+    text: string containing the numbers
+    dtype: data type of the numbers
+    count: expected amount of numbers in the text
+    """
+    with warnings.catch_warnings():
+        # Raise instead of returning a truncated array
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            arr = np.fromstring(text, dtype=dtype, sep=' ')
+        except DeprecationWarning:
+            raise ValueError("Non numeric data in a header block")
+    if arr.size != count:
+        raise ValueError((f"Expected {count} values in a header block"
+                          f" but found {arr.size}"))
+    return arr
+
+# Characters removed from the box indices in the level headers
+INDEX_DELIMITERS = str.maketrans('(),', '   ')
+
+def read_box_bounds(hfile, nboxes, ndims):
+    """
+    Read the boxes coordinates of a level in the plotfile
+    header with a single parsing pass
+    hfile: plotfile header file object at the first box line
+    nboxes: number of boxes at the level
+    ndims: number of dimensions of the plotfile
+    returns: (nboxes, ndims, 2) array of the boxes lower and
+             upper bounds in each dimension
+    """
+    block = ''.join(islice(hfile, nboxes * ndims))
+    bounds = numbers_from_text(block, float, nboxes * ndims * 2)
+    return bounds.reshape(nboxes, ndims, 2)
+
+def read_level_header(cfile_path, nfields, ndims, maxmins=False):
+    """
+    Read the box indices, binary files, offsets and optionally
+    the min/max values in a level header (Cell_H) by parsing
+    each block of the file in a single pass
+    cfile_path: path to the level header
+    nfields: number of fields in the plotfile
+    ndims: number of dimensions of the plotfile
+    maxmins: also read the mins and maxs of the fields in each box
+    returns: dict with
+             'indexes': (nboxes, 2, ndims) int32 array of the box indices
+             'files': list of the binary file names (without the level path)
+             'offsets': (nboxes,) array of the box offsets in the binary files
+             'mins', 'maxs': (nboxes, nfields) arrays if maxmins is True
+    """
+    level_data = {}
+    with open(cfile_path) as cfile:
+        # Skip 2 lines
+        cfile.readline()
+        cfile.readline()
+        # Are we good
+        n_fields_valid = cfile.readline()
+        assert int(n_fields_valid) == nfields
+        cfile.readline()
+        n_cells = int(cfile.readline().split()[0].replace('(', ''))
+        # Lines with ((lo) (hi) (type)) for each box
+        block = ''.join(islice(cfile, n_cells)).translate(INDEX_DELIMITERS)
+        indexes = numbers_from_text(block, int, n_cells * 3 * ndims)
+        indexes = indexes.reshape(n_cells, 3, ndims)[:, :2, :]
+        level_data['indexes'] = np.ascontiguousarray(indexes, dtype=np.int32)
+        cfile.readline()
+        assert n_cells == int(cfile.readline())
+        # Lines with FabOnDisk: file offset
+        fab_data = ''.join(islice(cfile, n_cells)).split()
+        if len(fab_data) != 3 * n_cells:
+            raise ValueError((f"Expected {n_cells} binary file entries"
+                              f" in {cfile_path}"))
+        level_data['files'] = fab_data[1::3]
+        level_data['offsets'] = np.array(fab_data[2::3], dtype=np.int64)
+        if maxmins:
+            for key in ['mins', 'maxs']:
+                cfile.readline()
+                cfile.readline()
+                # Lines with comma separated values ending with a comma
+                block = ''.join(islice(cfile, n_cells)).replace(',', ' ')
+                values = numbers_from_text(block, float, n_cells * nfields)
+                level_data[key] = values.reshape(n_cells, nfields)
+    return level_data
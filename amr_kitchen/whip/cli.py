@@ -2,10 +2,13 @@ import os
 import sys
 import argparse
 from tqdm import tqdm
-import multiprocessing
 import numpy as np
 from humanize import naturalsize
 from amr_kitchen import PlotfileCooker
+from amr_kitchen.profiling import (open_binary,
+                                   read_array,
+                                   enable_profiling,
+                                   add_profile_argument)
 from amr_kitchen.utils import (expand_array3d,
                                indices_from_header)
 
@@ -18,15 +21,15 @@ def readfieldfrombinfile(args):
     fname = args['fname']
     indexes = []
     arrays = []
-    with open(fname, 'rb') as bfile:
+    with open_binary(fname) as bfile:
         while True:
             try:
-                h = bfile.readline()
+                h = bfile.readline().decode("ascii")
                 idx = indices_from_header(h)
                 shape = idx[1] - idx[0] + 1
                 tshape = [shape[0], shape[1], shape[2], N_FIELDS]
                 bfile.seek(np.prod(shape)*FIELD_INDEX*8, 1)
-                arr = np.fromfile(bfile, 'float64', np.prod(shape))
+                arr = read_array(bfile, 'float64', np.prod(shape))
                 arrays.append(arr.reshape(shape, order='F'))
                 indexes.append(idx)
                 remainder = np.prod(tshape)*8 - np.prod(shape)*FIELD_INDEX*8 - np.prod(shape)*8
@@ -62,7 +65,11 @@ def main():
             "plotfile", type=str,
             help="Path of the plotfile used to make the uniform grid")
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
     """
     Input arguments sanity check
     """
@@ -106,14 +113,23 @@ def main():
             mp_inputs = [{'N_FIELDS':N_FIELDS,
                           'FIELD_INDEX':FIELD_INDEX,
                           'fname':binfiles[i]} for i in read_order]
-            with multiprocessing.Pool() as pool:
-                prog = tqdm(total=len(binfiles))
-                for res in pool.imap_unordered(readfieldfrombinfile, mp_inputs):
-                    prog.update(1)
-                    for idx, arr in zip(res[0], res[1]):
-                        data[factor * idx[0][0]:(idx[1][0]+1) * factor,
-                             factor * idx[0][1]:(idx[1][1]+1) * factor,
-                             factor * idx[0][2]:(idx[1][2]+1) * factor] = expand_array3d(arr, factor)
+            # Size of the field data in each binary file
+            lv_files = np.asarray(pck.cells[lv]['files'])
+            lv_indexes = np.asarray(pck.cells[lv]['indexes'])
+            box_sizes = np.prod(lv_indexes[:, 1] - lv_indexes[:, 0] + 1, axis=1) * 8
+            file_sizes = [np.sum(box_sizes[lv_files == binfiles[i]]) for i in read_order]
+            # The arrays are sent back through the pool (or shared
+            # memory with transport="shared_memory")
+            prog = tqdm(total=len(binfiles))
+            for res in pck.pool_outputs(readfieldfrombinfile,
+                                        mp_inputs,
+                                        file_sizes,
+                                        ordered=False):
+                prog.update(1)
+                for idx, arr in zip(res[0], res[1]):
+                    data[factor * idx[0][0]:(idx[1][0]+1) * factor,
+                         factor * idx[0][1]:(idx[1][1]+1) * factor,
+                         factor * idx[0][2]:(idx[1][2]+1) * factor] = expand_array3d(arr, factor)
 
         if args.outfile is None:
             np.save(f"{args.variable}_ugrid_{args.plotfile.replace('plt', '')}",
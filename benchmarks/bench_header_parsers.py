@@ -0,0 +1,146 @@
+"""
+Benchmark of the level header (Cell_H) and plotfile header box
+parsers against the previous line by line parsers on a synthetic
+header with 10^5 boxes and 40 fields
+
+python benchmarks/bench_header_parsers.py [nboxes] [nfields]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from amr_kitchen.utils import read_box_bounds, read_level_header
+
+
+def write_synthetic_cell_header(path, nboxes, nfields, box_size=16):
+    """
+    Write a 3D level header with nboxes boxes of box_size^3 cells
+    distributed in 64 binary files
+    """
+    rng = np.random.default_rng(0)
+    nside = int(np.ceil(nboxes ** (1/3)))
+    box_bytes = box_size**3 * nfields * 8 + 64
+    with open(path, 'w') as cfile:
+        cfile.write(f"1\n1\n{nfields}\n0\n({nboxes} 0\n")
+        for b in range(nboxes):
+            i, j, k = b % nside, (b // nside) % nside, b // nside**2
+            lo = np.array([i, j, k]) * box_size
+            hi = lo + box_size - 1
+            cfile.write(f"(({lo[0]},{lo[1]},{lo[2]}) "
+                        f"({hi[0]},{hi[1]},{hi[2]}) (0,0,0))\n")
+        cfile.write(f")\n{nboxes}\n")
+        for b in range(nboxes):
+            cfile.write(f"FabOnDisk: Cell_D_{b % 64:05d} {(b // 64) * box_bytes}\n")
+        for _ in range(2):
+            cfile.write(f"\n{nboxes},{nfields}\n")
+            for b in range(nboxes):
+                values = rng.standard_normal(nfields)
+                cfile.write(','.join([f"{v:.16e}" for v in values]) + ',\n')
+
+def write_synthetic_box_bounds(path, nboxes):
+    """
+    Write the box bounds block of a 3D plotfile header
+    """
+    rng = np.random.default_rng(1)
+    with open(path, 'w') as hfile:
+        for b in range(nboxes):
+            for lo in rng.random(3):
+                hfile.write(f"{lo} {lo + 0.1}\n")
+
+def legacy_read_level_header(cfile_path, nfields, maxmins):
+    """
+    Line by line parser previously used by PlotfileCooker
+    """
+    with open(cfile_path) as cfile:
+        cfile.readline()
+        cfile.readline()
+        assert int(cfile.readline()) == nfields
+        cfile.readline()
+        n_cells = int(cfile.readline().split()[0].replace('(', ''))
+        indexes = []
+        for _ in range(n_cells):
+            start, stop, _ = cfile.readline().split()
+            start = np.array(start.replace('(', '').replace(')', '').split(','), dtype=int)
+            stop = np.array(stop.replace('(', '').replace(')', '').split(','), dtype=int)
+            indexes.append([start, stop])
+        cfile.readline()
+        assert n_cells == int(cfile.readline())
+        files = []
+        offsets = []
+        for _ in range(n_cells):
+            _, file, offset = cfile.readline().split()
+            files.append(file)
+            offsets.append(int(offset))
+        lvmins = []
+        lvmaxs = []
+        if maxmins:
+            cfile.readline()
+            cfile.readline()
+            for _ in range(n_cells):
+                lvmins.append(np.array(cfile.readline().split(',')[:-1], dtype=float))
+            cfile.readline()
+            cfile.readline()
+            for _ in range(n_cells):
+                lvmaxs.append(np.array(cfile.readline().split(',')[:-1], dtype=float))
+    return indexes, files, offsets, lvmins, lvmaxs
+
+def legacy_read_box_bounds(hfile, nboxes, ndims):
+    """
+    Line by line parser previously used by PlotfileCooker
+    """
+    boxes = []
+    for _ in range(nboxes):
+        box = []
+        for _ in range(ndims):
+            lo, hi = [float(n) for n in hfile.readline().split()]
+            box.append([lo, hi])
+        boxes.append(box)
+    return boxes
+
+def timeit(fun, *args, repeat=3):
+    """
+    Best wall time of repeat calls
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    nboxes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    nfields = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfile_path = os.path.join(tmpdir, "Cell_H")
+        hfile_path = os.path.join(tmpdir, "Header_boxes")
+        print(f"Writing synthetic headers with {nboxes} boxes and {nfields} fields")
+        write_synthetic_cell_header(cfile_path, nboxes, nfields)
+        write_synthetic_box_bounds(hfile_path, nboxes)
+
+        # Validate both parsers give the same result
+        legacy = legacy_read_level_header(cfile_path, nfields, True)
+        new = read_level_header(cfile_path, nfields, 3, True)
+        assert np.array_equal(np.array(legacy[0]), new['indexes'])
+        assert legacy[1] == new['files']
+        assert np.array_equal(legacy[2], new['offsets'])
+        assert np.array_equal(legacy[3], new['mins'])
+        assert np.array_equal(legacy[4], new['maxs'])
+
+        for maxmins in [False, True]:
+            t_old = timeit(legacy_read_level_header, cfile_path, nfields, maxmins)
+            t_new = timeit(read_level_header, cfile_path, nfields, 3, maxmins)
+            print(f"Cell_H (maxmins={maxmins}): line by line {t_old:.3f} s,"
+                  f" bulk {t_new:.3f} s ({t_old/t_new:.1f}x)")
+
+        def read_boxes(fun):
+            with open(hfile_path) as hfile:
+                fun(hfile, nboxes, 3)
+        t_old = timeit(read_boxes, legacy_read_box_bounds)
+        t_new = timeit(read_boxes, read_box_bounds)
+        print(f"Header boxes: line by line {t_old:.3f} s,"
+              f" bulk {t_new:.3f} s ({t_old/t_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of the parallel reader backends of PlotfileCooker
+(processes and threads) on a synthetic single level
+plotfile with many small boxes
+
+python benchmarks/bench_io_backends.py [nboxes] [box_size] [nfields]
+
+The box data is read from the page cache after the first read, on
+a parallel filesystem the per box latency is much larger and the
+threads backend keeps more reads in flight
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from amr_kitchen import PlotfileCooker, ReaderConfig
+from amr_kitchen.readers import IO_BACKENDS
+
+
+def write_synthetic_plotfile(pltdir, nboxes, box_size, nfields, nfiles=64):
+    """
+    Write a 3D plotfile with a single level of nboxes boxes
+    of box_size^3 cells distributed in nfiles binary files
+    """
+    rng = np.random.default_rng(0)
+    nside = int(np.ceil(nboxes ** (1/3)))
+    ncells = nside * box_size
+    dx = 1 / ncells
+    os.makedirs(os.path.join(pltdir, "Level_0"))
+    # Box indices
+    indexes = []
+    for b in range(nboxes):
+        lo = np.array([b % nside, (b // nside) % nside, b // nside**2]) * box_size
+        indexes.append([lo, lo + box_size - 1])
+    # Binary files
+    offsets = []
+    bfiles = [open(os.path.join(pltdir, "Level_0", f"Cell_D_{f:05d}"), 'wb')
+              for f in range(nfiles)]
+    for b, (lo, hi) in enumerate(indexes):
+        bf = bfiles[b % nfiles]
+        offsets.append(bf.tell())
+        bf.write((f"FAB ((8, (64 11 52 0 1 12 0 1023)),(8, (8 7 6 5 4 3 2 1)))"
+                  f"(({lo[0]},{lo[1]},{lo[2]}) ({hi[0]},{hi[1]},{hi[2]}) (0,0,0))"
+                  f" {nfields}\n").encode('ascii'))
+        bf.write(rng.standard_normal(box_size**3 * nfields).tobytes())
+    for bf in bfiles:
+        bf.close()
+    # Level header
+    with open(os.path.join(pltdir, "Level_0", "Cell_H"), 'w') as cfile:
+        cfile.write(f"1\n1\n{nfields}\n0\n({nboxes} 0\n")
+        for lo, hi in indexes:
+            cfile.write(f"(({lo[0]},{lo[1]},{lo[2]}) "
+                        f"({hi[0]},{hi[1]},{hi[2]}) (0,0,0))\n")
+        cfile.write(f")\n{nboxes}\n")
+        for b, offset in enumerate(offsets):
+            cfile.write(f"FabOnDisk: Cell_D_{b % nfiles:05d} {offset}\n")
+    # Plotfile header
+    with open(os.path.join(pltdir, "Header"), 'w') as hfile:
+        hfile.write(f"HyperCLaw-V1.1\n{nfields}\n")
+        for f in range(nfields):
+            hfile.write(f"field_{f}\n")
+        hfile.write("3\n0.0\n0\n0 0 0\n1 1 1\n\n")
+        hfile.write(f"((0,0,0) ({ncells - 1},{ncells - 1},{ncells - 1}) (0,0,0))\n")
+        hfile.write(f"0\n{dx} {dx} {dx}\n0\n0\n0 {nboxes} 0.0\n0\n")
+        for lo, hi in indexes:
+            for d in range(3):
+                hfile.write(f"{lo[d] * dx} {(hi[d] + 1) * dx}\n")
+        hfile.write("Level_0/Cell\n")
+
+def timeit(fun, repeat=3):
+    """
+    Best wall time of repeat calls
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    nboxes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    box_size = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    nfields = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pltdir = os.path.join(tmpdir, "plt_bench")
+        print(f"Writing a synthetic plotfile with {nboxes} boxes of"
+              f" {box_size}^3 cells and {nfields} fields")
+        write_synthetic_plotfile(pltdir, nboxes, box_size, nfields)
+        rng = np.random.default_rng(1)
+        subset = np.sort(rng.choice(nboxes, nboxes // 4, replace=False))
+        for backend in IO_BACKENDS:
+            # One positioned read per box (no coalescing)
+            with PlotfileCooker(pltdir, readers=ReaderConfig(io_backend=backend,
+                                                             read_gap=None)) as pck:
+                pck.pool()
+                t_all = timeit(lambda: pck[[0, 3, 5]][0][:])
+                t_subset = timeit(lambda: pck[1][0][subset])
+                t_stream = timeit(lambda: [_ for _ in pck[1][0].stream()])
+            print(f"{backend:>9}: all boxes {t_all:.3f} s, random quarter"
+                  f" {t_subset:.3f} s, ordered stream {t_stream:.3f} s")
+
+if __name__ == "__main__":
+    main()
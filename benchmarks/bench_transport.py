@@ -0,0 +1,38 @@
+"""
+Benchmark of the transports of the box data read by the worker
+processes back to the main process (pickle or shared memory)
+on a synthetic single level plotfile with large boxes
+
+python benchmarks/bench_transport.py [nboxes] [box_size] [nfields]
+"""
+import os
+import sys
+import time
+import tempfile
+from amr_kitchen import PlotfileCooker, ReaderConfig
+from amr_kitchen.readers import TRANSPORTS
+from bench_io_backends import write_synthetic_plotfile, timeit
+
+
+def main():
+    nboxes = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    box_size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    nfields = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pltdir = os.path.join(tmpdir, "plt_bench")
+        print(f"Writing a synthetic plotfile with {nboxes} boxes of"
+              f" {box_size}^3 cells and {nfields} fields")
+        write_synthetic_plotfile(pltdir, nboxes, box_size, nfields, nfiles=16)
+        size = nboxes * box_size**3 * nfields * 8
+        for transport in TRANSPORTS:
+            for read_gap in [None, 65536]:
+                with PlotfileCooker(pltdir, readers=ReaderConfig(transport=transport,
+                                                                 read_gap=read_gap)) as pck:
+                    pck.pool()
+                    t_read = timeit(lambda: pck[:][0][:])
+                label = "box reads" if read_gap is None else "coalesced"
+                print(f"{transport:>13} ({label}): {t_read:.3f} s"
+                      f" ({size / t_read / 1e9:.2f} GB/s)")
+
+if __name__ == "__main__":
+    main()
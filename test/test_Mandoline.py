@@ -3,6 +3,9 @@ import unittest
 import numpy as np
 
 from amr_kitchen.mandoline import Mandoline
+from amr_kitchen.mandoline import blades
+from amr_kitchen.mandoline.utils import coarsen_array
+from amr_kitchen import PlotfileCooker
 
 class TestMandoline(unittest.TestCase):
     pfile2d = "test_assets/example_plt_2d"
@@ -114,3 +117,114 @@ class TestMandoline(unittest.TestCase):
         out_ref = np.load(os.path.join(self.ref_s3d, "Sztempref.npz"))
         self.assertTrue(np.allclose(out_ref["temp"], out["temp"]))
 
+    def test_read_box_planes(self):
+        pck = PlotfileCooker(self.pfile3d)
+        lv, bid, fidx = 2, 3, 5
+        ref = pck[fidx][lv][bid]
+        shape = ref.shape
+        cfile = pck.cells[lv]['files'][bid]
+        offset = pck.cells[lv]['offsets'][bid]
+        # Read the planes with runs or with the whole field block
+        for min_run in [8, 2**20]:
+            with open(cfile, 'rb') as bf:
+                bf.seek(offset)
+                start = offset + len(bf.readline()) + np.prod(shape) * 8 * fidx
+                for cn in range(3):
+                    for first, count in [(0, 1), (3, 2), (shape[cn] - 1, 1)]:
+                        planes = blades.read_box_planes(bf, start, shape, cn,
+                                                        first, count,
+                                                        min_run_bytes=min_run)
+                        self.assertEqual(len(planes), count)
+                        for i, plane in enumerate(planes):
+                            self.assertTrue(np.array_equal(plane,
+                                                           np.take(ref, first + i, axis=cn)))
+
+    def test_skip_covered_boxes(self):
+        m = Mandoline(self.pfile3d, "temp", verbose=0, serial=True)
+        for cn in range(3):
+            for pos in [m.geo_low[cn], 0.013, m.geo_high[cn]]:
+                m.cn, m.cx, m.cy, m.pos = m.define_slicing_coordinates(cn, pos)
+                outputs = []
+                for skip in [False, True]:
+                    plane_data = [[blades.slice_box(inp) for inp in
+                                   m.compute_mpinput_3d(lv, skip_covered=skip)]
+                                  for lv in range(m.limit_level + 1)]
+                    outputs.append(m.reducemp_data_ortho(plane_data))
+                # The finer levels cover the domain inside the domain
+                if m.geo_low[cn] < pos < m.geo_high[cn]:
+                    self.assertEqual(len(m.compute_mpinput_3d(0, skip_covered=True)), 0)
+                for arr, arr_skip in zip(*outputs):
+                    self.assertTrue(np.array_equal(arr, arr_skip))
+
+    def test_slice_many(self):
+        for serial in [True, False]:
+            m = Mandoline(self.pfile3d, ["temp", "grid_level"], verbose=0, serial=serial)
+            out_before = m.slice(normal=1, pos=0.005, fformat="return")
+            coords = (m.cn, m.cx, m.cy, m.pos)
+            slices = [(0, None), (0, 0.0031), (1, 0.009), (2, 0.0), (2, m.geo_high[2])]
+            outputs = m.slice_many(slices, fformat="return")
+            # The slicing coordinates of the previous slice are kept
+            self.assertEqual((m.cn, m.cx, m.cy, m.pos), coords)
+            out_after = m.slice(fformat="return")
+            self.assertEqual(out_after["slice_pos"], out_before["slice_pos"])
+            self.assertTrue(np.array_equal(out_after["temp"], out_before["temp"]))
+            self.assertEqual(len(outputs), len(slices))
+            for (normal, pos), out in zip(slices, outputs):
+                out_ref = m.slice(normal=normal, pos=out["slice_pos"], fformat="return")
+                self.assertEqual(out["slice_normal"], m.coordnames[normal])
+                self.assertTrue(np.array_equal(out_ref["temp"], out["temp"]))
+                self.assertTrue(np.array_equal(out_ref["grid_level"], out["grid_level"]))
+
+    def test_slice_target_level(self):
+        m = Mandoline(self.pfile3d, "temp", verbose=0, serial=True)
+        for target_level in [0, 1]:
+            c = Mandoline(self.pfile3d, "temp", verbose=0, serial=True,
+                          target_level=target_level)
+            factor = 2**(m.limit_level - target_level)
+            # Level 2 covers the domain so the averaged slices are the same
+            for normal, pos in [(0, 0.0031), (1, 0.008), (2, 0.0123)]:
+                out_ref = m.slice(normal=normal, pos=pos, fformat="return")
+                out = c.slice(normal=normal, pos=pos, fformat="return")
+                self.assertEqual(out["temp"].shape[0], out_ref["temp"].shape[0] // factor)
+                self.assertEqual(len(out["x"]), out["temp"].shape[1])
+                self.assertTrue(np.allclose(coarsen_array(out_ref["temp"], factor),
+                                            out["temp"]))
+        # Coarsest level with the requested resolution
+        self.assertEqual(Mandoline(self.pfile3d, verbose=0, resolution=10).target_level, 1)
+        self.assertEqual(Mandoline(self.pfile3d, verbose=0, resolution=1000).target_level, 2)
+        # The plotfile output keeps the AMR levels
+        with self.assertRaises(ValueError):
+            c.slice(normal=0, fformat="plotfile")
+
+    def test_target_level_partial_blocks(self):
+        m = Mandoline(self.pfile3d, "temp", verbose=0, serial=True, target_level=0)
+        # Level 2 data averaged down by blocks of 4x4 cells
+        fine = np.arange(64.0).reshape(8, 8) ** 2
+        # Boxes splitting the blocks (not aligned with the target grid)
+        boxes = [np.array([[0, 0, 0], [2, 7, 0]]),
+                 np.array([[3, 0, 0], [5, 4, 0]]),
+                 np.array([[3, 5, 0], [5, 7, 0]]),
+                 np.array([[6, 0, 0], [7, 7, 0]])]
+        for order in [[0, 1, 2, 3], [3, 2, 1, 0]]:
+            out_data = [np.full((2, 2), np.nan)]
+            counts = np.zeros((2, 2), dtype=int)
+            for bid in order:
+                lo, hi = boxes[bid]
+                sx, sy, resample, box_counts = blades.output_window(boxes[bid], 0, 1, 2, 0)
+                out = {'sx':sx, 'sy':sy, 'counts':box_counts,
+                       'data':[resample(fine[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1])]}
+                m.write_window(out_data, out, counts)
+            self.assertTrue(np.allclose(out_data[0], coarsen_array(fine, 4)))
+            self.assertTrue(np.array_equal(counts, np.full((2, 2), 16)))
+
+    def test_streaming_reduction(self):
+        m = Mandoline(self.pfile3d, ["temp", "grid_level"], verbose=0, serial=True)
+        out_ref = m.slice(normal=1, pos=0.0031, fformat="return")
+        # The boxes of a level are written as they arrive (in any order)
+        planes = m.new_slice_planes()
+        for lv in range(m.limit_level + 1):
+            for inp in reversed(m.compute_mpinput_3d(lv, skip_covered=True)):
+                m.add_slice_output(planes, blades.slice_box(inp), lv)
+        out = m.format_array_output(m.interpolate_slice_planes(planes))
+        self.assertTrue(np.array_equal(out_ref["temp"], out["temp"]))
+        self.assertTrue(np.array_equal(out_ref["grid_level"], out["grid_level"]))
@@ -1,8 +1,14 @@
 import os
+import json
+import shutil
 import unittest
 import numpy as np
 
-from amr_kitchen import PlotfileCooker
+from amr_kitchen import PlotfileCooker, ReaderConfig
+from amr_kitchen.plotfile_cooker import plan_coalesced_reads, field_runs
+from amr_kitchen import arena
+from amr_kitchen.profiling import (PROFILE_ENV, profile_report,
+                                   write_profile_report)
 
 class TestSliceData(unittest.TestCase):
     pfile2d = "test_assets/example_plt_2d"
@@ -44,7 +50,7 @@ class TestSliceData(unittest.TestCase):
                         shape.append(len(hdr.fields))
                         bf.seek(ofs)
                         arr = np.fromfile(bf, 'float64', np.prod(shape))
-                        
+
     def test_bybinfile_iterator3d(self):
         hdr = PlotfileCooker(self.pfile3d)
         for lv in range(hdr.limit_level + 1):
@@ -55,4 +61,630 @@ class TestSliceData(unittest.TestCase):
                         shape.append(len(hdr.fields))
                         bf.seek(ofs)
                         arr = np.fromfile(bf, 'float64', np.prod(shape))
-                    
+
+class TestIndexCache(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_index_cache(self):
+        tmp_plt = os.path.join("test", "pck_cache_tmp")
+        shutil.copytree(self.pfile3d, tmp_plt)
+        try:
+            ref = PlotfileCooker(tmp_plt, maxmins=True)
+            # First call writes the cache
+            hdr = PlotfileCooker(tmp_plt, maxmins=True, index_cache=True)
+            self.assertTrue(os.path.exists(hdr.index_cache_path()))
+            # Second call loads it
+            hdr = PlotfileCooker(tmp_plt, maxmins=True, index_cache=True)
+            self.assertTrue(hdr.read_index_cache(maxmins=True))
+            self.assertTrue(hdr == ref)
+            for lv in range(ref.limit_level + 1):
+                self.assertEqual(hdr.cells[lv]['files'], ref.cells[lv]['files'])
+                self.assertTrue(np.array_equal(hdr.cells[lv]['offsets'],
+                                               ref.cells[lv]['offsets']))
+                for f in ref.fields:
+                    self.assertTrue(np.array_equal(hdr.cells[lv]['maxs'][f],
+                                                   ref.cells[lv]['maxs'][f]))
+            # A modified level header invalidates the cache
+            cell_h = os.path.join(tmp_plt, "Level_1", "Cell_H")
+            stat = os.stat(cell_h)
+            os.utime(cell_h, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertFalse(hdr.read_index_cache(maxmins=True))
+            # And is rebuilt on the next call
+            hdr = PlotfileCooker(tmp_plt, maxmins=True, index_cache=True)
+            self.assertTrue(hdr.read_index_cache(maxmins=True))
+            # Lower limit levels use the same cache
+            hdr = PlotfileCooker(tmp_plt, limit_level=1, index_cache=True)
+            self.assertEqual(len(hdr.cells), 2)
+            self.assertTrue(hdr == PlotfileCooker(tmp_plt, limit_level=1))
+        finally:
+            shutil.rmtree(tmp_plt)
+
+    def test_lazy_cells(self):
+        ref = PlotfileCooker(self.pfile3d, maxmins=True)
+        hdr = PlotfileCooker(self.pfile3d, maxmins=True, lazy=True)
+        self.assertEqual(len(hdr.cells), ref.limit_level + 1)
+        # Nothing is parsed in the constructor
+        for lv in range(len(hdr.cells)):
+            self.assertFalse(hdr.cells.is_loaded(lv))
+        # Only the accessed level is parsed
+        finest = hdr.cells[-1]
+        self.assertTrue(hdr.cells.is_loaded(hdr.limit_level))
+        self.assertFalse(hdr.cells.is_loaded(0))
+        self.assertTrue(np.array_equal(finest['indexes'],
+                                       ref.cells[-1]['indexes']))
+        self.assertEqual(finest['files'], ref.cells[-1]['files'])
+        # Comparison parses the remaining levels
+        self.assertTrue(hdr == ref)
+        # Background parsing
+        hdr = PlotfileCooker(self.pfile3d, maxmins=True,
+                             lazy=True, background=True)
+        hdr.cells.thread.join()
+        for lv in range(len(hdr.cells)):
+            self.assertTrue(hdr.cells.is_loaded(lv))
+            for f in ref.fields:
+                self.assertTrue(np.array_equal(hdr.cells[lv]['mins'][f],
+                                               ref.cells[lv]['mins'][f]))
+
+    def test_columnar_cells(self):
+        hdr = PlotfileCooker(self.pfile3d)
+        for lv in range(hdr.limit_level + 1):
+            nboxes = len(hdr.boxes[lv])
+            self.assertEqual(hdr.cells[lv]['indexes'].shape, (nboxes, 2, hdr.ndims))
+            self.assertEqual(hdr.cells[lv]['indexes'].dtype, np.int32)
+            self.assertEqual(hdr.cells[lv]['offsets'].dtype, np.int64)
+            self.assertEqual(hdr.boxes[lv].shape, (nboxes, hdr.ndims, 2))
+            self.assertEqual(hdr.box_centers[lv].shape, (nboxes, hdr.ndims))
+            # The binary files behave like a list of paths
+            files = hdr.cells[lv]['files']
+            self.assertEqual(len(files), nboxes)
+            self.assertEqual(len(files.table), len(np.unique(files)))
+            paths = list(files)
+            self.assertEqual(files[-1], paths[-1])
+            self.assertTrue(os.path.exists(files[0]))
+            self.assertTrue(np.array_equal(np.array(files), paths))
+            mask = np.arange(nboxes) % 2 == 0
+            self.assertEqual(list(files[mask]), paths[::2])
+
+    def test_kitchen_index(self):
+        index_path = os.path.join("test", "plt_3d.kidx")
+        for pfile in [self.pfile2d, self.pfile3d]:
+            ref = PlotfileCooker(pfile, maxmins=True)
+            ref.adjacency = ref.compute_adjacency()
+            self.assertEqual(ref.write_index(index_path), index_path)
+            try:
+                hdr = PlotfileCooker.from_index(index_path,
+                                                readers=ReaderConfig(read_gap=None))
+                # Levels are materialized when accessed
+                self.assertFalse(hdr.cells.is_loaded(0))
+                self.assertEqual(hdr.fields, ref.fields)
+                self.assertEqual(hdr.time, ref.time)
+                self.assertEqual(hdr.step, ref.step)
+                self.assertTrue(hdr == ref)
+                for lv in range(ref.limit_level + 1):
+                    self.assertTrue(np.array_equal(hdr.boxes[lv], ref.boxes[lv]))
+                    self.assertTrue(np.array_equal(hdr.box_centers[lv], ref.box_centers[lv]))
+                    self.assertEqual(list(hdr.cells[lv]['files']),
+                                     [os.path.abspath(f) for f in ref.cells[lv]['files']])
+                    self.assertTrue(np.array_equal(hdr.cells[lv]['offsets'],
+                                                   ref.cells[lv]['offsets']))
+                    self.assertTrue(np.array_equal(hdr.cells[lv]['maxs']['temp'],
+                                                   ref.cells[lv]['maxs']['temp']))
+                    self.assertTrue(np.array_equal(hdr.adjacency[lv]['neighbours'],
+                                                   ref.adjacency[lv]['neighbours']))
+                # The box data is read from the plotfile
+                lv = ref.limit_level
+                for data, ref_data in zip(hdr['temp'][lv][:], ref['temp'][lv][:]):
+                    self.assertTrue(np.array_equal(data, ref_data))
+                hdr.close()
+                # The plotfile can be moved
+                hdr = PlotfileCooker.from_index(index_path, plotfile=pfile)
+                self.assertTrue(np.array_equal(hdr['temp'][0][0], ref['temp'][0][0]))
+            finally:
+                os.remove(index_path)
+        with self.assertRaises(ValueError):
+            PlotfileCooker.from_index(os.path.join(self.pfile3d, "Header"))
+
+class TestReaders(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_mmap_io(self):
+        for pfile in [self.pfile2d, self.pfile3d]:
+            ref = PlotfileCooker(pfile)
+            hdr = PlotfileCooker(pfile, readers=ReaderConfig(io="mmap"))
+            for farg in [0, slice(1, 4), [0, 2, 3]]:
+                for lv in range(hdr.limit_level + 1):
+                    # Single box views
+                    box = hdr[farg][lv][-1]
+                    # Views into the read-only mapping
+                    if not isinstance(farg, list):
+                        self.assertFalse(box.flags.writeable)
+                    self.assertTrue(np.array_equal(box, ref[farg][lv][-1]))
+                    # All boxes in order
+                    for box, ref_box in zip(hdr[farg][lv], ref[farg][lv][:]):
+                        self.assertTrue(np.array_equal(box, ref_box))
+                    # Boolean mask
+                    mask = np.arange(len(hdr.boxes[lv])) % 2 == 0
+                    for box, ref_box in zip(hdr[farg][lv][mask],
+                                            ref[farg][lv][mask]):
+                        self.assertTrue(np.array_equal(box, ref_box))
+                    # Numpy integer indices read a single box
+                    self.assertTrue(np.array_equal(hdr[farg][lv].iter(np.int64(0)),
+                                                   ref[farg][lv][0]))
+        with self.assertRaises(ValueError):
+            ReaderConfig(io="bad")
+
+    def test_reader_options(self):
+        # The ReaderConfig options can be passed as keyword arguments
+        hdr = PlotfileCooker(self.pfile2d, io="mmap", read_gap=None)
+        self.assertEqual(hdr.io, "mmap")
+        self.assertIsNone(hdr.read_gap)
+        ref = PlotfileCooker(self.pfile2d)
+        self.assertTrue(np.array_equal(hdr[0][1][0], ref[0][1][0]))
+        with self.assertRaises(ValueError):
+            PlotfileCooker(self.pfile2d, io="bad")
+        with self.assertRaises(ValueError):
+            PlotfileCooker(self.pfile2d, readers=ReaderConfig(), io="mmap")
+
+    def test_worker_pool(self):
+        with PlotfileCooker(self.pfile3d, readers=ReaderConfig(workers=2)) as hdr:
+            for lv in range(hdr.limit_level + 1):
+                data = hdr[0][lv][:]
+                data = hdr[[0, 2]][lv][np.arange(len(hdr.boxes[lv]))]
+                for box in hdr[0][lv].iter(slice(None)):
+                    pass
+                for box in hdr[0][lv]:
+                    pass
+            # A single pool is reused by every read
+            self.assertEqual(hdr.pool_stats['pools'], 1)
+            self.assertEqual(hdr.pool_stats['reads'], 4 * (hdr.limit_level + 1))
+            self.assertIn("Worker pool", hdr.pool_report())
+        self.assertIsNone(hdr._pool)
+        # Reading after close creates a new pool
+        _ = hdr[0][0][:]
+        self.assertEqual(hdr.pool_stats['pools'], 2)
+        hdr.close()
+
+    def test_coalesced_reads(self):
+        # Contiguous ranges are merged, distant ones are not
+        bfiles = np.array(["a", "a", "b", "a"])
+        starts = np.array([100, 0, 0, 1000])
+        stops = np.array([200, 100, 50, 1100])
+        reads = plan_coalesced_reads(bfiles, starts, stops, gap=0)
+        self.assertEqual([r[1:3] for r in reads], [(0, 200), (1000, 1100), (0, 50)])
+        self.assertEqual(reads[0][3], [1, 0])
+        reads = plan_coalesced_reads(bfiles, starts, stops, gap=1000)
+        self.assertEqual(len(reads), 2)
+        reads = plan_coalesced_reads(bfiles, starts, stops, gap=1000, max_size=500)
+        self.assertEqual(len(reads), 3)
+        # Same data as reading each box
+        for pfile in [self.pfile2d, self.pfile3d]:
+            with PlotfileCooker(pfile) as hdr, PlotfileCooker(pfile, readers=ReaderConfig(read_gap=None)) as ref:
+                for lv in range(hdr.limit_level + 1):
+                    mask = np.arange(len(hdr.boxes[lv])) % 3 == 0
+                    for farg in [1, slice(0, 4, 2), [0, 3, 5]]:
+                        for idx in [slice(None), mask]:
+                            for box, ref_box in zip(hdr[farg][lv][idx],
+                                                    ref[farg][lv][idx]):
+                                self.assertTrue(np.array_equal(box, ref_box))
+
+    def test_box_header_sizes(self):
+        # Padding between two boxes of a binary file
+        tmp_plt = os.path.join("test", "pck_padding_tmp")
+        shutil.copytree(self.pfile3d, tmp_plt)
+        try:
+            cell_h = os.path.join(tmp_plt, "Level_1", "Cell_H")
+            with open(cell_h) as hfile:
+                lines = hfile.readlines()
+            line = lines.index("FabOnDisk: Cell_D_00001 155735\n")
+            lines[line] = "FabOnDisk: Cell_D_00001 155759\n"
+            with open(cell_h, "w") as hfile:
+                hfile.writelines(lines)
+            cell_d = os.path.join(tmp_plt, "Level_1", "Cell_D_00001")
+            with open(cell_d, "rb") as bfile:
+                data = bfile.read()
+            with open(cell_d, "wb") as bfile:
+                bfile.write(data[:155735] + b"x" * 24 + data[155735:])
+            with PlotfileCooker(tmp_plt) as hdr, PlotfileCooker(self.pfile3d) as ref:
+                for lv in range(hdr.limit_level + 1):
+                    self.assertTrue(np.array_equal(hdr.box_header_sizes(lv),
+                                                   ref.box_header_sizes(lv)))
+                for box, ref_box in zip(hdr[[0, 3]][1][:], ref[[0, 3]][1][:]):
+                    self.assertTrue(np.array_equal(box, ref_box))
+        finally:
+            shutil.rmtree(tmp_plt)
+
+    def test_sparse_fields(self):
+        self.assertEqual(field_runs([2, 3, 4, 9, 1]),
+                         [(0, 2, 3), (3, 9, 1), (4, 1, 1)])
+        fields = [5, 0, 1, 9]
+        for read_gap in [0, None]:
+            with PlotfileCooker(self.pfile3d, readers=ReaderConfig(read_gap=read_gap)) as hdr:
+                for lv in range(hdr.limit_level + 1):
+                    all_data = hdr[:][lv][:]
+                    # Single boxes
+                    for bid in [0, -1]:
+                        self.assertTrue(np.array_equal(hdr[fields][lv][bid],
+                                                       all_data[bid][..., fields]))
+                    # Multiple boxes
+                    for box, ref_box in zip(hdr[fields][lv][:], all_data):
+                        self.assertTrue(np.array_equal(box, ref_box[..., fields]))
+                    # Streaming over the binary files
+                    sums = sorted([np.sum(box) for box in hdr[fields][lv]])
+                    ref_sums = sorted([np.sum(box[..., fields]) for box in all_data])
+                    self.assertTrue(np.allclose(sums, ref_sums))
+
+    def test_stream(self):
+        for io in ["file", "mmap"]:
+            with PlotfileCooker(self.pfile2d, readers=ReaderConfig(io=io)) as hdr:
+                for lv in range(hdr.limit_level + 1):
+                    ref = hdr[[0, 3]][lv][:]
+                    # Header order
+                    boxes = list(hdr[[0, 3]][lv].stream(prefetch=2, run_size=3))
+                    self.assertEqual(len(boxes), len(ref))
+                    for box, ref_box in zip(boxes, ref):
+                        self.assertTrue(np.array_equal(box, ref_box))
+                    # Read order
+                    sums = [np.sum(box) for box in hdr[[0, 3]][lv].stream(ordered=False)]
+                    self.assertTrue(np.allclose(sorted(sums),
+                                                sorted([np.sum(box) for box in ref])))
+                    # Subset of the boxes
+                    mask = np.arange(len(ref)) % 2 == 1
+                    boxes = list(hdr[[0, 3]][lv].stream(idx=mask))
+                    for box, ref_box in zip(boxes, np.array(ref, dtype=object)[mask]):
+                        self.assertTrue(np.array_equal(box, ref_box))
+
+    def test_box_cache(self):
+        ref = PlotfileCooker(self.pfile3d)
+        with PlotfileCooker(self.pfile3d, readers=ReaderConfig(cache_bytes=2**24)) as hdr:
+            lv = hdr.limit_level
+            mask = np.arange(len(hdr.boxes[lv])) % 2 == 0
+            # Half the boxes are read
+            for box, ref_box in zip(hdr[[1, 4]][lv][mask],
+                                    np.array(ref[[1, 4]][lv][:], dtype=object)[mask]):
+                self.assertTrue(np.array_equal(box, ref_box))
+            self.assertEqual(hdr.box_cache.stats["misses"], np.sum(mask))
+            # The other half is read from disk
+            for box, ref_box in zip(hdr[[1, 4]][lv][:], ref[[1, 4]][lv][:]):
+                self.assertTrue(np.array_equal(box, ref_box))
+                self.assertFalse(box.flags.writeable)
+            self.assertEqual(hdr.box_cache.stats["hits"], np.sum(mask))
+            self.assertEqual(hdr.box_cache.stats["misses"], len(mask))
+            # Single boxes
+            self.assertTrue(np.array_equal(hdr[[1, 4]][lv][0], ref[[1, 4]][lv][0]))
+            self.assertEqual(hdr.box_cache.stats["hits"], np.sum(mask) + 1)
+        # Least recently used boxes are evicted
+        box_bytes = ref[0][lv][0].nbytes
+        with PlotfileCooker(self.pfile3d, readers=ReaderConfig(cache_bytes=3 * box_bytes)) as hdr:
+            _ = hdr[0][lv][:4]
+            self.assertEqual(hdr.box_cache.stats["evictions"], 1)
+            self.assertLessEqual(hdr.box_cache.nbytes, 3 * box_bytes)
+            _ = hdr[0][lv][0]
+            self.assertEqual(hdr.box_cache.stats["hits"], 0)
+        ref.close()
+
+    def test_io_backends(self):
+        ref = PlotfileCooker(self.pfile2d)
+        ref_data = ref[['temp', 'Y(O)']][1][:]
+        readers = ReaderConfig(io_backend="threads", read_gap=None)
+        with PlotfileCooker(self.pfile2d, readers=readers) as hdr:
+            for data, ref_box in zip(hdr[['temp', 'Y(O)']][1][:], ref_data):
+                self.assertTrue(np.array_equal(data, ref_box))
+            for data, ref_box in zip(hdr['temp'][1].stream(prefetch=4), ref_data):
+                self.assertTrue(np.array_equal(data, ref_box[..., 0]))
+            sums = [np.sum(box) for box in hdr['temp'][1].stream(ordered=False,
+                                                                 prefetch=2,
+                                                                 run_size=2)]
+            self.assertTrue(np.allclose(sorted(sums),
+                                        sorted([np.sum(box[..., 0]) for box in ref_data])))
+            self.assertEqual(len(list(hdr['temp'][1])), len(ref_data))
+            self.assertEqual(len(list(hdr['temp'][1].iter([2, 4]))), 2)
+        # Coalesced reads return a writable array for each box
+        with PlotfileCooker(self.pfile3d) as ref:
+            ref_data = ref[[0, 3, 4]][2][:]
+            for backend in ["processes", "threads"]:
+                with PlotfileCooker(self.pfile3d,
+                                    readers=ReaderConfig(io_backend=backend)) as hdr:
+                    for data, ref_box in zip(hdr[[0, 3, 4]][2][:], ref_data):
+                        self.assertTrue(data.flags.writeable)
+                        self.assertTrue(data.flags.owndata)
+                        self.assertTrue(np.array_equal(data, ref_box))
+                    for data, ref_box in zip(hdr[0][2][[3, 1, 3]],
+                                             [ref_data[i][..., 0] for i in [3, 1, 3]]):
+                        self.assertTrue(data.flags.writeable)
+                        self.assertTrue(np.array_equal(data, ref_box))
+        with self.assertRaises(ValueError):
+            ReaderConfig(io_backend="mpi")
+
+    def test_shared_memory(self):
+        ref = PlotfileCooker(self.pfile2d)
+        ref_data = ref[['temp', 'Y(O)']][1][:]
+        for read_gap in [None, 65536]:
+            with PlotfileCooker(self.pfile2d,
+                                readers=ReaderConfig(transport="shared_memory",
+                                                     read_gap=read_gap)) as hdr:
+                data = hdr[['temp', 'Y(O)']][1][:]
+                for box_data, ref_box in zip(data, ref_data):
+                    self.assertTrue(np.array_equal(box_data, ref_box))
+                    self.assertTrue(box_data.flags['F_CONTIGUOUS'])
+                # The arena is reused by the next reads
+                name = hdr.arena().shm.name
+                data = hdr['temp'][1][[4, 2]]
+                self.assertTrue(np.array_equal(data[1], ref_data[2][..., 0]))
+                self.assertEqual(hdr.arena().shm.name, name)
+            self.assertIsNone(hdr._arena)
+        readers = ReaderConfig(transport="shared_memory", read_gap=None)
+        with PlotfileCooker(self.pfile2d, readers=readers) as hdr:
+            # The arena is sized from the data read
+            hdr[['temp', 'Y(O)']][1][[0]]
+            self.assertEqual(hdr.arena().shm.size, ref_data[0].nbytes)
+            # The outputs are pickled without enough shared memory
+            hdr.arena().close()
+            available = arena.shm_available
+            arena.shm_available = lambda: 0
+            try:
+                for box_data, ref_box in zip(hdr[['temp', 'Y(O)']][1][:], ref_data):
+                    self.assertTrue(np.array_equal(box_data, ref_box))
+                self.assertIsNone(hdr.arena().shm)
+            finally:
+                arena.shm_available = available
+            # A single map uses the arena at once
+            items = [np.arange(4.0)] * 3
+            outputs = hdr.arena().map(hdr.pool(), np.negative, items, [32] * 3)
+            self.assertTrue(np.array_equal(next(outputs), -items[0]))
+            with self.assertRaises(RuntimeError):
+                next(hdr.arena().map(hdr.pool(), np.negative, items, [32] * 3))
+            outputs.close()
+            self.assertEqual(len(list(hdr.arena().map(hdr.pool(), np.negative,
+                                                      items, [32] * 3))), 3)
+            # The tools map their workers through the arena
+            outputs = list(hdr.pool_outputs(np.negative, items, [32] * 3))
+            self.assertTrue(np.array_equal(outputs[2], -items[2]))
+        # The arena is only used with transport="shared_memory"
+        with PlotfileCooker(self.pfile2d) as hdr:
+            outputs = list(hdr.pool_outputs(np.negative, items, [32] * 3,
+                                            ordered=False))
+            self.assertEqual(len(outputs), 3)
+            self.assertIsNone(hdr._arena)
+        with self.assertRaises(ValueError):
+            ReaderConfig(transport="mpi")
+
+class TestBoxIndex(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_box_index(self):
+        rng = np.random.default_rng(0)
+        for pfile in [self.pfile2d, self.pfile3d]:
+            hdr = PlotfileCooker(pfile)
+            box_index = hdr.box_index()
+            geo_low, geo_high = np.array(hdr.geo_low), np.array(hdr.geo_high)
+            for lv in range(hdr.limit_level + 1):
+                boxes = np.array(hdr.boxes[lv])
+                dx = np.array(hdr.dx[lv])
+                for _ in range(50):
+                    point = geo_low + (geo_high - geo_low) * rng.random(hdr.ndims)
+                    # Same boxes as testing every box
+                    for margin in [0.0, -dx/2, dx/2]:
+                        inside = (np.all(boxes[:, :, 0] - margin <= point, axis=1) &
+                                  np.all(point <= boxes[:, :, 1] + margin, axis=1))
+                        self.assertTrue(np.array_equal(box_index.point_boxes(lv, point, margin),
+                                                       np.nonzero(inside)[0]))
+                    high = point + (geo_high - geo_low) * rng.random(hdr.ndims) / 4
+                    intersect = (np.all(boxes[:, :, 0] <= high, axis=1) &
+                                 np.all(point <= boxes[:, :, 1], axis=1))
+                    self.assertTrue(np.array_equal(box_index.region_boxes(lv, point, high),
+                                                   np.nonzero(intersect)[0]))
+                # Corners shared by several boxes give the lowest box index
+                corners = boxes[:, :, 0]
+                located = box_index.locate_points(lv, corners)
+                for point, bid in zip(corners, located):
+                    self.assertEqual(bid, np.min(box_index.point_boxes(lv, point)))
+
+    def test_probe(self):
+        rng = np.random.default_rng(0)
+        for pfile in [self.pfile2d, self.pfile3d]:
+            with PlotfileCooker(pfile) as hdr:
+                box_index = hdr.box_index()
+                points, values = [], []
+                # Cell centers of the finest level containing them
+                for lv in range(hdr.limit_level + 1):
+                    lv_data = hdr[[1, 4]][lv][:]
+                    for bid in rng.integers(len(hdr.boxes[lv]), size=5):
+                        lo, hi = hdr.cells[lv]['indexes'][bid]
+                        idx = np.array([rng.integers(l, h + 1) for l, h in zip(lo, hi)])
+                        point = np.array(hdr.geo_low) + (idx + 0.5) * np.array(hdr.dx[lv])
+                        if (lv < hdr.limit_level and
+                            box_index.locate_points(lv + 1, [point])[0] >= 0):
+                            continue
+                        points.append(point)
+                        values.append(lv_data[bid][tuple(idx - lo)])
+                probed = hdr.probe(np.array(points), [1, 4])
+                self.assertEqual(probed.shape, (len(points), 2))
+                self.assertTrue(np.allclose(probed, values))
+                # Single field and points outside the domain
+                outside = np.array(hdr.geo_high) + 1.0
+                probed = hdr.probe(np.vstack([points, outside]), 1)
+                self.assertTrue(np.allclose(probed[:-1], np.array(values)[:, 0]))
+                self.assertTrue(np.isnan(probed[-1]))
+        # Interpolation order between the cell centers of a box
+        with PlotfileCooker(self.pfile3d) as hdr:
+            lv = hdr.limit_level
+            lo = hdr.cells[lv]['indexes'][0][0]
+            box = hdr['temp'][lv][0]
+            local = np.array([3.25, 4.5, 3.75])
+            point = np.array(hdr.geo_low) + (lo + local + 0.5) * np.array(hdr.dx[lv])
+            # Trilinear interpolation of the 8 neighbouring cells
+            linear = 0.0
+            for corner in np.ndindex(2, 2, 2):
+                weights = np.where(corner, local % 1, 1 - local % 1)
+                linear += np.prod(weights) * box[tuple(np.floor(local).astype(int) + corner)]
+            self.assertTrue(np.isclose(hdr.probe([point], 'temp', order=1)[0], linear))
+            # Cubic splines by default as when calling the selector
+            cubic = hdr.probe([point], 'temp')[0]
+            self.assertEqual(cubic, hdr.probe([point], 'temp', order=3)[0])
+            self.assertTrue(np.isclose(cubic, hdr['temp'](*point)[0]))
+            self.assertNotEqual(cubic, linear)
+        # Same point mapping when the domain does not start at the origin
+        with PlotfileCooker("test_assets/plt_eb_3d") as hdr:
+            self.assertNotEqual(hdr.geo_low[0], 0.0)
+            lv = hdr.limit_level
+            lo = hdr.cells[lv]['indexes'][0][0]
+            # Cell in the fluid (the cell 32 cells lower in x is covered)
+            idx = np.array([55, 30, 16])
+            point = np.array(hdr.geo_low) + (idx + 0.5) * np.array(hdr.dx[lv])
+            value = hdr['density'][lv][0][tuple(idx - lo)]
+            self.assertTrue(np.isclose(hdr['density'](*point)[0], value))
+            self.assertTrue(np.isclose(hdr.probe([point], 'density')[0], value))
+
+class TestBoxAdjacency(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_valid_mask(self):
+        hdr = PlotfileCooker(self.pfile2d)
+        for lv in range(hdr.limit_level + 1):
+            for bid in range(len(hdr.boxes[lv])):
+                mask = hdr.valid_mask(lv, bid)
+                indexes = hdr.cells[lv]['indexes'][bid]
+                self.assertEqual(mask.shape, tuple(indexes[1] - indexes[0] + 1))
+                # Compare with the coarse cells centers in the finer boxes
+                if lv < hdr.limit_level:
+                    x = hdr.grids[lv][0][indexes[0][0]:indexes[1][0] + 1]
+                    y = hdr.grids[lv][1][indexes[0][1]:indexes[1][1] + 1]
+                    x, y = np.meshgrid(x, y, indexing='ij')
+                    covered = np.zeros(mask.shape, dtype=bool)
+                    for box in hdr.boxes[lv + 1]:
+                        covered |= ((box[0][0] < x) & (x < box[0][1]) &
+                                    (box[1][0] < y) & (y < box[1][1]))
+                    self.assertTrue(np.array_equal(mask, ~covered))
+                else:
+                    self.assertTrue(np.all(mask))
+        # The masks can be saved and loaded
+        mask_path = os.path.join('test', 'kitchen_masks.npz')
+        hdr.write_mask_cache(mask_path)
+        other = PlotfileCooker(self.pfile2d)
+        self.assertTrue(other.read_mask_cache(mask_path))
+        for bid in range(len(hdr.boxes[0])):
+            self.assertTrue(np.array_equal(other.valid_mask(0, bid),
+                                           hdr.valid_mask(0, bid)))
+        # Not for a different limit level
+        other = PlotfileCooker(self.pfile2d, limit_level=0)
+        self.assertFalse(other.read_mask_cache(mask_path))
+        os.remove(mask_path)
+
+    def test_ghost_map(self):
+        for pfile in [self.pfile2d, self.pfile3d]:
+            hdr = PlotfileCooker(pfile)
+            for lv in range(hdr.limit_level + 1):
+                indexes = hdr.cells[lv]['indexes']
+                for bid in range(len(indexes)):
+                    # Brute force adjacency
+                    lo, hi = indexes[bid]
+                    adjacent = (np.all(indexes[:, 0] <= hi + 1, axis=1) &
+                                np.all(lo - 1 <= indexes[:, 1], axis=1))
+                    adjacent[bid] = False
+                    self.assertTrue(np.array_equal(hdr.box_neighbours(lv, bid),
+                                                   np.nonzero(adjacent)[0]))
+                    # Face neighbours are adjacent boxes
+                    for dim, (low, high) in enumerate(hdr.face_neighbours(lv, bid)):
+                        for nid in low:
+                            self.assertEqual(indexes[nid][1][dim], lo[dim] - 1)
+                        for nid in high:
+                            self.assertEqual(indexes[nid][0][dim], hi[dim] + 1)
+        # The first box of the 3D plotfile has neighbours on its high faces
+        faces = hdr.face_neighbours(2, 0)
+        self.assertEqual([len(f[0]) for f in faces], [0, 0, 0])
+        self.assertTrue(all([len(f[1]) > 0 for f in faces]))
+        # ghost=True stores the box arrays and the face neighbours
+        hdr = PlotfileCooker(self.pfile3d, ghost=True)
+        for lv in range(hdr.limit_level + 1):
+            self.assertEqual(len(hdr.barr_indices[lv]), len(hdr.boxes[lv]))
+            self.assertEqual(len(np.unique(hdr.box_arrays[lv][hdr.box_arrays[lv] >= 0])),
+                             len(hdr.boxes[lv]))
+            for bid, gmap in enumerate(hdr.ghost_map[lv]):
+                faces = hdr.face_neighbours(lv, bid)
+                self.assertEqual(len(gmap), 3)
+                for (low, high), (ref_low, ref_high) in zip(gmap, faces):
+                    self.assertEqual(low, ref_low.tolist())
+                    self.assertEqual(high, ref_high.tolist())
+        with self.assertRaises(ValueError):
+            PlotfileCooker(self.pfile2d, ghost=True)
+
+    def test_with_ghosts(self):
+        hdr = PlotfileCooker(self.pfile3d)
+        # The finest level covers the domain
+        lv, n = 2, 2
+        level = np.full(hdr.grid_sizes[lv] + 2 * n, np.nan)
+        for bid, data in enumerate(hdr['temp'][lv][:]):
+            lo, hi = hdr.cells[lv]['indexes'][bid] + n
+            level[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1, lo[2]:hi[2] + 1] = data
+        for bid, padded in enumerate(hdr['temp'][lv].iter_with_ghosts(n=n, batch_size=10)):
+            lo, hi = hdr.cells[lv]['indexes'][bid]
+            ref = level[lo[0]:hi[0] + 2 * n + 1,
+                        lo[1]:hi[1] + 2 * n + 1,
+                        lo[2]:hi[2] + 2 * n + 1]
+            self.assertEqual(padded.shape, ref.shape)
+            # Ghost cells outside the domain repeat the box edge
+            inside = ~np.isnan(ref)
+            self.assertTrue(np.array_equal(padded[inside], ref[inside]))
+            self.assertTrue(np.array_equal(padded[n:-n, n:-n, n:-n],
+                                           hdr['temp'][lv][bid]))
+        # Multiple fields
+        padded = hdr[['temp', 'density']][lv].with_ghosts([0, 1])
+        self.assertEqual(padded[1].shape, (10, 10, 10, 2))
+        # Ghost cells from the coarse level
+        hdr = PlotfileCooker(self.pfile2d)
+        indexes = hdr.cells[1]['indexes']
+        ratio = hdr.factors[0]
+        for bid in [33, 40]:
+            padded = hdr['temp'][1].with_ghosts(bid, n=2)
+            linear = hdr['temp'][1].with_ghosts(bid, n=2, coarse="linear")
+            self.assertTrue(np.array_equal(padded[2:-2, 2:-2], linear[2:-2, 2:-2]))
+            self.assertFalse(np.any(np.isnan(linear)))
+            covered = np.zeros(padded.shape, dtype=bool)
+            plo = indexes[bid][0] - 2
+            for nid in np.append(hdr.box_neighbours(1, bid, 2), bid):
+                lo, hi = np.maximum(indexes[nid] - plo, 0)
+                covered[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1] = True
+            # Piecewise constant ghost cells take the coarse cell value
+            for i, j in zip(*np.nonzero(~covered)):
+                # Outside the domain
+                if np.any(np.array([i, j]) + plo < 0):
+                    continue
+                ci, cj = (np.array([i, j]) + plo) // ratio
+                cid = hdr.box_index().point_boxes(0, [hdr.grids[0][0][ci],
+                                                      hdr.grids[0][1][cj]])[0]
+                clo = hdr.cells[0]['indexes'][cid][0]
+                self.assertEqual(padded[i, j],
+                                 hdr['temp'][0][cid][ci - clo[0], cj - clo[1]])
+
+class TestProfiling(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_io_profiling(self):
+        before = profile_report()
+        os.environ[PROFILE_ENV] = "1"
+        try:
+            for backend in ["processes", "threads"]:
+                readers = ReaderConfig(io_backend=backend, read_gap=None)
+                with PlotfileCooker(self.pfile3d, readers=readers) as hdr:
+                    data = hdr[['temp', 'Y(O2)']][1][:]
+                    hdr['temp'][0][0]
+            report = profile_report()
+            write_profile_report("test_profile.json")
+        finally:
+            os.environ.pop(PROFILE_ENV)
+        level_1 = os.path.abspath(os.path.join(self.pfile3d, "Level_1"))
+        before_bytes = before['levels'].get(level_1, {'bytes_read':0})['bytes_read']
+        # Two fields of the 8 boxes at level 1 read twice
+        self.assertGreaterEqual(report['levels'][level_1]['bytes_read'] - before_bytes,
+                                2 * sum([d.nbytes for d in data]))
+        self.assertGreater(report['totals']['opens'], before['totals']['opens'])
+        self.assertGreater(report['workers']['tasks'], before['workers']['tasks'])
+        self.assertGreaterEqual(report['workers']['idle_time'], 0.0)
+        with open("test_profile.json") as rfile:
+            self.assertEqual(json.load(rfile)['version'], report['version'])
+        os.remove("test_profile.json")
@@ -0,0 +1,70 @@
+import os
+import shutil
+import unittest
+import numpy as np
+
+from amr_kitchen import PlotfileCooker, PlotfileSeries
+from amr_kitchen.plotfile_series import read_series_member
+
+
+class TestPlotfileSeries(unittest.TestCase):
+    pfile2d = "test_assets/example_plt_2d"
+    pfile3d = "test_assets/example_plt_3d"
+
+    def test_series(self):
+        # Copy of the 3D plotfile at a later time
+        tmp_plt = os.path.join("test", "series_tmp", "plt_late")
+        shutil.copytree(self.pfile3d, tmp_plt)
+        try:
+            with open(os.path.join(tmp_plt, "Header")) as hfile:
+                lines = hfile.readlines()
+            ndims_line = [i for i, l in enumerate(lines) if l.strip() == "3"][0]
+            lines[ndims_line + 1] = "1.0\n"
+            with open(os.path.join(tmp_plt, "Header"), "w") as hfile:
+                hfile.writelines(lines)
+            for workers in [0, 2]:
+                series = PlotfileSeries([tmp_plt, self.pfile3d, self.pfile2d],
+                                        workers=workers)
+                self.assertEqual(len(series), 3)
+                # Sorted by time
+                self.assertTrue(np.all(np.diff(series.times) >= 0))
+                self.assertEqual(series.paths[-1], tmp_plt)
+                self.assertEqual(series.times[-1], 1.0)
+                self.assertEqual(len(series.layouts), 2)
+                # The 3D plotfiles share their mesh
+                early = series.paths.index(self.pfile3d)
+                self.assertIs(series[early].boxes, series[-1].boxes)
+                self.assertIs(series[early].cells[2]['indexes'],
+                              series[-1].cells[2]['indexes'])
+                # The adjacency and box index are built when first needed
+                self.assertIsNone(series[-1].adjacency)
+                self.assertIsNone(series[-1].spatial_index)
+                self.assertEqual(len(series[-1].box_neighbours(2, 0)),
+                                 len(series[early].box_neighbours(2, 0)))
+                self.assertTrue(series[early] == series[-1])
+                self.assertEqual(len(series.layout(-1)), 2)
+                self.assertIs(series.at_time(0.9), series[-1])
+                self.assertIs(series.at_step(series.steps[0]), series[0])
+                # The data of each plotfile is read from its own files
+                ref = PlotfileCooker(tmp_plt)
+                self.assertTrue(np.array_equal(series[-1]['temp'][1][3],
+                                               ref['temp'][1][3]))
+                series.close()
+            # The mesh of a known layout is not sent back
+            key, pck = read_series_member((tmp_plt, {}, set()))
+            self.assertIsNotNone(pck.boxes)
+            _, pck = read_series_member((tmp_plt, {}, {key}))
+            self.assertIsNone(pck.boxes)
+            self.assertIsNone(pck.cells[1]['indexes'])
+            PlotfileSeries.share_mesh(series[-1], pck)
+            self.assertTrue(pck == series[-1])
+            # The adjacency already built is shared
+            self.assertIs(pck.adjacency, series[-1].adjacency)
+            self.assertIsNone(pck.spatial_index)
+            # A glob pattern
+            series = PlotfileSeries(os.path.join("test", "series_tmp", "plt*"))
+            self.assertEqual(len(series), 1)
+        finally:
+            shutil.rmtree(os.path.join("test", "series_tmp"))
+        with self.assertRaises(ValueError):
+            PlotfileSeries(os.path.join("test", "series_tmp", "plt*"))
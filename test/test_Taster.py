@@ -145,7 +145,35 @@ class TestTaste(unittest.TestCase):
         # This should just return False
         self.assertFalse(Taster(self.missingindexes_3d,
                                nofail=True))
-        
+
+
+    def test_binary_data_3d(self):
+        """
+        Should raise a TastesBadError when the max in the
+        level header does not match the binary data
+        """
+        self.assertTrue(Taster(self.goodplotfile_3d,
+                               binary_data=True))
+        tmp_plt = os.path.join("test", "taste_tmp")
+        shutil.copytree(self.goodplotfile_3d, tmp_plt)
+        try:
+            cell_h = os.path.join(tmp_plt, "Level_0", "Cell_H")
+            with open(cell_h) as hfile:
+                lines = hfile.readlines()
+            # Change the max of a field (last line with values)
+            line = [i for i, l in enumerate(lines) if ',' in l][-1]
+            maxs = lines[line].split(',')
+            maxs[5] = "2.0e+03"
+            lines[line] = ','.join(maxs)
+            with open(cell_h, "w") as hfile:
+                hfile.writelines(lines)
+            with self.assertRaises(TastesBadError):
+                Taster(tmp_plt, binary_data=True)
+            self.assertFalse(Taster(tmp_plt,
+                                    binary_data=True,
+                                    nofail=True))
+        finally:
+            shutil.rmtree(tmp_plt)
 
 
 if __name__ == '__main__':